@@ -1,7 +1,23 @@
-from flask import Blueprint, request, jsonify
-from utils.auth import login_required, paid_user_required
-from utils.database import db
-from bson import ObjectId
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from utils.auth import login_required, paid_user_required, ingest_token_required
+from utils.downsample import downsample_records
+from utils.pagination import keyset_paginate, sortable, count_cache, MAX_PAGE_SIZE
+from models.energy_data import EnergyNews, EnergyPrice, EnergyDeal, EnergyReport, EnergyIndex
+from models.user import User
+from services.price_store import price_store
+from services.latest_price_service import latest_price_service
+from services.candle_service import candle_service, INTERVALS
+from services.price_ingest_service import price_ingest_service
+from services.market_stream import market_publisher, stream_events, CHANNELS
+from services.spread_service import spread_service
+from services.analytics_service import analytics_service
+from services.correlation_service import correlation_service
+from services.change_feed import change_feed
+from services.deal_rollup_service import deal_rollup_service
+from services.counterparty_service import counterparty_service
+from services.deal_ingest_service import deal_ingest_service
+from services.export_service import export_service, FORMATS as EXPORT_FORMATS
+from sqlalchemy.orm import undefer_group
 from datetime import datetime, timedelta
 import logging
 
@@ -12,58 +28,58 @@ energy_bp = Blueprint('energy', __name__)
 @energy_bp.route('/news', methods=['GET'])
 @login_required
 def get_news():
-    """获取能源资讯列表"""
+    """获取能源资讯列表（游标分页）"""
     try:
         # 获取查询参数
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 10))
+        limit = min(int(request.args.get('limit', 10)), MAX_PAGE_SIZE)
+        page_cursor = request.args.get('page_cursor')  # 上一页返回的 next_page_cursor
+        page = request.args.get('page', type=int)  # 已弃用，请改用 page_cursor
+        with_total = request.args.get('with_total', '').lower() in ('1', 'true')
         category = request.args.get('category')
         
         # 构建查询条件
-        query = {'status': 'published'}
+        query = EnergyNews.query.filter(EnergyNews.status == 'published')
         if category:
-            query['category'] = category
-        
-        # 查询数据
-        news_collection = db.get_collection('energy_news')
-        total = news_collection.count_documents(query)
-        news_list = list(news_collection.find(query)
-                        .sort('publish_time', -1)
-                        .skip((page - 1) * limit)
-                        .limit(limit))
-        
-        # 转换ObjectId为字符串
-        for news in news_list:
-            news['_id'] = str(news['_id'])
+            query = query.filter(EnergyNews.category == category)
+        
+        query = sortable(query, EnergyNews.publish_time)
+        news_list, next_page_cursor = keyset_paginate(
+            query, EnergyNews.publish_time, EnergyNews.id, limit, page_cursor, page
+        )
+        
+        result = {
+            'data': [news.to_card() for news in news_list],
+            'limit': limit,
+            'next_page_cursor': next_page_cursor,
+            'has_more': next_page_cursor is not None
+        }
+        if page is not None and not page_cursor:
+            # 旧客户端按页码分页，保持原有的 page / total 字段
+            result['page'] = page
+            with_total = True
+        if with_total:
+            result['total'] = count_cache.get(('energy_news', category), query.count)
             
-        return jsonify({
-            'data': news_list,
-            'total': total,
-            'page': page,
-            'limit': limit
-        }), 200
+        return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取资讯列表错误: {e}")
         return jsonify({'error': '服务器错误'}), 500
 
-@energy_bp.route('/news/<news_id>', methods=['GET'])
+@energy_bp.route('/news/<int:news_id>', methods=['GET'])
 @login_required
 def get_news_detail(news_id):
     """获取资讯详情"""
     try:
-        news_collection = db.get_collection('energy_news')
-        news = news_collection.find_one({'_id': ObjectId(news_id)})
-        
-        if news:
-            # 增加浏览次数
-            news_collection.update_one(
-                {'_id': ObjectId(news_id)},
-                {'$inc': {'view_count': 1}}
-            )
-            
-            news['_id'] = str(news['_id'])
-            return jsonify(news), 200
+        # 详情需要正文，一次读取被延迟加载的正文和摘要
+        news = EnergyNews.query.options(undefer_group('body')).filter(EnergyNews.id == news_id).first()
+        
+        if news and news.status == 'published':
+            # 增加浏览次数（缓冲后批量落库）
+            news.increment_view_count()
+            return jsonify(news.to_dict()), 200
         else:
             return jsonify({'error': '资讯不存在'}), 404
             
@@ -80,63 +96,142 @@ def get_prices():
         product_type = request.args.get('product_type')
         region = request.args.get('region')
         days = int(request.args.get('days', 7))  # 默认查询7天内的数据
+        points = request.args.get('points', type=int)  # 每个序列的最大点数，为空时不降采样
+        since = request.args.get('since', type=int)  # 增量同步游标，只返回之后新增或修改的行
+        since_id = request.args.get('since_id', type=int)  # 上一页 has_more 时返回的 cursor_id
         
-        # 构建查询条件
-        query = {}
-        if product_type:
-            query['product_type'] = product_type
-        if region:
-            query['region'] = region
+        # 增量同步：按变更序号取数，不受 days 窗口限制
+        if since is not None:
+            criteria = []
+            if product_type:
+                criteria.append(EnergyPrice.product_type == product_type)
+            if region:
+                criteria.append(EnergyPrice.region == region)
+            page = change_feed.changes('prices', since, *criteria, since_id=since_id)
+            return jsonify(page), 200
         
         # 只查询最近几天的数据
         start_date = datetime.now() - timedelta(days=days)
-        query['price_date'] = {'$gte': start_date}
         
-        # 查询数据
-        prices_collection = db.get_collection('energy_prices')
-        prices = list(prices_collection.find(query).sort('price_date', -1))
+        # 先取游标再取数据，之后的写入由下一次增量同步带回
+        cursor = change_feed.current('prices')
         
-        # 转换ObjectId为字符串
-        for price in prices:
-            price['_id'] = str(price['_id'])
+        # 从列式价格存储中按区间切片，不再逐行查询数据库
+        price_store.ensure_loaded()
+        prices = price_store.query(
+            product_type=product_type,
+            region=region,
+            start=start_date,
+            points=points
+        )
             
         return jsonify({
             'data': prices,
-            'count': len(prices)
+            'count': len(prices),
+            'cursor': cursor
         }), 200
         
     except Exception as e:
         logger.error(f"获取价格数据错误: {e}")
         return jsonify({'error': '服务器错误'}), 500
 
+@energy_bp.route('/prices/spreads', methods=['GET'])
+@login_required
+def get_price_spreads():
+    """获取同一品种跨地区价差矩阵"""
+    try:
+        # 获取查询参数
+        product_type = request.args.get('product_type')
+        days = int(request.args.get('days', 30))
+        pair = request.args.get('pair')  # 形如 "上海,北京"，返回两地价差序列
+        
+        if not product_type:
+            return jsonify({'error': '缺少品种参数'}), 400
+        if pair:
+            pair = pair.split(',')
+            if len(pair) != 2:
+                return jsonify({'error': '地区对格式应为 "地区A,地区B"'}), 400
+        
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days)
+        result = spread_service.spreads(product_type, start_date, end_date, pair=pair)
+        
+        return jsonify(result), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取价差数据错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@energy_bp.route('/prices/analytics', methods=['GET'])
+@login_required
+def get_price_analytics():
+    """获取价格滚动分析（移动平均、波动率、收益率）"""
+    try:
+        # 获取查询参数
+        product_type = request.args.get('product_type')
+        region = request.args.get('region')
+        days = int(request.args.get('days', 30))
+        window = int(request.args.get('window', 20))  # 滚动窗口（报价点数）
+        
+        if window < 2 or window > 250:
+            return jsonify({'error': '窗口长度应在 2 到 250 之间'}), 400
+        
+        start_date = datetime.now() - timedelta(days=days)
+        series = analytics_service.analytics(
+            window=window,
+            product_type=product_type,
+            region=region,
+            start=start_date
+        )
+        
+        return jsonify({
+            'data': series,
+            'count': len(series)
+        }), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取价格分析数据错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@energy_bp.route('/prices/bulk', methods=['POST'])
+@ingest_token_required
+def bulk_import_prices():
+    """批量导入价格数据（JSON数组或CSV）"""
+    try:
+        if 'csv' in (request.content_type or ''):
+            frame = price_ingest_service.parse_csv(request.get_data(as_text=True))
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                data = data.get('data')
+            if not isinstance(data, list):
+                return jsonify({'error': '请求体必须是报价数组'}), 400
+            frame = price_ingest_service.parse_records(data)
+        
+        result = price_ingest_service.ingest(frame)
+        
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"批量导入价格错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
 @energy_bp.route('/prices/latest', methods=['GET'])
 @login_required
 def get_latest_prices():
     """获取最新价格数据"""
     try:
-        prices_collection = db.get_collection('energy_prices')
-        
-        # 查询每个产品类型和地区的最新价格
-        pipeline = [
-            {'$match': {'is_latest': True}},
-            {'$sort': {'price_date': -1}},
-            {'$group': {
-                '_id': {
-                    'product_type': '$product_type',
-                    'region': '$region'
-                },
-                'latest_price': {'$first': '$$ROOT'}
-            }}
-        ]
-        
-        results = list(prices_collection.aggregate(pipeline))
-        
-        # 整理数据格式
-        latest_prices = []
-        for result in results:
-            price_data = result['latest_price']
-            price_data['_id'] = str(price_data['_id'])
-            latest_prices.append(price_data)
+        # 直接读取最新价格物化表，每个序列一行
+        latest_prices = latest_price_service.get_all()
             
         return jsonify({
             'data': latest_prices,
@@ -147,93 +242,306 @@ def get_latest_prices():
         logger.error(f"获取最新价格错误: {e}")
         return jsonify({'error': '服务器错误'}), 500
 
+@energy_bp.route('/prices/candles', methods=['GET'])
+@login_required
+def get_price_candles():
+    """获取价格K线数据"""
+    try:
+        # 获取查询参数
+        interval = request.args.get('interval', 'day')
+        product_type = request.args.get('product_type')
+        region = request.args.get('region')
+        days = int(request.args.get('days', 90))
+        
+        if interval not in INTERVALS:
+            return jsonify({'error': f'无效的K线周期: {interval}'}), 400
+        
+        # 读取预先汇总的K线
+        start_date = datetime.now() - timedelta(days=days)
+        candles = candle_service.get_candles(
+            interval,
+            product_type=product_type,
+            region=region,
+            start=start_date
+        )
+        
+        return jsonify({
+            'data': candles,
+            'count': len(candles),
+            'interval': interval
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"获取K线数据错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@energy_bp.route('/stream', methods=['GET'])
+@login_required
+def stream_market():
+    """行情推送（Server-Sent Events），按品种/地区订阅价格和指数变化"""
+    try:
+        channels = [c for c in request.args.get('channels', ','.join(CHANNELS)).split(',') if c in CHANNELS]
+        products = [p for p in request.args.get('products', '').split(',') if p]
+        regions = [r for r in request.args.get('regions', '').split(',') if r]
+        
+        if not channels:
+            return jsonify({'error': '无效的订阅频道'}), 400
+        
+        subscriber, snapshot = market_publisher.subscribe(channels, products, regions)
+        
+        return Response(
+            stream_with_context(stream_events(market_publisher, subscriber, snapshot)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        
+    except Exception as e:
+        logger.error(f"行情推送错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
 @energy_bp.route('/deals', methods=['GET'])
 @paid_user_required
 def get_deals():
     """获取成交数据（仅付费用户）"""
     try:
         # 获取查询参数
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 10))
+        limit = min(int(request.args.get('limit', 10)), MAX_PAGE_SIZE)
+        page_cursor = request.args.get('page_cursor')  # 上一页返回的 next_page_cursor
+        page = request.args.get('page', type=int)  # 已弃用，请改用 page_cursor
+        with_total = request.args.get('with_total', '').lower() in ('1', 'true')
         product_type = request.args.get('product_type')
         days = int(request.args.get('days', 30))
+        since = request.args.get('since', type=int)  # 增量同步游标，只返回之后新增或修改的行
+        since_id = request.args.get('since_id', type=int)  # 上一页 has_more 时返回的 cursor_id
         
-        # 构建查询条件
-        query = {}
-        if product_type:
-            query['product_type'] = product_type
+        # 增量同步：按 (变更序号, id) 分页取数
+        if since is not None:
+            criteria = [EnergyDeal.product_type == product_type] if product_type else []
+            page = change_feed.changes('deals', since, *criteria, since_id=since_id)
+            return jsonify(page), 200
+        
+        cursor = change_feed.current('deals')
         
         # 只查询最近几天的数据
         start_date = datetime.now() - timedelta(days=days)
-        query['deal_date'] = {'$gte': start_date}
-        
-        # 查询数据
-        deals_collection = db.get_collection('energy_deals')
-        total = deals_collection.count_documents(query)
-        deals = list(deals_collection.find(query)
-                    .sort('deal_date', -1)
-                    .skip((page - 1) * limit)
-                    .limit(limit))
-        
-        # 转换ObjectId为字符串
-        for deal in deals:
-            deal['_id'] = str(deal['_id'])
+        query = EnergyDeal.query.filter(EnergyDeal.deal_date >= start_date)
+        if product_type:
+            query = query.filter(EnergyDeal.product_type == product_type)
+        
+        query = sortable(query, EnergyDeal.deal_date)
+        deals, next_page_cursor = keyset_paginate(
+            query, EnergyDeal.deal_date, EnergyDeal.id, limit, page_cursor, page
+        )
+        
+        result = {
+            'data': [deal.to_dict() for deal in deals],
+            'limit': limit,
+            'next_page_cursor': next_page_cursor,
+            'has_more': next_page_cursor is not None,
+            'cursor': cursor
+        }
+        if page is not None and not page_cursor:
+            # 旧客户端按页码分页，保持原有的 page / total 字段
+            result['page'] = page
+            with_total = True
+        if with_total:
+            # 时间窗口按天取整，同一天内的请求共用缓存
+            result['total'] = count_cache.get(('energy_deals', product_type, days, start_date.date()), query.count)
             
-        return jsonify({
-            'data': deals,
-            'total': total,
-            'page': page,
-            'limit': limit
-        }), 200
+        return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取成交数据错误: {e}")
         return jsonify({'error': '服务器错误'}), 500
 
+@energy_bp.route('/deals/bulk', methods=['POST'])
+@ingest_token_required
+def bulk_import_deals():
+    """批量导入成交数据（JSON数组或CSV），按 deal_id 去重更新"""
+    try:
+        if 'csv' in (request.content_type or ''):
+            frames = deal_ingest_service.parse_csv(request.stream)
+        else:
+            data = request.get_json()
+            if isinstance(data, dict):
+                data = data.get('data')
+            if not isinstance(data, list):
+                return jsonify({'error': '请求体必须是成交数组'}), 400
+            frames = deal_ingest_service.parse_records(data)
+        
+        result = deal_ingest_service.ingest_batches(frames)
+        
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"批量导入成交错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@energy_bp.route('/deals/stats', methods=['GET'])
+@paid_user_required
+def get_deal_stats():
+    """获取成交日汇总（VWAP、成交量、笔数、最高/最低价，仅付费用户）"""
+    try:
+        # 获取查询参数
+        product_type = request.args.get('product_type')
+        region = request.args.get('region')
+        deal_type = request.args.get('deal_type')
+        days = int(request.args.get('days', 30))
+        
+        start_date = datetime.now() - timedelta(days=days)
+        stats = deal_rollup_service.get_stats(
+            product_type=product_type,
+            region=region,
+            deal_type=deal_type,
+            start=start_date
+        )
+        
+        return jsonify(stats), 200
+        
+    except Exception as e:
+        logger.error(f"获取成交汇总错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@energy_bp.route('/deals/counterparties/<name>', methods=['GET'])
+@paid_user_required
+def get_counterparty_profile(name):
+    """获取交易对手成交画像：买卖合计、品种构成、主要对手方（仅付费用户）"""
+    try:
+        # month 为截止月份（YYYY-MM，默认本月），months 为向前统计的月数
+        month = request.args.get('month')
+        months = int(request.args.get('months', 12))
+        if months < 1 or months > 120:
+            raise ValueError('months 应在 1 到 120 之间')
+        
+        try:
+            end_month = datetime.strptime(month, '%Y-%m') if month else datetime.now()
+        except ValueError:
+            raise ValueError('month 格式应为 YYYY-MM')
+        start_index = end_month.year * 12 + end_month.month - months
+        start_month = datetime(start_index // 12, start_index % 12 + 1, 1)
+        
+        profile = counterparty_service.get_profile(name, start_month, end_month)
+        
+        return jsonify(profile), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取交易对手画像错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+def _parse_export_date(name):
+    """解析导出日期参数（YYYY-MM-DD）"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} 日期格式应为 YYYY-MM-DD")
+
+def _export_response(dataset):
+    """流式导出响应，边查询边输出"""
+    fmt = request.args.get('format', 'csv')
+    chunks = export_service.stream(
+        dataset,
+        fmt,
+        product_type=request.args.get('product_type'),
+        region=request.args.get('region'),
+        start=_parse_export_date('start'),
+        end=_parse_export_date('end')
+    )
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"energy_{dataset}_{datetime.now():%Y%m%d}.{extension}"
+    
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}', 'X-Accel-Buffering': 'no'}
+    )
+
+@energy_bp.route('/prices/export', methods=['GET'])
+@login_required
+def export_prices():
+    """导出价格历史（csv / ndjson / parquet / arrow）"""
+    try:
+        return _export_response('prices')
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"导出价格数据错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@energy_bp.route('/deals/export', methods=['GET'])
+@paid_user_required
+def export_deals():
+    """导出成交历史（仅付费用户）"""
+    try:
+        return _export_response('deals')
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"导出成交数据错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
 @energy_bp.route('/reports', methods=['GET'])
 @login_required
 def get_reports():
-    """获取研究报告列表"""
+    """获取研究报告列表（游标分页）"""
     try:
         # 获取查询参数
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 10))
+        limit = min(int(request.args.get('limit', 10)), MAX_PAGE_SIZE)
+        page_cursor = request.args.get('page_cursor')  # 上一页返回的 next_page_cursor
+        page = request.args.get('page', type=int)  # 已弃用，请改用 page_cursor
+        with_total = request.args.get('with_total', '').lower() in ('1', 'true')
         report_type = request.args.get('report_type')
         
         # 获取用户类型
-        user_id = request.current_user['user_id']
-        users_collection = db.get_collection('users')
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
-        user_type = user.get('user_type', 'free')
+        user = User.query.get(int(request.current_user['user_id']))
+        if not user:
+            return jsonify({'error': '用户不存在'}), 404
+        user_type = user.user_type or 'free'
         
         # 构建查询条件
-        query = {}
+        query = EnergyReport.query
         if report_type:
-            query['report_type'] = report_type
+            query = query.filter(EnergyReport.report_type == report_type)
         
         # 免费用户只能看到免费报告
         if user_type == 'free':
-            query['access_level'] = 'free'
-        
-        # 查询数据
-        reports_collection = db.get_collection('energy_reports')
-        total = reports_collection.count_documents(query)
-        reports = list(reports_collection.find(query)
-                      .sort('publish_date', -1)
-                      .skip((page - 1) * limit)
-                      .limit(limit))
-        
-        # 转换ObjectId为字符串
-        for report in reports:
-            report['_id'] = str(report['_id'])
+            query = query.filter(EnergyReport.access_level == 'free')
+        
+        query = sortable(query, EnergyReport.publish_date)
+        reports, next_page_cursor = keyset_paginate(
+            query, EnergyReport.publish_date, EnergyReport.id, limit, page_cursor, page
+        )
+        
+        result = {
+            'data': [report.to_card() for report in reports],
+            'limit': limit,
+            'next_page_cursor': next_page_cursor,
+            'has_more': next_page_cursor is not None
+        }
+        if page is not None and not page_cursor:
+            # 旧客户端按页码分页，保持原有的 page / total 字段
+            result['page'] = page
+            with_total = True
+        if with_total:
+            result['total'] = count_cache.get(('energy_reports', report_type, user_type == 'free'), query.count)
             
-        return jsonify({
-            'data': reports,
-            'total': total,
-            'page': page,
-            'limit': limit
-        }), 200
+        return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"获取研报列表错误: {e}")
         return jsonify({'error': '服务器错误'}), 500
@@ -246,29 +554,68 @@ def get_indexes():
         # 获取查询参数
         index_name = request.args.get('index_name')
         days = int(request.args.get('days', 7))
+        points = request.args.get('points', type=int)  # 每个指数的最大点数，为空时不降采样
+        since = request.args.get('since', type=int)  # 增量同步游标，只返回之后新增或修改的行
+        since_id = request.args.get('since_id', type=int)  # 上一页 has_more 时返回的 cursor_id
         
-        # 构建查询条件
-        query = {}
-        if index_name:
-            query['index_name'] = index_name
+        # 增量同步：按变更序号取数，不受 days 窗口限制
+        if since is not None:
+            criteria = [EnergyIndex.index_name == index_name] if index_name else []
+            page = change_feed.changes('indexes', since, *criteria, since_id=since_id)
+            return jsonify(page), 200
+        
+        cursor = change_feed.current('indexes')
         
         # 只查询最近几天的数据
         start_date = datetime.now() - timedelta(days=days)
-        query['index_date'] = {'$gte': start_date}
+        query = EnergyIndex.query.filter(EnergyIndex.index_date >= start_date)
+        if index_name:
+            query = query.filter(EnergyIndex.index_name == index_name)
+        
+        indexes = [index.to_dict() for index in query.order_by(EnergyIndex.index_date).all()]
         
-        # 查询数据
-        indexes_collection = db.get_collection('energy_indexes')
-        indexes = list(indexes_collection.find(query).sort('index_date', -1))
+        # 按指数分组降采样
+        if points:
+            grouped = {}
+            for index in indexes:
+                grouped.setdefault(index['index_code'] or index['index_name'], []).append(index)
+            indexes = [
+                index for series in grouped.values()
+                for index in downsample_records(series, 'index_value', points)
+            ]
         
-        # 转换ObjectId为字符串
-        for index in indexes:
-            index['_id'] = str(index['_id'])
+        indexes.sort(key=lambda index: index['index_date'], reverse=True)
             
         return jsonify({
             'data': indexes,
-            'count': len(indexes)
+            'count': len(indexes),
+            'cursor': cursor
         }), 200
         
     except Exception as e:
         logger.error(f"获取指数数据错误: {e}")
-        return jsonify({'error': '服务器错误'}), 500 
\ No newline at end of file
+        return jsonify({'error': '服务器错误'}), 500 
+
+@energy_bp.route('/indexes/correlation', methods=['GET'])
+@paid_user_required
+def get_index_correlation():
+    """获取指数与品种价格的滚动相关系数和 Beta 矩阵（仅付费用户）"""
+    try:
+        # 获取查询参数
+        window = int(request.args.get('window', 20))  # 滚动窗口（交易日）
+        as_of = request.args.get('as_of')  # 截止日期 YYYY-MM-DD，默认最新
+        
+        try:
+            as_of_date = datetime.strptime(as_of, '%Y-%m-%d') if as_of else None
+        except ValueError:
+            raise ValueError('as_of 日期格式应为 YYYY-MM-DD')
+        
+        result = correlation_service.matrix(window=window, as_of=as_of_date)
+        
+        return jsonify(result), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取指数相关性错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
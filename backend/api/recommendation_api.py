@@ -1,7 +1,11 @@
 from flask import Blueprint, request, jsonify
 from utils.auth import login_required
-from utils.database import db
-from bson import ObjectId
+from services.latest_price_service import latest_price_service
+from services.hot_deal_service import hot_deal_service
+from services.search_service import search_service
+from services.tag_service import tag_service
+from models.energy_data import EnergyNews, EnergyReport
+from models.user import User, UserBehavior
 from datetime import datetime, timedelta
 import logging
 
@@ -9,6 +13,13 @@ logger = logging.getLogger(__name__)
 
 recommendation_bp = Blueprint('recommendation', __name__)
 
+def _load_cards(model, ids):
+    """按给定 id 顺序读取资讯/研报的列表卡片"""
+    if not ids:
+        return []
+    rows = {row.id: row for row in model.query.filter(model.id.in_(ids)).all()}
+    return [rows[id_].to_card() for id_ in ids if id_ in rows]
+
 @recommendation_bp.route('/personalized', methods=['GET'])
 @login_required
 def get_personalized_recommendations():
@@ -17,15 +28,14 @@ def get_personalized_recommendations():
         user_id = request.current_user['user_id']
         
         # 获取用户信息和标签
-        users_collection = db.get_collection('users')
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = User.query.get(int(user_id))
         
         if not user:
             return jsonify({'error': '用户不存在'}), 404
         
-        user_tags = user.get('tags', [])
-        user_region = user.get('region')
-        user_products = user.get('trading_products', [])
+        user_tags = user.tags or []
+        user_region = user.region
+        user_products = user.trading_products or []
         
         recommendations = {
             'news': [],
@@ -33,60 +43,38 @@ def get_personalized_recommendations():
             'price_alerts': []
         }
         
-        # 基于标签推荐资讯
-        news_collection = db.get_collection('energy_news')
-        news_query = {
-            'status': 'published',
-            '$or': [
-                {'tags': {'$in': user_tags}},
-                {'content': {'$regex': user_region}},
-            ]
-        }
-        
-        recommended_news = list(news_collection.find(news_query)
-                               .sort('publish_time', -1)
-                               .limit(5))
+        # 基于标签和地区推荐资讯，按标签索引取最新的匹配内容，不扫描 JSON 标签列
+        news_ids = tag_service.match('news', user_tags + ([user_region] if user_region else []), limit=5)
+        recommended_news = _load_cards(EnergyNews, news_ids)
         
         for news in recommended_news:
-            news['_id'] = str(news['_id'])
             news['recommendation_reason'] = '基于您的关注标签推荐'
         
         recommendations['news'] = recommended_news
         
-        # 基于标签推荐研报
-        reports_collection = db.get_collection('energy_reports')
-        report_query = {
-            '$or': [
-                {'tags': {'$in': user_tags}},
-                {'title': {'$regex': '|'.join(user_products)}},
-            ]
-        }
-        
-        # 根据用户类型过滤
-        if user.get('user_type') == 'free':
-            report_query['access_level'] = 'free'
-        
-        recommended_reports = list(reports_collection.find(report_query)
-                                  .sort('publish_date', -1)
-                                  .limit(3))
+        # 基于标签和交易品种推荐研报，免费用户只推荐免费研报
+        report_ids = tag_service.match(
+            'report',
+            user_tags + user_products,
+            limit=3,
+            free_only=(user.user_type or 'free') == 'free'
+        )
+        recommended_reports = _load_cards(EnergyReport, report_ids)
         
         for report in recommended_reports:
-            report['_id'] = str(report['_id'])
             report['recommendation_reason'] = '基于您的交易品种推荐'
         
         recommendations['reports'] = recommended_reports
         
-        # 推荐价格提醒
-        prices_collection = db.get_collection('energy_prices')
-        for product in user_products[:2]:  # 最多推荐2个产品的价格
-            latest_price = prices_collection.find_one({
-                'product_type': product,
-                'region': user_region,
-                'is_latest': True
-            })
+        # 推荐价格提醒（按键读取最新价格物化表）
+        alert_products = user_products[:2]  # 最多推荐2个产品的价格
+        latest_prices = latest_price_service.get_many(
+            [(product, user_region) for product in alert_products]
+        )
+        for product in alert_products:
+            latest_price = latest_prices.get((product, user_region))
             
             if latest_price:
-                latest_price['_id'] = str(latest_price['_id'])
                 latest_price['recommendation_reason'] = f'您关注的{product}最新价格'
                 recommendations['price_alerts'].append(latest_price)
         
@@ -101,26 +89,26 @@ def get_personalized_recommendations():
 def guess_you_like():
     """猜你喜欢功能"""
     try:
-        user_id = request.current_user['user_id']
+        user_id = int(request.current_user['user_id'])
         
         # 获取用户最近的行为数据
-        behaviors_collection = db.get_collection('user_behaviors')
-        recent_behaviors = list(behaviors_collection.find({
-            'user_id': ObjectId(user_id),
-            'timestamp': {'$gte': datetime.now() - timedelta(days=7)}
-        }).sort('timestamp', -1).limit(20))
+        recent_behaviors = UserBehavior.query.filter(
+            UserBehavior.user_id == user_id,
+            UserBehavior.created_at >= datetime.now() - timedelta(days=7)
+        ).order_by(UserBehavior.created_at.desc()).limit(20).all()
         
         # 分析用户行为偏好
         view_preferences = {}
         search_keywords = []
         
         for behavior in recent_behaviors:
-            if behavior['behavior_type'] == 'view':
-                content_type = behavior['details'].get('content_type')
+            details = behavior.details or {}
+            if behavior.behavior_type == 'view':
+                content_type = details.get('content_type')
                 if content_type:
                     view_preferences[content_type] = view_preferences.get(content_type, 0) + 1
-            elif behavior['behavior_type'] == 'search':
-                query = behavior['details'].get('query', '')
+            elif behavior.behavior_type == 'search':
+                query = details.get('query', '')
                 search_keywords.extend(query.split())
         
         # 获取最感兴趣的内容类型
@@ -130,35 +118,30 @@ def guess_you_like():
         
         # 根据偏好推荐内容
         if favorite_content_type == 'news':
-            news_collection = db.get_collection('energy_news')
             # 基于搜索关键词推荐
             if search_keywords:
-                query = {
-                    'status': 'published',
-                    '$or': [{'title': {'$regex': keyword}} for keyword in search_keywords[:3]]
-                }
+                _, hits = search_service.search(' '.join(search_keywords[:3]), doc_type='news', limit=5)
+                news_list = _load_cards(EnergyNews, [hit['id'] for hit in hits])
             else:
-                query = {'status': 'published', 'is_featured': True}
+                news_list = [news.to_card() for news in EnergyNews.query.filter(
+                    EnergyNews.status == 'published',
+                    EnergyNews.is_featured == True
+                ).order_by(EnergyNews.publish_time.desc()).limit(5).all()]
             
-            news_list = list(news_collection.find(query).sort('publish_time', -1).limit(5))
             for news in news_list:
-                news['_id'] = str(news['_id'])
                 news['content_type'] = 'news'
                 recommendations.append(news)
         
         elif favorite_content_type == 'report':
-            reports_collection = db.get_collection('energy_reports')
-            # 获取用户信息
-            users_collection = db.get_collection('users')
-            user = users_collection.find_one({'_id': ObjectId(user_id)})
+            user = User.query.get(user_id)
             
-            query = {'is_featured': True}
-            if user.get('user_type') == 'free':
-                query['access_level'] = 'free'
+            query = EnergyReport.query.filter(EnergyReport.is_featured == True)
+            if user and user.user_type == 'free':
+                query = query.filter(EnergyReport.access_level == 'free')
             
-            reports = list(reports_collection.find(query).sort('publish_date', -1).limit(5))
+            reports = query.order_by(EnergyReport.publish_date.desc()).limit(5).all()
             for report in reports:
-                report['_id'] = str(report['_id'])
+                report = report.to_card()
                 report['content_type'] = 'report'
                 recommendations.append(report)
         
@@ -177,29 +160,18 @@ def get_hot_topics():
     """获取热门话题"""
     try:
         # 获取最近7天内浏览量最高的资讯
-        news_collection = db.get_collection('energy_news')
-        hot_news = list(news_collection.find({
-            'status': 'published',
-            'publish_time': {'$gte': datetime.now() - timedelta(days=7)}
-        }).sort('view_count', -1).limit(10))
+        hot_news = EnergyNews.query.filter(
+            EnergyNews.status == 'published',
+            EnergyNews.publish_time >= datetime.now() - timedelta(days=7)
+        ).order_by(EnergyNews.view_count.desc()).limit(10).all()
+        hot_news = [news.to_card() for news in hot_news]
         
-        for news in hot_news:
-            news['_id'] = str(news['_id'])
-        
-        # 获取最近的重要成交信息（仅付费用户可见详情）
-        user_id = request.current_user['user_id']
-        users_collection = db.get_collection('users')
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        # 获取最近的重要成交信息（仅付费用户可见详情），按成交金额排序
+        user = User.query.get(int(request.current_user['user_id']))
         
         hot_deals = []
-        if user.get('user_type') == 'paid':
-            deals_collection = db.get_collection('energy_deals')
-            hot_deals = list(deals_collection.find({
-                'deal_date': {'$gte': datetime.now() - timedelta(days=3)}
-            }).sort([('amount', -1), ('deal_date', -1)]).limit(5))
-            
-            for deal in hot_deals:
-                deal['_id'] = str(deal['_id'])
+        if user and user.user_type != 'free':
+            hot_deals = hot_deal_service.top(limit=5)
         
         return jsonify({
             'hot_news': hot_news,
@@ -0,0 +1,97 @@
+from flask import Blueprint, request, jsonify
+from utils.auth import login_required
+from models.user import User
+from services.search_service import search_service, DOC_TYPES
+from services.suggest_service import suggest_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+search_bp = Blueprint('search', __name__)
+
+# 每页最大条数、最多可翻到的结果数
+MAX_SEARCH_LIMIT = 50
+MAX_SEARCH_OFFSET = 1000
+
+# 联想词最大条数
+MAX_SUGGEST_LIMIT = 20
+
+@search_bp.route('', methods=['GET'])
+@login_required
+def search():
+    """全文检索资讯和研报（BM25 + 时间衰减排序）"""
+    try:
+        # 获取查询参数
+        query = (request.args.get('q') or '').strip()
+        doc_type = request.args.get('type')  # news, report，为空时检索全部
+        category = request.args.get('category')  # 资讯分类或研报类型
+        limit = min(int(request.args.get('limit', 10)), MAX_SEARCH_LIMIT)
+        offset = min(int(request.args.get('offset', 0)), MAX_SEARCH_OFFSET)
+        
+        if not query:
+            return jsonify({'error': '请输入检索词'}), 400
+        if doc_type and doc_type not in DOC_TYPES:
+            return jsonify({'error': f"type 应为 {', '.join(DOC_TYPES)}"}), 400
+        if limit < 1:
+            return jsonify({'error': 'limit 应大于 0'}), 400
+        if offset < 0:
+            return jsonify({'error': 'offset 不能小于 0'}), 400
+        
+        # 免费用户只能检索到免费研报
+        user = User.query.get(int(request.current_user['user_id']))
+        if not user:
+            return jsonify({'error': '用户不存在'}), 404
+        
+        total, results = search_service.search(
+            query,
+            doc_type=doc_type,
+            category=category,
+            free_only=(user.user_type or 'free') == 'free',
+            limit=limit,
+            offset=offset
+        )
+        
+        return jsonify({
+            'data': results,
+            'total': total,
+            'limit': limit,
+            'offset': offset
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"全文检索错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@search_bp.route('/suggest', methods=['GET'])
+@login_required
+def suggest():
+    """检索框前缀联想（标题、标签、交易品种、地区，按热度排序）"""
+    try:
+        prefix = (request.args.get('q') or '').strip()
+        limit = min(int(request.args.get('limit', 8)), MAX_SUGGEST_LIMIT)
+        
+        if not prefix:
+            return jsonify({'data': []}), 200
+        if limit < 1:
+            return jsonify({'error': 'limit 应大于 0'}), 400
+        
+        # 免费用户不提示付费研报的标题和关键词
+        user = User.query.get(int(request.current_user['user_id']))
+        if not user:
+            return jsonify({'error': '用户不存在'}), 404
+        
+        suggestions = suggest_service.suggest(
+            prefix,
+            limit=limit,
+            free_only=(user.user_type or 'free') == 'free'
+        )
+        
+        return jsonify({'data': suggestions}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"联想词查询错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from services.user_service import UserService
+from services.price_alert_service import price_alert_service
 from utils.auth import login_required
 import logging
 
@@ -113,4 +114,113 @@ def add_user_tags():
             
     except Exception as e:
         logger.error(f"添加用户标签错误: {e}")
-        return jsonify({'error': '服务器错误'}), 500 
\ No newline at end of file
+        return jsonify({'error': '服务器错误'}), 500
+
+@user_bp.route('/alerts', methods=['GET'])
+@login_required
+def get_price_alerts():
+    """获取用户的价格提醒"""
+    try:
+        user_id = request.current_user['user_id']
+        alerts = price_alert_service.list_alerts(user_id)
+        
+        return jsonify({
+            'data': alerts,
+            'count': len(alerts)
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"获取价格提醒错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@user_bp.route('/alerts', methods=['POST'])
+@login_required
+def create_price_alert():
+    """创建价格提醒"""
+    try:
+        user_id = request.current_user['user_id']
+        data = request.get_json() or {}
+        
+        # 验证必填字段
+        required_fields = ['product_type', 'region', 'direction', 'threshold']
+        for field in required_fields:
+            if data.get(field) in (None, ''):
+                return jsonify({'error': f'缺少必填字段: {field}'}), 400
+        
+        result = price_alert_service.create_alert(
+            user_id=user_id,
+            product_type=data['product_type'],
+            region=data['region'],
+            direction=data['direction'],
+            threshold=data['threshold']
+        )
+        
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+            
+    except Exception as e:
+        logger.error(f"创建价格提醒错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@user_bp.route('/alerts/<int:alert_id>', methods=['DELETE'])
+@login_required
+def delete_price_alert(alert_id):
+    """删除价格提醒"""
+    try:
+        user_id = request.current_user['user_id']
+        result = price_alert_service.delete_alert(user_id, alert_id)
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 404
+            
+    except Exception as e:
+        logger.error(f"删除价格提醒错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@user_bp.route('/alerts/inbox', methods=['GET'])
+@login_required
+def get_alert_inbox():
+    """获取价格提醒收件箱"""
+    try:
+        user_id = request.current_user['user_id']
+        unread_only = request.args.get('unread', '').lower() in ('1', 'true')
+        limit = min(int(request.args.get('limit', 20)), 100)
+        
+        result = price_alert_service.inbox(user_id, unread_only=unread_only, limit=limit)
+        return jsonify(result), 200
+        
+    except Exception as e:
+        logger.error(f"获取提醒收件箱错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
+
+@user_bp.route('/alerts/inbox/read', methods=['POST'])
+@login_required
+def mark_alert_inbox_read():
+    """将提醒通知标记为已读"""
+    try:
+        user_id = request.current_user['user_id']
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': '请求体必须是JSON对象'}), 400
+        
+        ids = data.get('ids')
+        if ids is not None and (
+            not isinstance(ids, list)
+            or not all(isinstance(item, int) and not isinstance(item, bool) for item in ids)
+        ):
+            return jsonify({'error': 'ids 必须是通知 id 数组'}), 400
+        
+        result = price_alert_service.mark_read(user_id, ids)
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 400
+            
+    except Exception as e:
+        logger.error(f"标记通知已读错误: {e}")
+        return jsonify({'error': '服务器错误'}), 500
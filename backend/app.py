@@ -10,12 +10,17 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import config
 from utils.database import db, init_database, get_database_status
+from utils.counters import counter_buffer
 
 # 导入API路由
 from api.auth_api import auth_bp
 from api.user_api import user_bp
 from api.energy_api import energy_bp
 from api.recommendation_api import recommendation_bp
+from api.search_api import search_bp
+
+# 资讯/研报写入时计算签名、查重告警的 Session 监听在模块导入时注册，没有 API 直接引用
+from services import dedup_service  # noqa: F401
 
 # 配置日志
 logging.basicConfig(
@@ -45,6 +50,9 @@ def create_app(config_name='development'):
     else:
         logger.error("数据库初始化失败")
     
+    # 浏览 / 下载计数落库（后台线程按 COUNTER_FLUSH_THREAD 开启）
+    counter_buffer.init_app(app)
+    
     # 创建上传目录
     upload_folder = app.config['UPLOAD_FOLDER']
     if not os.path.exists(upload_folder):
@@ -56,6 +64,7 @@ def create_app(config_name='development'):
     app.register_blueprint(user_bp, url_prefix='/api/user')
     app.register_blueprint(energy_bp, url_prefix='/api/energy')
     app.register_blueprint(recommendation_bp, url_prefix='/api/recommendation')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
     
     # 静态文件服务
     frontend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend')
@@ -111,6 +120,9 @@ if __name__ == '__main__':
     # 创建应用
     app = create_app(env)
     
+    # Web 服务进程启动计数后台落库
+    counter_buffer.start()
+    
     # 运行应用
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=(env == 'development'))
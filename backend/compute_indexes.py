@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+根据价格K线和成交日汇总计算能源指数
+
+用法: python compute_indexes.py [--since 2024-01-01]
+      不指定 --since 时全部重算，并删除不是由计算引擎写入的旧指数行
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from services.index_service import index_service
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='计算能源指数')
+    parser.add_argument('--since', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        help='只重算该日及之后的指数值，默认全部重算')
+    args = parser.parse_args()
+
+    print("开始计算能源指数...")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        if args.since:
+            latest = index_service.recompute(args.since)
+            for index in latest:
+                print(f"  {index['index_code']}: {index['index_value']} ({index['index_date'][:10]})")
+        else:
+            count, stale = index_service.rebuild()
+            print(f"  共 {count} 条指数数据, 删除 {stale} 条旧数据")
+
+    print("\n能源指数计算完成！")
+
+
+if __name__ == '__main__':
+    main()
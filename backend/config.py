@@ -26,6 +26,16 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-2024'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     
+    # 数据写入令牌（行情批量导入等接口使用），未设置环境变量时拒绝全部写入请求
+    INGEST_API_TOKEN = os.environ.get('INGEST_API_TOKEN')
+    
+    # 浏览 / 下载计数落库间隔（秒）
+    COUNTER_FLUSH_INTERVAL = 5
+    
+    # 是否启动计数后台落库线程：python app.py 自动开启，gunicorn 等 WSGI 服务需设置环境变量，
+    # 命令行脚本保持关闭，只在退出时落库
+    COUNTER_FLUSH_THREAD = os.environ.get('COUNTER_FLUSH_THREAD', '').lower() in ('1', 'true')
+    
     # CORS配置
     CORS_ORIGINS = ['*']
     
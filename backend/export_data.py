@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+导出价格或成交历史数据
+
+用法: python export_data.py prices|deals [--format csv|ndjson|parquet|arrow] [--output 文件]
+                            [--product-type LNG] [--region 上海] [--start 2024-01-01] [--end 2025-01-01]
+                            [--chunk-size 5000]
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from services.export_service import export_service, DATASETS, FORMATS, DEFAULT_CHUNK_SIZE
+
+
+def parse_date(value):
+    """解析 YYYY-MM-DD 日期参数"""
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='导出价格或成交历史数据')
+    parser.add_argument('dataset', choices=sorted(DATASETS), help='导出的数据集')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='导出格式')
+    parser.add_argument('--output', help='输出文件，默认为 energy_<数据集>_<日期>.<扩展名>')
+    parser.add_argument('--product-type', help='按品种过滤')
+    parser.add_argument('--region', help='按地区过滤')
+    parser.add_argument('--start', type=parse_date, help='起始日期（含）')
+    parser.add_argument('--end', type=parse_date, help='截止日期（不含）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每次从游标读取的行数')
+    args = parser.parse_args()
+
+    output = args.output or f"energy_{args.dataset}_{datetime.now():%Y%m%d}.{FORMATS[args.format][1]}"
+    print(f"开始导出 {args.dataset} 数据到: {output}")
+
+    app = create_app('development')
+
+    with app.app_context():
+        try:
+            chunks = export_service.stream(
+                args.dataset,
+                args.format,
+                chunk_size=args.chunk_size,
+                product_type=args.product_type,
+                region=args.region,
+                start=args.start,
+                end=args.end
+            )
+        except ValueError as e:
+            print(f"导出失败: {e}")
+            return
+
+        size = 0
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+
+    print(f"  已写入 {size / 1024 / 1024:.2f} MB")
+    print("\n数据导出完成！")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+扫描全部资讯和研报，报告近似重复的内容簇
+
+用法: python find_duplicates.py [--workers 4] [--threshold 0.9] [--save]
+
+MinHash 签名分块交给多个进程并行计算；之后按 LSH 分段分桶，只估算同桶内容的
+相似度，用并查集合并成簇。--save 时把算出的签名写回 fingerprint 列
+（已有库请先执行 python migrate_energy_tables.py fingerprint 增加该列）。
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+from sqlalchemy import bindparam
+from sqlalchemy.orm import undefer_group
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from utils.fingerprint import DEFAULT_THRESHOLD, bands, minhash, similarity
+from services.dedup_service import fingerprint_text
+from services.search_service import DOC_TYPES
+
+# 每个进程任务处理的内容数
+CHUNK_SIZE = 200
+
+
+def fingerprint_chunk(items):
+    """计算一块内容的签名 [(键, 签名)]，在工作进程中执行"""
+    return [(key, minhash(text)) for key, text in items]
+
+
+def iter_chunks(chunk_size=CHUNK_SIZE):
+    """分块读取全部资讯和研报 [((类型, id), 文本)]，以及 {(类型, id): 标题}"""
+    titles = {}
+    chunk = []
+    for doc_type, model in DOC_TYPES.items():
+        query = model.query.options(undefer_group('body')).order_by(model.id)
+        for obj in query.yield_per(chunk_size):
+            key = (doc_type, obj.id)
+            titles[key] = obj.title
+            chunk.append((key, fingerprint_text(obj)))
+            if len(chunk) >= chunk_size:
+                yield chunk, titles
+                chunk = []
+    if chunk:
+        yield chunk, titles
+
+
+def find_clusters(fingerprints, threshold):
+    """按 LSH 分段分桶后在桶内比较，返回近似重复簇（每簇为键列表，按簇大小降序）"""
+    parent = {key: key for key in fingerprints}
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    buckets = {}
+    for key, value in fingerprints.items():
+        for band in bands(value):
+            buckets.setdefault(band, []).append(key)
+
+    for members in buckets.values():
+        for a, b in combinations(members, 2):
+            if root(a) != root(b) and similarity(fingerprints[a], fingerprints[b]) >= threshold:
+                parent[root(a)] = root(b)
+
+    clusters = {}
+    for key in fingerprints:
+        clusters.setdefault(root(key), []).append(key)
+    return sorted(
+        (sorted(members) for members in clusters.values() if len(members) > 1),
+        key=len, reverse=True
+    )
+
+
+def save_fingerprints(fingerprints):
+    """把签名写回各表的 fingerprint 列"""
+    for doc_type, model in DOC_TYPES.items():
+        table = model.__table__
+        rows = [
+            {'row_id': id_, 'value': value}
+            for (key_type, id_), value in fingerprints.items() if key_type == doc_type
+        ]
+        if rows:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('row_id')).values(fingerprint=bindparam('value')),
+                rows
+            )
+    db.session.commit()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='扫描资讯和研报中的近似重复内容')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='计算签名的进程数')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='视为近似重复的最低估算相似度')
+    parser.add_argument('--save', action='store_true', help='把签名写回 fingerprint 列')
+    args = parser.parse_args()
+
+    if not 0 < args.threshold <= 1:
+        parser.error('--threshold 应在 0 到 1 之间')
+
+    print("开始扫描近似重复内容...")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+
+        fingerprints = {}
+        titles = {}
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = []
+            for chunk, titles in iter_chunks():
+                futures.append(executor.submit(fingerprint_chunk, chunk))
+            for future in futures:
+                fingerprints.update((key, value) for key, value in future.result() if value is not None)
+        print(f"  计算签名 {len(fingerprints)} 篇")
+
+        if args.save:
+            save_fingerprints(fingerprints)
+            print("  签名已写回 fingerprint 列")
+
+        clusters = find_clusters(fingerprints, args.threshold)
+        print(f"  发现 {len(clusters)} 个近似重复簇")
+        for number, members in enumerate(clusters, 1):
+            print(f"\n  簇 {number}（{len(members)} 篇）:")
+            for doc_type, id_ in members:
+                print(f"    [{doc_type} {id_}] {titles[(doc_type, id_)]}")
+
+    print("\n近似重复扫描完成！")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+从CSV或JSON文件批量导入能源成交，按 deal_id 去重更新，可重复执行
+
+用法: python import_deals.py deals.csv [--batch-size 5000] [--chunk-size 1000]
+      支持 .csv、.json（数组）和 .jsonl / .ndjson（每行一个对象）
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from services.deal_ingest_service import deal_ingest_service, DEFAULT_BATCH_SIZE
+
+
+def load_deal_file(file_path, batch_size):
+    """按扩展名分批读取CSV或JSON成交文件"""
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension in ('.jsonl', '.ndjson'):
+        return deal_ingest_service.parse_json_lines(file_path, batch_size)
+
+    if extension == '.json':
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('data', [])
+        return deal_ingest_service.parse_records(data, batch_size)
+
+    return deal_ingest_service.parse_csv(file_path, batch_size)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='批量导入能源成交')
+    parser.add_argument('file', help='CSV或JSON成交文件')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批读取并提交的行数')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='每条INSERT语句写入的行数')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"找不到文件: {args.file}")
+        return
+
+    print(f"开始导入成交数据: {args.file}")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        frames = load_deal_file(args.file, args.batch_size)
+        result = deal_ingest_service.ingest_batches(frames, chunk_size=args.chunk_size)
+
+    print(f"  共 {result['batches']} 批: 新增 {result['inserted']} 条, 更新 {result['updated']} 条, 未变化 {result['unchanged']} 条")
+    if result['rejected']:
+        print(f"  拒绝 {len(result['rejected'])} 条:")
+        for reject in result['rejected'][:20]:
+            print(f"    第 {reject['row'] + 1} 行 ({reject['deal_id']}): {reject['error']}")
+
+    print("\n成交数据导入完成！")
+
+
+if __name__ == '__main__':
+    main()
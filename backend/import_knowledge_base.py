@@ -1,20 +1,26 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-导入知识库文章到MongoDB
+导入知识库文章到MySQL
+
+标题已存在或与已有内容近似重复（MinHash，见 services/dedup_service.py）的条目会跳过，
+可重复执行。
 """
 
 import os
 import sys
 import json
+from collections import Counter
 from datetime import datetime
 import re
 
 # 添加项目路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from app import create_app
 from utils.database import db
 from models.energy_data import EnergyNews, EnergyReport
+from services.dedup_service import dedup_service, fingerprint_text
 
 
 def extract_regions_from_content(content):
@@ -138,6 +144,30 @@ def parse_date_string(date_str):
     return datetime.now()
 
 
+def insert_unique(model, doc_type, doc, existing_titles, label):
+    """写入一条内容，标题已存在或与已有内容近似重复时跳过"""
+    if doc['title'] in existing_titles[doc_type]:
+        return False
+    
+    obj = model(**doc)
+    value, matches = dedup_service.find_text(fingerprint_text(obj))
+    if matches:
+        (match_type, match_id), score = matches[0]
+        print(f"  跳过近似重复{label}: {doc['title']}（与 {match_type} {match_id} 相似度 {score:.2f}）")
+        return False
+    
+    # 签名已算出，写入时不再重复计算
+    obj.fingerprint = value
+    db.session.add(obj)
+    db.session.flush()
+    
+    # 同一批次中后续条目也要和本条查重
+    existing_titles[doc_type].add(doc['title'])
+    dedup_service.add((doc_type, obj.id), value)
+    print(f"  插入{label}: {doc['title']}")
+    return True
+
+
 def import_knowledge_base_json():
     """导入JSON格式的知识库数据"""
     json_file = os.path.join(os.path.dirname(__file__), '..', 'docs', '知识库标签结构化数据-417eb46d29.json')
@@ -151,8 +181,16 @@ def import_knowledge_base_json():
     with open(json_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
-    news_collection = db.get_collection('energy_news')
-    reports_collection = db.get_collection('energy_reports')
+    # 已有标题一次读出，不再逐条查询
+    existing_titles = {
+        'news': {title for (title,) in EnergyNews.query.with_entities(EnergyNews.title)},
+        'report': {title for (title,) in EnergyReport.query.with_entities(EnergyReport.title)},
+    }
+    
+    missing = dedup_service.missing_count()
+    if missing:
+        print(f"  警告: {missing} 篇已有内容没有签名，与这些内容只能按标题查重；"
+              f"请先运行 python find_duplicates.py --save 回填签名")
     
     # 处理规章制度知识库
     if '规章制度知识库' in data:
@@ -186,10 +224,7 @@ def import_knowledge_base_json():
                 'url': item.get('页面地址', '')
             }
             
-            # 检查是否已存在
-            if not news_collection.find_one({'title': news_doc['title']}):
-                news_collection.insert_one(news_doc)
-                print(f"  插入规章制度: {news_doc['title']}")
+            insert_unique(EnergyNews, 'news', news_doc, existing_titles, '规章制度')
     
     # 处理上市品种与交易指引知识库
     if '上市品种与交易指引知识库' in data:
@@ -221,9 +256,7 @@ def import_knowledge_base_json():
                 'access_level': 'free'
             }
             
-            if not reports_collection.find_one({'title': report_doc['title']}):
-                reports_collection.insert_one(report_doc)
-                print(f"  插入交易指引: {report_doc['title']}")
+            insert_unique(EnergyReport, 'report', report_doc, existing_titles, '交易指引')
     
     # 处理客服助手知识库
     if '客服助手知识库' in data:
@@ -252,9 +285,7 @@ def import_knowledge_base_json():
                 'url': item.get('页面地址', '')
             }
             
-            if not news_collection.find_one({'title': news_doc['title']}):
-                news_collection.insert_one(news_doc)
-                print(f"  插入服务指南: {news_doc['title']}")
+            insert_unique(EnergyNews, 'news', news_doc, existing_titles, '服务指南')
     
     # 处理政策数据详情知识库
     if '政策数据详情知识库' in data:
@@ -287,9 +318,9 @@ def import_knowledge_base_json():
                 'url': item.get('链接', '')
             }
             
-            if not news_collection.find_one({'title': news_doc['title']}):
-                news_collection.insert_one(news_doc)
-                print(f"  插入政策法规: {news_doc['title']}")
+            insert_unique(EnergyNews, 'news', news_doc, existing_titles, '政策法规')
+    
+    db.session.commit()
 
 
 def import_markdown_files():
@@ -313,12 +344,11 @@ def main():
     """主函数"""
     print("开始导入知识库数据...")
     
-    # 连接数据库
-    if not db.connect():
-        print("数据库连接失败")
-        return
+    app = create_app('development')
     
-    try:
+    with app.app_context():
+        db.create_all()
+        
         # 导入JSON数据
         import_knowledge_base_json()
         
@@ -326,11 +356,8 @@ def main():
         # import_markdown_files()
         
         # 显示统计信息
-        news_collection = db.get_collection('energy_news')
-        reports_collection = db.get_collection('energy_reports')
-        
-        news_count = news_collection.count_documents({})
-        reports_count = reports_collection.count_documents({})
+        news_count = EnergyNews.query.count()
+        reports_count = EnergyReport.query.count()
         
         print(f"\n导入统计:")
         print(f"  资讯总数: {news_count}")
@@ -338,40 +365,32 @@ def main():
         
         # 显示标签统计
         print("\n标签统计:")
+        tag_counts = Counter()
+        for (tags,) in EnergyNews.query.with_entities(EnergyNews.tags):
+            tag_counts.update(set(tags or []))
         
         # 统计地区标签
-        region_pipeline = [
-            {"$unwind": "$tags"},
-            {"$match": {"tags": {"$in": ["上海", "北京", "广州", "深圳", "浙江", "江苏", "山东", "天津", "重庆", "四川"]}}},
-            {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 10}
-        ]
-        
-        region_stats = list(news_collection.aggregate(region_pipeline))
+        region_tags = ["上海", "北京", "广州", "深圳", "浙江", "江苏", "山东", "天津", "重庆", "四川"]
+        region_stats = sorted(
+            ((tag, tag_counts[tag]) for tag in region_tags if tag_counts[tag]),
+            key=lambda stat: -stat[1]
+        )
         if region_stats:
             print("  地区标签分布:")
-            for stat in region_stats:
-                print(f"    {stat['_id']}: {stat['count']} 篇")
+            for tag, count in region_stats:
+                print(f"    {tag}: {count} 篇")
         
         # 统计产品标签
-        product_pipeline = [
-            {"$unwind": "$tags"},
-            {"$match": {"tags": {"$in": ["管道天然气", "液化天然气", "压缩天然气", "原油", "成品油", "煤炭"]}}},
-            {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        
-        product_stats = list(news_collection.aggregate(product_pipeline))
+        product_tags = ["管道天然气", "液化天然气", "压缩天然气", "原油", "成品油", "煤炭"]
+        product_stats = sorted(
+            ((tag, tag_counts[tag]) for tag in product_tags if tag_counts[tag]),
+            key=lambda stat: -stat[1]
+        )
         if product_stats:
             print("\n  产品标签分布:")
-            for stat in product_stats:
-                print(f"    {stat['_id']}: {stat['count']} 篇")
-        
-    finally:
-        # 关闭数据库连接
-        db.close()
+            for tag, count in product_stats:
+                print(f"    {tag}: {count} 篇")
 
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
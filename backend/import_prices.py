@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+从CSV或JSON文件批量导入能源价格
+
+用法: python import_prices.py prices.csv [--chunk-size 1000]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from services.price_ingest_service import price_ingest_service
+
+
+def load_price_file(file_path):
+    """按扩展名读取CSV或JSON报价文件"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    if file_path.lower().endswith('.json'):
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get('data', [])
+        return price_ingest_service.parse_records(data)
+
+    return price_ingest_service.parse_csv(content)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='批量导入能源价格')
+    parser.add_argument('file', help='CSV或JSON报价文件')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='每条INSERT语句写入的行数')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"找不到文件: {args.file}")
+        return
+
+    print(f"开始导入价格数据: {args.file}")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        frame = load_price_file(args.file)
+        result = price_ingest_service.ingest(frame, chunk_size=args.chunk_size)
+
+    print(f"  导入 {result['inserted']} 条, 涉及 {result['series']} 个序列")
+    if result['rejected']:
+        print(f"  拒绝 {len(result['rejected'])} 条:")
+        for reject in result['rejected'][:20]:
+            print(f"    第 {reject['row'] + 1} 行: {reject['error']}")
+
+    print("\n价格数据导入完成！")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,9 +13,12 @@ import random
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app
-from models.user import User, UserBehavior, UserTag
-from models.energy_data import EnergyNews, EnergyPrice, EnergyDeal, EnergyReport, EnergyIndex
+from models.user import User
+from models.energy_data import EnergyNews, EnergyReport
 from utils.database import db
+from services.price_ingest_service import price_ingest_service
+from services.deal_ingest_service import deal_ingest_service
+from services.index_service import index_service
 
 # --- 以下为 shdemo 数据库初始化建表 SQL 示例 ---
 # 可直接在 MySQL 客户端执行：
@@ -104,6 +107,7 @@ CREATE TABLE energy_prices (
     is_latest BOOLEAN DEFAULT TRUE,
     price_date DATETIME NOT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_prices_series_date (product_type, region, price_date),
     INDEX(product_name),
     INDEX(product_type),
     INDEX(region),
@@ -307,7 +311,7 @@ def init_price_data():
     
     regions = ['北京', '上海', '广州', '深圳', '天津', '重庆', '江苏', '浙江', '山东', '河北', '湖北', '四川']
     
-    price_count = 0
+    new_prices = []
     base_date = datetime.now() - timedelta(days=30)
     
     for product_name, product_type in products:
@@ -341,16 +345,14 @@ def init_price_data():
                     'change_percent': change_percent,
                     'market': f'{region}能源交易市场',
                     'trading_volume': round(random.uniform(100, 1000), 2),
-                    'is_latest': (i == 29),  # 最后一天为最新价格
                     'price_date': current_date
                 }
                 
-                price = EnergyPrice(**price_data)
-                db.session.add(price)
-                price_count += 1
+                new_prices.append(price_data)
     
-    db.session.commit()
-    print(f"  已插入 {price_count} 条价格数据")
+    # 批量写入，最新价格标记、物化表和K线由入库服务统一维护
+    result = price_ingest_service.ingest(price_ingest_service.parse_records(new_prices))
+    print(f"  已插入 {result['inserted']} 条价格数据")
 
 def init_deal_data():
     """初始化成交数据"""
@@ -408,13 +410,9 @@ def init_deal_data():
         }
     ]
     
-    for data in deal_data:
-        if not EnergyDeal.query.filter_by(deal_id=data['deal_id']).first():
-            deal = EnergyDeal(**data)
-            db.session.add(deal)
-    
-    db.session.commit()
-    print(f"  已插入 {len(deal_data)} 条成交数据")
+    # 按 deal_id 批量写入，重复执行时已有成交不会重复插入，成交汇总由入库服务统一维护
+    result = deal_ingest_service.ingest_batches(deal_ingest_service.parse_records(deal_data))
+    print(f"  已插入 {result['inserted']} 条成交数据, 跳过 {result['unchanged'] + len(result['rejected'])} 条")
 
 def init_report_data():
     """初始化研报数据"""
@@ -484,54 +482,9 @@ def init_report_data():
     print(f"  已插入 {len(report_data)} 条研报数据")
 
 def init_index_data():
-    """初始化指数数据"""
-    index_names = [
-        ('中国天然气价格指数', 'CNGPI'),
-        ('上海石油天然气现货指数', 'SHPGSI'),
-        ('华南LNG价格指数', 'HNLPI'),
-        ('华东管道气价格指数', 'HDPGI'),
-        ('华北天然气供需指数', 'HBGDSI')
-    ]
-    
-    categories = ['价格指数', '供需指数', '市场指数']
-    regions = ['全国', '华东', '华南', '华北', '西南']
-    
-    index_count = 0
-    base_date = datetime.now() - timedelta(days=14)
-    
-    for i, (index_name, index_code) in enumerate(index_names):
-        for day in range(14):
-            current_date = base_date + timedelta(days=day)
-            
-            # 基础指数值
-            base_value = 100.0 + random.uniform(-20, 20)
-            index_value = round(base_value * (1 + random.uniform(-0.05, 0.05)), 2)
-            
-            # 计算变化
-            change_percent = round(random.uniform(-3, 3), 2)
-            change_amount = round(index_value * change_percent / 100, 2)
-            
-            index_data = {
-                'index_name': index_name,
-                'index_code': index_code,
-                'index_value': index_value,
-                'base_value': 100.0,
-                'change_amount': change_amount,
-                'change_percent': change_percent,
-                'category': categories[i % len(categories)],
-                'region': regions[i % len(regions)],
-                'description': f'{index_name}反映相关市场的价格变化趋势',
-                'calculation_method': '加权平均法',
-                'is_active': True,
-                'index_date': current_date
-            }
-            
-            index = EnergyIndex(**index_data)
-            db.session.add(index)
-            index_count += 1
-    
-    db.session.commit()
-    print(f"  已插入 {index_count} 条指数数据")
+    """初始化指数数据，按指数定义从价格K线和成交汇总计算"""
+    count, _ = index_service.rebuild()
+    print(f"  已计算 {count} 条指数数据")
 
 def init_user_data():
     """初始化测试用户数据"""
@@ -0,0 +1,526 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+energy_prices / energy_deals 等能源数据表结构迁移工具
+
+用法:
+    python migrate_energy_tables.py indexes                 # 补齐复合索引
+    python migrate_energy_tables.py unique                  # 增加报价唯一键（先删除重复报价）
+    python migrate_energy_tables.py sequence                # 增加增量同步用的 change_seq 列
+    python migrate_energy_tables.py counterparty            # 增加交易对手规范化名称列
+    python migrate_energy_tables.py fingerprint             # 增加资讯/研报 MinHash 签名列
+    python migrate_energy_tables.py collation               # 标签规范化名称改为按字节比较
+    python migrate_energy_tables.py partition               # 按月 RANGE 分区
+    python migrate_energy_tables.py rotate [--months-ahead 3] [--retention-months 36]
+    python migrate_energy_tables.py benchmark [--rows 2000000]
+
+分区说明:
+    MySQL 要求分区表的每个唯一键都包含分区列，因此分区时主键改为 (id, 日期列)，
+    energy_deals 的 deal_id 唯一索引改为 (deal_id, deal_date)。成交日期在入库后
+    不再变化，按 deal_id 去重的逻辑不受影响。
+
+唯一键说明:
+    energy_prices 的 (product_type, region, price_date) 唯一键供批量入库按序列和时间
+    覆盖重复报价。增加前删除重复行（保留 id 最大的一行），之后请运行
+    rebuild_latest_prices.py 和 rebuild_price_candles.py。唯一键包含分区列，
+    分区前后均可执行。
+
+分区轮转建议由 cron 每天执行一次:
+    0 1 * * * cd /path/to/backend && python migrate_energy_tables.py rotate
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import MetaData, text
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from models.energy_data import EnergyPrice, EnergyDeal
+
+# 需要补齐的复合索引，与 models/energy_data.py 中的声明保持一致；
+# 已有同列的唯一键（如 uq_prices_series_date）时跳过
+COMPOSITE_INDEXES = {
+    'energy_prices': {
+        'idx_prices_series_date': ('product_type', 'region', 'price_date'),
+    },
+    'energy_deals': {
+        'idx_deals_product_date': ('product_type', 'deal_date'),
+    },
+    'energy_news': {
+        'idx_news_status_time': ('status', 'publish_time', 'id'),
+        'idx_news_category_time': ('category', 'status', 'publish_time', 'id'),
+    },
+    'energy_reports': {
+        'idx_reports_access_date': ('access_level', 'publish_date', 'id'),
+        'idx_reports_type_date': ('report_type', 'publish_date', 'id'),
+    },
+}
+
+# 需要增加的唯一键，与 models/energy_data.py 中的声明保持一致
+UNIQUE_KEYS = {
+    'energy_prices': {
+        'uq_prices_series_date': ('product_type', 'region', 'price_date'),
+    },
+}
+
+# 需要增加 change_seq 列的表，已有行保持为 NULL（早于任何游标）
+CHANGE_SEQ_TABLES = ('energy_prices', 'energy_deals', 'energy_indexes')
+
+# energy_deals 的交易对手规范化名称列，增加后运行 rebuild_counterparty_stats.py 补算
+COUNTERPARTY_COLUMNS = ('buyer_key', 'seller_key')
+
+# 增加 MinHash 签名列的表，增加后运行 find_duplicates.py --save 补算
+FINGERPRINT_TABLES = ('energy_news', 'energy_reports')
+
+# 需要按字节比较的列 (表, 列, 列定义)，修改后运行 rebuild_content_tags.py 重建标签索引
+BINARY_COLLATION_COLUMNS = (
+    ('energy_tags', 'tag_key', 'VARCHAR(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL'),
+)
+
+# 分区列
+PARTITION_COLUMNS = {
+    'energy_prices': 'price_date',
+    'energy_deals': 'deal_date',
+}
+
+FUTURE_PARTITION = 'p_future'
+
+
+def month_start(value):
+    """月初"""
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value):
+    """下个月月初"""
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def partition_definition(month):
+    """单个月份分区定义，分区名形如 p202401"""
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{next_month(month):%Y-%m-%d}'))"
+
+
+def existing_indexes(conn, table):
+    """读取表上已有的索引 {索引名: ((列,...), non_unique)}"""
+    rows = conn.execute(text("""
+        SELECT index_name, column_name, non_unique
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = :table
+        ORDER BY index_name, seq_in_index
+    """), {'table': table})
+
+    indexes = {}
+    for index_name, column_name, non_unique in rows:
+        columns, _ = indexes.get(index_name, ((), non_unique))
+        indexes[index_name] = (columns + (column_name,), non_unique)
+    return indexes
+
+
+def existing_partitions(conn, table):
+    """读取表上已有的分区名（按顺序）"""
+    rows = conn.execute(text("""
+        SELECT partition_name
+        FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = :table AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+    """), {'table': table})
+    return [row[0] for row in rows]
+
+
+def add_composite_indexes(conn, table, indexes):
+    """补齐缺失的复合索引，已有同名或同列索引时跳过"""
+    existing = existing_indexes(conn, table)
+    existing_columns = {columns for columns, _ in existing.values()}
+
+    clauses = [
+        f"ADD INDEX {name} ({', '.join(columns)})"
+        for name, columns in indexes.items()
+        if name not in existing and columns not in existing_columns
+    ]
+    if clauses:
+        conn.execute(text(f"ALTER TABLE {table} {', '.join(clauses)}"))
+    return len(clauses)
+
+
+def add_unique_keys(conn, table, keys):
+    """删除重复行后增加唯一键，已有同名或同列唯一键时跳过
+
+    重复行保留 id 最大的一行；同列的普通复合索引被唯一键覆盖，一并删除。
+    返回 (新增唯一键数, 删除的重复行数)。
+    """
+    existing = existing_indexes(conn, table)
+    added = removed = 0
+    for name, columns in keys.items():
+        if name in existing or (columns, 0) in existing.values():
+            continue
+
+        matches = ' AND '.join(f"a.{column} = b.{column}" for column in columns)
+        removed += conn.execute(text(
+            f"DELETE a FROM {table} a JOIN {table} b ON {matches} AND a.id < b.id"
+        )).rowcount
+
+        clauses = [f"ADD UNIQUE INDEX {name} ({', '.join(columns)})"]
+        clauses += [
+            f"DROP INDEX {other}" for other, (other_columns, non_unique) in existing.items()
+            if non_unique and other_columns == columns
+        ]
+        conn.execute(text(f"ALTER TABLE {table} {', '.join(clauses)}"))
+        added += 1
+    return added, removed
+
+
+def column_exists(conn, table, column):
+    """列是否已存在"""
+    return bool(conn.execute(text("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = :table AND column_name = :column
+    """), {'table': table, 'column': column}).scalar())
+
+
+def add_column(conn, table, column, definition):
+    """增加列，已存在时跳过"""
+    if column_exists(conn, table, column):
+        return False
+
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+    return True
+
+
+def add_indexed_column(conn, table, column, definition):
+    """增加带单列索引的列，已存在时跳过"""
+    if column_exists(conn, table, column):
+        return False
+
+    conn.execute(text(
+        f"ALTER TABLE {table} ADD COLUMN {column} {definition}, "
+        f"ADD INDEX ix_{table}_{column} ({column})"
+    ))
+    return True
+
+
+def set_binary_collation(conn, table, column, definition):
+    """将列改为 utf8mb4_bin 排序规则，已是该规则时跳过"""
+    collation = conn.execute(text("""
+        SELECT collation_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = :table AND column_name = :column
+    """), {'table': table, 'column': column}).scalar()
+    if collation == 'utf8mb4_bin':
+        return False
+
+    conn.execute(text(f"ALTER TABLE {table} MODIFY {column} {definition}"))
+    return True
+
+
+def add_change_seq_column(conn, table):
+    """增加 change_seq 列及其索引，已存在时跳过"""
+    return add_indexed_column(conn, table, 'change_seq', 'BIGINT NULL')
+
+
+def partition_table(conn, table, date_column, months_ahead=3):
+    """将表转换为按月 RANGE 分区，已分区时跳过"""
+    if existing_partitions(conn, table):
+        return False
+
+    first = conn.execute(text(f"SELECT MIN({date_column}) FROM {table}")).scalar() or datetime.now()
+    last = month_start(datetime.now())
+    for _ in range(months_ahead):
+        last = next_month(last)
+
+    partitions = []
+    month = month_start(first)
+    while month <= last:
+        partitions.append(partition_definition(month))
+        month = next_month(month)
+    partitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+
+    # 唯一键必须包含分区列
+    clauses = [f"DROP PRIMARY KEY, ADD PRIMARY KEY (id, {date_column})"]
+    for name, (columns, non_unique) in existing_indexes(conn, table).items():
+        if name != 'PRIMARY' and not non_unique and date_column not in columns:
+            clauses.append(f"DROP INDEX {name}, ADD UNIQUE INDEX {name} ({', '.join(columns + (date_column,))})")
+
+    conn.execute(text(
+        f"ALTER TABLE {table} {', '.join(clauses)} "
+        f"PARTITION BY RANGE (TO_DAYS({date_column})) ({', '.join(partitions)})"
+    ))
+    return True
+
+
+def rotate_partitions(conn, table, months_ahead=3, retention_months=None):
+    """预建未来月份分区，并按保留期删除过期分区
+
+    retention_months 为空时不删除任何数据。
+    """
+    partitions = existing_partitions(conn, table)
+    if not partitions:
+        return 0, 0
+
+    months = sorted(
+        datetime.strptime(name[1:], '%Y%m') for name in partitions
+        if name != FUTURE_PARTITION
+    )
+    target = month_start(datetime.now())
+    for _ in range(months_ahead):
+        target = next_month(target)
+
+    added = []
+    month = next_month(months[-1]) if months else month_start(datetime.now())
+    while month <= target:
+        added.append(partition_definition(month))
+        month = next_month(month)
+
+    if added:
+        added.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+        conn.execute(text(
+            f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO ({', '.join(added)})"
+        ))
+
+    dropped = []
+    if retention_months:
+        cutoff = month_start(datetime.now())
+        for _ in range(retention_months):
+            cutoff = month_start(cutoff - timedelta(days=1))
+        dropped = [f"p{month:%Y%m}" for month in months if month < cutoff]
+        if dropped:
+            conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {', '.join(dropped)}"))
+
+    return len(added) - 1 if added else 0, len(dropped)
+
+
+# 基准测试的热点查询，与 energy_api.py 及其服务中的查询一致
+BENCHMARK_QUERIES = [
+    ('价格区间（单序列90天）', """
+        SELECT * FROM {prices}
+        WHERE product_type = 'LNG' AND region = '上海' AND price_date >= NOW() - INTERVAL 90 DAY
+        ORDER BY price_date DESC
+    """),
+    ('最新价格（按序列取最大日期）', """
+        SELECT product_type, region, MAX(price_date) FROM {prices}
+        WHERE (product_type, region) IN (('LNG', '上海'), ('PNG', '北京'), ('CNG', '广州'))
+        GROUP BY product_type, region
+    """),
+    ('K线重算（单序列单月）', """
+        SELECT price_date, price, trading_volume FROM {prices}
+        WHERE product_type = 'PNG' AND region = '江苏'
+          AND price_date >= DATE_FORMAT(NOW(), '%Y-%m-01') - INTERVAL 1 MONTH
+          AND price_date < DATE_FORMAT(NOW(), '%Y-%m-01')
+        ORDER BY price_date
+    """),
+    ('成交列表（品种30天第1页）', """
+        SELECT * FROM {deals}
+        WHERE product_type = 'LNG' AND deal_date >= NOW() - INTERVAL 30 DAY
+        ORDER BY deal_date DESC LIMIT 10
+    """),
+    ('成交计数（品种30天）', """
+        SELECT COUNT(*) FROM {deals}
+        WHERE product_type = 'LNG' AND deal_date >= NOW() - INTERVAL 30 DAY
+    """),
+]
+
+BENCHMARK_PRODUCTS = ['PNG', 'LNG', 'CNG']
+BENCHMARK_REGIONS = ['北京', '上海', '广州', '深圳', '天津', '重庆', '江苏', '浙江', '山东', '河北', '湖北', '四川']
+BENCHMARK_COMPANIES = ['华港燃气集团有限公司', '中国石化天然气分公司华南天然气销售中心', '北京燃气集团有限责任公司',
+                       '华润燃气（上海）有限公司', '中海石油天然气供应有限责任公司', '广东大鹏LNG有限公司']
+
+
+def create_benchmark_tables(conn):
+    """按模型建立不含复合索引和报价唯一键的基准测试表（随机数据可能有重复报价）"""
+    metadata = MetaData()
+    tables = {}
+    for model, name in ((EnergyPrice, 'bench_energy_prices'), (EnergyDeal, 'bench_energy_deals')):
+        table = model.__table__.to_metadata(metadata, name=name)
+        composite = COMPOSITE_INDEXES[model.__tablename__]
+        unique = UNIQUE_KEYS.get(model.__tablename__, {})
+        for index in list(table.indexes):
+            if index.name in composite:
+                table.indexes.discard(index)
+        for constraint in list(table.constraints):
+            if constraint.name in unique:
+                table.constraints.discard(constraint)
+        tables[model.__tablename__] = table
+
+    metadata.drop_all(conn)
+    metadata.create_all(conn)
+    return metadata, tables
+
+
+def fill_benchmark_tables(conn, tables, rows, chunk_size=5000):
+    """生成约三年的随机价格和成交数据"""
+    rng = np.random.default_rng(2024)
+    start = datetime.now() - timedelta(days=3 * 365)
+    span = 3 * 365 * 86400
+
+    for offset in range(0, rows, chunk_size):
+        count = min(chunk_size, rows - offset)
+        products = rng.integers(0, len(BENCHMARK_PRODUCTS), count).tolist()
+        regions = rng.integers(0, len(BENCHMARK_REGIONS), count).tolist()
+        seconds = rng.integers(0, span, count).tolist()
+        prices = rng.uniform(2.0, 6.0, count).round(2).tolist()
+        volumes = rng.uniform(100, 1000, count).round(2).tolist()
+
+        conn.execute(tables['energy_prices'].insert(), [
+            {
+                'product_name': BENCHMARK_PRODUCTS[products[i]],
+                'product_type': BENCHMARK_PRODUCTS[products[i]],
+                'region': BENCHMARK_REGIONS[regions[i]],
+                'price': prices[i],
+                'trading_volume': volumes[i],
+                'is_latest': False,
+                'price_date': start + timedelta(seconds=seconds[i])
+            }
+            for i in range(count)
+        ])
+
+        buyers = rng.integers(0, len(BENCHMARK_COMPANIES), count).tolist()
+        sellers = rng.integers(0, len(BENCHMARK_COMPANIES), count).tolist()
+        conn.execute(tables['energy_deals'].insert(), [
+            {
+                'deal_id': f'BENCH{offset + i:010d}',
+                'product_name': BENCHMARK_PRODUCTS[products[i]],
+                'product_type': BENCHMARK_PRODUCTS[products[i]],
+                'buyer': BENCHMARK_COMPANIES[buyers[i]],
+                'seller': BENCHMARK_COMPANIES[sellers[i]],
+                'deal_price': prices[i],
+                'deal_quantity': volumes[i],
+                'deal_amount': round(prices[i] * volumes[i] * 10000, 2),
+                'region': BENCHMARK_REGIONS[regions[i]],
+                'deal_type': '现货',
+                'deal_date': start + timedelta(seconds=seconds[i])
+            }
+            for i in range(count)
+        ])
+        print(f"  已生成 {offset + count}/{rows} 行")
+
+
+def time_queries(conn, repeat=3):
+    """执行热点查询，返回每条查询的最佳耗时（毫秒）"""
+    timings = []
+    for _, sql in BENCHMARK_QUERIES:
+        statement = text(sql.format(prices='bench_energy_prices', deals='bench_energy_deals'))
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(statement).fetchall()
+            best = min(best, time.perf_counter() - started)
+        timings.append(best * 1000)
+    return timings
+
+
+def run_benchmark(rows, keep=False):
+    """在生成的数据集上对比迁移前后的查询耗时"""
+    with db.engine.connect() as conn:
+        print(f"生成基准数据: {rows} 行价格 + {rows} 行成交...")
+        metadata, tables = create_benchmark_tables(conn)
+        fill_benchmark_tables(conn, tables, rows)
+        conn.execute(text("ANALYZE TABLE bench_energy_prices, bench_energy_deals"))
+        conn.commit()
+
+        before = time_queries(conn)
+
+        for source, table in (('energy_prices', 'bench_energy_prices'), ('energy_deals', 'bench_energy_deals')):
+            add_composite_indexes(conn, table, COMPOSITE_INDEXES[source])
+            partition_table(conn, table, PARTITION_COLUMNS[source])
+        conn.execute(text("ANALYZE TABLE bench_energy_prices, bench_energy_deals"))
+        conn.commit()
+
+        after = time_queries(conn)
+
+        print(f"\n{'查询':<28}{'迁移前(ms)':>12}{'迁移后(ms)':>12}{'提升':>8}")
+        for (label, _), old, new in zip(BENCHMARK_QUERIES, before, after):
+            print(f"{label:<28}{old:>12.1f}{new:>12.1f}{old / new if new else 0:>7.1f}x")
+
+        if not keep:
+            metadata.drop_all(conn)
+            conn.commit()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='energy_prices / energy_deals 表结构迁移')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('indexes', help='补齐复合索引')
+    subparsers.add_parser('unique', help='增加报价唯一键（先删除重复报价）')
+    subparsers.add_parser('sequence', help='增加增量同步用的 change_seq 列')
+    subparsers.add_parser('counterparty', help='增加交易对手规范化名称列')
+    subparsers.add_parser('fingerprint', help='增加资讯/研报 MinHash 签名列')
+    subparsers.add_parser('collation', help='标签规范化名称改为按字节比较')
+    partition_parser = subparsers.add_parser('partition', help='按月 RANGE 分区')
+    partition_parser.add_argument('--months-ahead', type=int, default=3, help='预建未来月份分区数')
+    rotate_parser = subparsers.add_parser('rotate', help='分区轮转')
+    rotate_parser.add_argument('--months-ahead', type=int, default=3, help='预建未来月份分区数')
+    rotate_parser.add_argument('--retention-months', type=int, help='保留月数，超出的分区将被删除（默认不删除）')
+    benchmark_parser = subparsers.add_parser('benchmark', help='生成数据并对比迁移前后的查询耗时')
+    benchmark_parser.add_argument('--rows', type=int, default=2000000, help='价格和成交各生成的行数')
+    benchmark_parser.add_argument('--keep', action='store_true', help='保留基准测试表')
+    args = parser.parse_args()
+
+    app = create_app('development')
+
+    with app.app_context():
+        if args.command == 'benchmark':
+            run_benchmark(args.rows, keep=args.keep)
+            return
+
+        with db.engine.begin() as conn:
+            if args.command == 'sequence':
+                for table in CHANGE_SEQ_TABLES:
+                    if add_change_seq_column(conn, table):
+                        print(f"  {table}: 已增加 change_seq 列")
+                    else:
+                        print(f"  {table}: change_seq 列已存在，跳过")
+
+            if args.command == 'counterparty':
+                for column in COUNTERPARTY_COLUMNS:
+                    if add_indexed_column(conn, 'energy_deals', column, 'VARCHAR(200) NULL'):
+                        print(f"  energy_deals: 已增加 {column} 列")
+                    else:
+                        print(f"  energy_deals: {column} 列已存在，跳过")
+
+            if args.command == 'fingerprint':
+                for table in FINGERPRINT_TABLES:
+                    if add_column(conn, table, 'fingerprint', 'VARBINARY(256) NULL'):
+                        print(f"  {table}: 已增加 fingerprint 列")
+                    else:
+                        print(f"  {table}: fingerprint 列已存在，跳过")
+
+            if args.command == 'collation':
+                for table, column, definition in BINARY_COLLATION_COLUMNS:
+                    if set_binary_collation(conn, table, column, definition):
+                        print(f"  {table}: {column} 已改为 utf8mb4_bin，请运行 rebuild_content_tags.py")
+                    else:
+                        print(f"  {table}: {column} 已是 utf8mb4_bin，跳过")
+
+            if args.command == 'indexes':
+                for table, indexes in COMPOSITE_INDEXES.items():
+                    count = add_composite_indexes(conn, table, indexes)
+                    print(f"  {table}: 新增 {count} 个复合索引")
+
+            if args.command == 'unique':
+                for table, keys in UNIQUE_KEYS.items():
+                    added, removed = add_unique_keys(conn, table, keys)
+                    print(f"  {table}: 删除 {removed} 条重复行, 新增 {added} 个唯一键")
+
+            for table, date_column in PARTITION_COLUMNS.items():
+                if args.command == 'partition':
+                    if partition_table(conn, table, date_column, args.months_ahead):
+                        print(f"  {table}: 已按 {date_column} 按月分区")
+                    else:
+                        print(f"  {table}: 已是分区表，跳过")
+                elif args.command == 'rotate':
+                    added, dropped = rotate_partitions(conn, table, args.months_ahead, args.retention_months)
+                    print(f"  {table}: 新增 {added} 个分区, 删除 {dropped} 个分区")
+
+    print("\n迁移完成！")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,24 +5,44 @@
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, JSON, Float, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, JSON, Float, Enum, func
+from sqlalchemy.orm import validates, deferred, column_property
+from utils.counters import counter_buffer
 from utils.database import db
+from utils.names import normalize_company_name
+
+# 列表卡片的摘要片段长度
+CARD_SNIPPET_LENGTH = 120
 
 # 能源资讯模型
 class EnergyNews(db.Model):
     """能源资讯模型"""
     __tablename__ = 'energy_news'
+    __table_args__ = (
+        # 资讯列表按 (publish_time, id) 游标分页
+        db.Index('idx_news_status_time', 'status', 'publish_time', 'id'),
+        db.Index('idx_news_category_time', 'category', 'status', 'publish_time', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(500), nullable=False, index=True)
-    content = db.Column(db.Text)
-    summary = db.Column(db.Text)
+    # 正文和摘要可能很大，默认不随列表查询加载，访问时或 undefer_group('body') 时读取
+    content = deferred(db.Column(db.Text), group='body')
+    summary = deferred(db.Column(db.Text), group='body')
     source = db.Column(db.String(200))
     author = db.Column(db.String(100))
     category = db.Column(db.String(100), index=True)
     tags = db.Column(db.JSON)
     url = db.Column(db.String(500))
     
+    # 标题和正文的 MinHash 签名（utils/fingerprint.py），用于近似重复检测
+    fingerprint = db.Column(db.VARBINARY(256))
+    
+    # 列表卡片的摘要片段，由数据库截取（无摘要时取正文开头）
+    snippet = column_property(
+        func.substr(func.coalesce(func.nullif(summary, ''), content), 1, CARD_SNIPPET_LENGTH)
+    )
+    
     # 统计信息
     view_count = db.Column(db.Integer, default=0)
     share_count = db.Column(db.Integer, default=0)
@@ -51,7 +71,7 @@ class EnergyNews(db.Model):
             'category': self.category,
             'tags': self.tags or [],
             'url': self.url,
-            'view_count': self.view_count,
+            'view_count': self.current_count('view_count'),
             'share_count': self.share_count,
             'status': self.status,
             'is_featured': self.is_featured,
@@ -60,16 +80,36 @@ class EnergyNews(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    def to_card(self):
+        """列表卡片（不含正文，摘要为截取的片段）"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'summary': self.snippet,
+            'tags': self.tags or [],
+            'category': self.category,
+            'source': self.source,
+            'view_count': self.current_count('view_count'),
+            'publish_time': self.publish_time.isoformat() if self.publish_time else None
+        }
+    
+    def current_count(self, column):
+        """计数列的当前值（含尚未落库的增量）"""
+        return (getattr(self, column) or 0) + counter_buffer.pending(self.__table__, column, self.id)
+    
     def increment_view_count(self):
-        """增加查看次数"""
-        self.view_count += 1
-        db.session.commit()
+        """增加查看次数（写入计数缓冲，定期批量落库）"""
+        counter_buffer.increment(self.__table__, 'view_count', self.id)
 
 
 # 能源价格模型
 class EnergyPrice(db.Model):
     """能源价格模型"""
     __tablename__ = 'energy_prices'
+    __table_args__ = (
+        # 同一序列同一时间只有一条报价；按序列取时间区间、求最新价格均走此索引
+        db.UniqueConstraint('product_type', 'region', 'price_date', name='uq_prices_series_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     product_name = db.Column(db.String(200), nullable=False, index=True)
@@ -96,6 +136,7 @@ class EnergyPrice(db.Model):
     # 时间戳
     price_date = db.Column(db.DateTime, nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, index=True)  # 变更序号，增量同步游标
     
     def __repr__(self):
         return f'<EnergyPrice {self.product_name} {self.region} {self.price}>'
@@ -123,10 +164,117 @@ class EnergyPrice(db.Model):
         }
 
 
+
+# 最新价格物化表
+class EnergyLatestPrice(db.Model):
+    """每个 (product_type, region) 的最新报价，随新价格入库原子更新"""
+    __tablename__ = 'energy_latest_prices'
+    __table_args__ = (
+        db.UniqueConstraint('product_type', 'region', name='uq_latest_product_region'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    product_type = db.Column(db.String(100), nullable=False)
+    region = db.Column(db.String(100), nullable=False)
+    price_id = db.Column(db.Integer, nullable=False)  # 对应 energy_prices.id
+    product_name = db.Column(db.String(200), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    price_unit = db.Column(db.String(50))
+    
+    # 价格信息
+    opening_price = db.Column(db.Float)
+    closing_price = db.Column(db.Float)
+    highest_price = db.Column(db.Float)
+    lowest_price = db.Column(db.Float)
+    change_amount = db.Column(db.Float)
+    change_percent = db.Column(db.Float)
+    
+    # 市场信息
+    market = db.Column(db.String(100))
+    trading_volume = db.Column(db.Float)
+    
+    # 时间戳
+    price_date = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<EnergyLatestPrice {self.product_type} {self.region} {self.price}>'
+    
+    def to_dict(self):
+        """转换为字典（字段与 EnergyPrice.to_dict() 保持一致）"""
+        return {
+            'id': self.price_id,
+            'product_name': self.product_name,
+            'product_type': self.product_type,
+            'region': self.region,
+            'price': self.price,
+            'price_unit': self.price_unit,
+            'opening_price': self.opening_price,
+            'closing_price': self.closing_price,
+            'highest_price': self.highest_price,
+            'lowest_price': self.lowest_price,
+            'change_amount': self.change_amount,
+            'change_percent': self.change_percent,
+            'market': self.market,
+            'trading_volume': self.trading_volume,
+            'is_latest': True,
+            'price_date': self.price_date.isoformat() if self.price_date else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+# 价格K线汇总模型
+class EnergyPriceCandle(db.Model):
+    """按 (product_type, region, interval) 汇总的 OHLCV K线"""
+    __tablename__ = 'energy_price_candles'
+    __table_args__ = (
+        db.UniqueConstraint('product_type', 'region', 'interval', 'bucket_start', name='uq_candle_series_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    product_type = db.Column(db.String(100), nullable=False)
+    region = db.Column(db.String(100), nullable=False)
+    interval = db.Column(db.String(10), nullable=False)  # day, week, month
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    
+    # OHLCV
+    open = db.Column(db.Float)
+    high = db.Column(db.Float)
+    low = db.Column(db.Float)
+    close = db.Column(db.Float)
+    volume = db.Column(db.Float)
+    quote_count = db.Column(db.Integer, default=0)
+    
+    # 时间戳
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<EnergyPriceCandle {self.product_type} {self.region} {self.interval} {self.bucket_start}>'
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'product_type': self.product_type,
+            'region': self.region,
+            'interval': self.interval,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume,
+            'quote_count': self.quote_count
+        }
+
 # 能源成交模型
 class EnergyDeal(db.Model):
     """能源成交模型"""
     __tablename__ = 'energy_deals'
+    __table_args__ = (
+        # 成交列表按品种过滤、按 (deal_date, id) 游标分页；InnoDB 二级索引末尾隐含主键 id
+        db.Index('idx_deals_product_date', 'product_type', 'deal_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     deal_id = db.Column(db.String(100), unique=True, nullable=False, index=True)
@@ -136,6 +284,8 @@ class EnergyDeal(db.Model):
     # 交易双方
     buyer = db.Column(db.String(200), nullable=False, index=True)
     seller = db.Column(db.String(200), nullable=False, index=True)
+    buyer_key = db.Column(db.String(200), index=True)  # 规范化名称，赋值买方时自动计算
+    seller_key = db.Column(db.String(200), index=True)  # 规范化名称，赋值卖方时自动计算
     
     # 交易信息
     deal_price = db.Column(db.Float, nullable=False)
@@ -155,10 +305,17 @@ class EnergyDeal(db.Model):
     # 时间戳
     deal_date = db.Column(db.DateTime, nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, index=True)  # 变更序号，增量同步游标
     
     def __repr__(self):
         return f'<EnergyDeal {self.deal_id}>'
     
+    @validates('buyer', 'seller')
+    def _set_counterparty_key(self, key, value):
+        """买卖方名称入库时同步写入规范化键"""
+        setattr(self, f'{key}_key', normalize_company_name(value))
+        return value
+    
     def to_dict(self):
         """转换为字典"""
         return {
@@ -182,10 +339,96 @@ class EnergyDeal(db.Model):
         }
 
 
+# 成交日汇总模型
+class EnergyDealRollup(db.Model):
+    """按 (product_type, region, deal_type, 日) 汇总的成交量与 VWAP
+
+    region / deal_type 为空时以空字符串存储，保证唯一键生效。
+    """
+    __tablename__ = 'energy_deal_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('product_type', 'region', 'deal_type', 'day', name='uq_deal_rollup_bucket'),
+        db.Index('idx_deal_rollups_day', 'day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    product_type = db.Column(db.String(100), nullable=False)
+    region = db.Column(db.String(100), nullable=False, default='')
+    deal_type = db.Column(db.String(50), nullable=False, default='')
+    day = db.Column(db.Date, nullable=False)
+    
+    # 汇总值，VWAP = price_volume / volume
+    deal_count = db.Column(db.Integer, nullable=False, default=0)
+    volume = db.Column(db.Float, nullable=False, default=0)  # 成交量合计
+    amount = db.Column(db.Float, nullable=False, default=0)  # 成交金额合计
+    price_volume = db.Column(db.Float, nullable=False, default=0)  # 成交价 × 成交量合计
+    high_price = db.Column(db.Float)
+    low_price = db.Column(db.Float)
+    
+    # 时间戳
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<EnergyDealRollup {self.product_type} {self.region} {self.deal_type} {self.day}>'
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'product_type': self.product_type,
+            'region': self.region or None,
+            'deal_type': self.deal_type or None,
+            'day': self.day.isoformat() if self.day else None,
+            'deal_count': self.deal_count,
+            'volume': self.volume,
+            'amount': self.amount,
+            'vwap': self.price_volume / self.volume if self.volume else None,
+            'high_price': self.high_price,
+            'low_price': self.low_price
+        }
+
+
+# 交易对手月汇总模型
+class EnergyCounterpartyRollup(db.Model):
+    """按 (交易对手, 月, 买卖方向, 品种, 对手方) 汇总的成交
+
+    counterparty_key / counterpart_key 为规范化名称，*_name 保留最近一次出现的原始名称。
+    """
+    __tablename__ = 'energy_counterparty_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('counterparty_key', 'month', 'side', 'product_type', 'counterpart_key',
+                            name='uq_counterparty_rollup_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    counterparty_key = db.Column(db.String(200), nullable=False)
+    counterparty_name = db.Column(db.String(200), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # 月初
+    side = db.Column(db.String(10), nullable=False)  # buy, sell
+    product_type = db.Column(db.String(100), nullable=False)
+    counterpart_key = db.Column(db.String(200), nullable=False)
+    counterpart_name = db.Column(db.String(200), nullable=False)
+    
+    # 汇总值
+    deal_count = db.Column(db.Integer, nullable=False, default=0)
+    volume = db.Column(db.Float, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    
+    # 时间戳
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<EnergyCounterpartyRollup {self.counterparty_name} {self.month} {self.side}>'
+
+
 # 能源研报模型
 class EnergyReport(db.Model):
     """能源研报模型"""
     __tablename__ = 'energy_reports'
+    __table_args__ = (
+        # 研报列表按 (publish_date, id) 游标分页
+        db.Index('idx_reports_access_date', 'access_level', 'publish_date', 'id'),
+        db.Index('idx_reports_type_date', 'report_type', 'publish_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(500), nullable=False, index=True)
@@ -193,11 +436,17 @@ class EnergyReport(db.Model):
     organization = db.Column(db.String(200))
     report_type = db.Column(db.String(100), index=True)
     
-    # 内容信息
-    summary = db.Column(db.Text)
+    # 内容信息（摘要默认不随列表查询加载）
+    summary = deferred(db.Column(db.Text), group='body')
     keywords = db.Column(db.JSON)
     tags = db.Column(db.JSON)
     
+    # 标题和摘要的 MinHash 签名（utils/fingerprint.py），用于近似重复检测
+    fingerprint = db.Column(db.VARBINARY(256))
+    
+    # 列表卡片的摘要片段
+    snippet = column_property(func.substr(summary, 1, CARD_SNIPPET_LENGTH))
+    
     # 文件信息
     file_path = db.Column(db.String(500))
     file_size = db.Column(db.Integer)
@@ -237,8 +486,8 @@ class EnergyReport(db.Model):
             'file_size': self.file_size,
             'page_count': self.page_count,
             'access_level': self.access_level,
-            'download_count': self.download_count,
-            'view_count': self.view_count,
+            'download_count': self.current_count('download_count'),
+            'view_count': self.current_count('view_count'),
             'rating': self.rating,
             'is_featured': self.is_featured,
             'publish_date': self.publish_date.isoformat() if self.publish_date else None,
@@ -246,15 +495,70 @@ class EnergyReport(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    def to_card(self):
+        """列表卡片（不含完整摘要和文件信息）"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'summary': self.snippet,
+            'tags': self.tags or [],
+            'report_type': self.report_type,
+            'author': self.author,
+            'organization': self.organization,
+            'access_level': self.access_level,
+            'download_count': self.current_count('download_count'),
+            'view_count': self.current_count('view_count'),
+            'publish_date': self.publish_date.isoformat() if self.publish_date else None
+        }
+    
+    def current_count(self, column):
+        """计数列的当前值（含尚未落库的增量）"""
+        return (getattr(self, column) or 0) + counter_buffer.pending(self.__table__, column, self.id)
+    
     def increment_view_count(self):
-        """增加查看次数"""
-        self.view_count += 1
-        db.session.commit()
+        """增加查看次数（写入计数缓冲，定期批量落库）"""
+        counter_buffer.increment(self.__table__, 'view_count', self.id)
     
     def increment_download_count(self):
-        """增加下载次数"""
-        self.download_count += 1
-        db.session.commit()
+        """增加下载次数（写入计数缓冲，定期批量落库）"""
+        counter_buffer.increment(self.__table__, 'download_count', self.id)
+
+
+# 标签字典模型
+class EnergyTag(db.Model):
+    """资讯 / 研报标签字典，tag_key 为规范化名称（NFKC、小写）"""
+    __tablename__ = 'energy_tags'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tag_key = db.Column(db.String(100, collation='utf8mb4_bin'), nullable=False, unique=True)  # 按字节比较，见 services/tag_service.py
+    name = db.Column(db.String(100), nullable=False)  # 首次出现时的原始写法
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<EnergyTag {self.name}>'
+
+
+# 内容标签关联模型
+class EnergyContentTag(db.Model):
+    """资讯 / 研报的标签关联，由 JSON tags 列同步而来
+
+    按标签匹配内容时走 (content_type, tag_id, publish_time) 索引，不再扫描每篇内容的
+    JSON 数组。只包含已发布的资讯和全部研报。
+    """
+    __tablename__ = 'energy_content_tags'
+    __table_args__ = (
+        db.Index('idx_content_tags_match', 'content_type', 'tag_id', 'publish_time'),
+        db.Index('idx_content_tags_content', 'content_type', 'content_id'),
+    )
+    
+    tag_id = db.Column(db.Integer, primary_key=True)
+    content_type = db.Column(db.String(20), primary_key=True)  # news, report
+    content_id = db.Column(db.Integer, primary_key=True)
+    publish_time = db.Column(db.DateTime)
+    access_level = db.Column(db.String(20), nullable=False, default='free')  # 资讯均为 free
+    
+    def __repr__(self):
+        return f'<EnergyContentTag {self.content_type} {self.content_id} tag={self.tag_id}>'
 
 
 # 能源指数模型
@@ -286,6 +590,7 @@ class EnergyIndex(db.Model):
     # 时间戳
     index_date = db.Column(db.DateTime, nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, index=True)  # 变更序号，增量同步游标
     
     def __repr__(self):
         return f'<EnergyIndex {self.index_name} {self.index_value}>'
@@ -307,4 +612,15 @@ class EnergyIndex(db.Model):
             'is_active': self.is_active,
             'index_date': self.index_date.isoformat() if self.index_date else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        } 
\ No newline at end of file
+        } 
+
+# 变更序号模型
+class ChangeSequence(db.Model):
+    """增量同步变更序号，每个数据源一行"""
+    __tablename__ = 'change_sequences'
+    
+    feed = db.Column(db.String(50), primary_key=True)  # prices, deals, indexes
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ChangeSequence {self.feed}={self.value}>'
@@ -207,4 +207,90 @@ class UserTag(db.Model):
         )
         db.session.add(tag)
         db.session.commit()
-        return tag 
\ No newline at end of file
+        return tag 
+
+class PriceAlert(db.Model):
+    """价格提醒模型"""
+    __tablename__ = 'price_alerts'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    
+    # 提醒条件
+    product_type = db.Column(db.String(50), nullable=False)
+    region = db.Column(db.String(50), nullable=False)
+    direction = db.Column(db.String(10), nullable=False)  # above: 价格上穿, below: 价格下穿
+    threshold = db.Column(db.Float, nullable=False)
+    
+    # 状态，触发一次后失效
+    is_active = db.Column(db.Boolean, default=True)
+    triggered_at = db.Column(db.DateTime)
+    
+    # 时间戳
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_alerts_series_active', 'product_type', 'region', 'is_active'),
+    )
+    
+    def __repr__(self):
+        return f'<PriceAlert {self.product_type}-{self.region} {self.direction} {self.threshold}>'
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'product_type': self.product_type,
+            'region': self.region,
+            'direction': self.direction,
+            'threshold': self.threshold,
+            'is_active': self.is_active,
+            'triggered_at': self.triggered_at.isoformat() if self.triggered_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class AlertNotification(db.Model):
+    """价格提醒通知（用户收件箱）"""
+    __tablename__ = 'alert_notifications'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    alert_id = db.Column(db.Integer, db.ForeignKey('price_alerts.id', ondelete='SET NULL'))
+    
+    # 触发时的条件与价格
+    product_type = db.Column(db.String(50), nullable=False)
+    region = db.Column(db.String(50), nullable=False)
+    direction = db.Column(db.String(10), nullable=False)
+    threshold = db.Column(db.Float, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    price_date = db.Column(db.DateTime)
+    
+    # 状态
+    is_read = db.Column(db.Boolean, default=False)
+    
+    # 时间戳
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_notifications_user_read', 'user_id', 'is_read', 'id'),
+    )
+    
+    def __repr__(self):
+        return f'<AlertNotification {self.product_type}-{self.region} {self.price} for User {self.user_id}>'
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'alert_id': self.alert_id,
+            'product_type': self.product_type,
+            'region': self.region,
+            'direction': self.direction,
+            'threshold': self.threshold,
+            'price': self.price,
+            'price_date': self.price_date.isoformat() if self.price_date else None,
+            'is_read': self.is_read,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
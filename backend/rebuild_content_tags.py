@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+根据资讯 / 研报的 JSON tags 列重建标签字典和标签索引（energy_tags / energy_content_tags）
+
+用法: python rebuild_content_tags.py
+
+之后资讯 / 研报通过 ORM 写入时会自动同步，只有直接改库或首次上线时需要执行。
+"""
+
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models.energy_data import EnergyTag
+from utils.database import db
+from services.tag_service import tag_service
+
+
+def main():
+    """主函数"""
+    print("开始重建内容标签索引...")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        count = tag_service.rebuild()
+        print(f"  标签字典共 {EnergyTag.query.count()} 个标签")
+        print(f"  标签索引共 {count} 行")
+
+    print("\n内容标签索引重建完成！")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+补算交易对手规范化名称，并根据 energy_deals 重建交易对手月汇总
+
+用法: python rebuild_counterparty_stats.py
+
+已有库请先执行 python migrate_energy_tables.py counterparty 增加 buyer_key / seller_key 列。
+"""
+
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from services.counterparty_service import counterparty_service
+
+
+def main():
+    """主函数"""
+    print("开始重建交易对手汇总...")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        backfilled, count = counterparty_service.rebuild()
+        print(f"  补算规范化名称 {backfilled} 笔成交")
+        print(f"  汇总表共 {count} 个桶")
+
+    print("\n交易对手汇总重建完成！")
+
+
+if __name__ == '__main__':
+    main()
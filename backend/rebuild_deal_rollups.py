@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+根据 energy_deals 重新汇总成交日统计（VWAP / 成交量）
+
+用法: python rebuild_deal_rollups.py [--start 2024-01-01]
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from services.deal_rollup_service import deal_rollup_service
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='重新汇总成交日统计')
+    parser.add_argument('--start', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                        help='只重算该日及之后的汇总（用于补录历史成交），默认全部重算')
+    args = parser.parse_args()
+
+    print("开始重新汇总成交数据...")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        count = deal_rollup_service.rebuild(start=args.start)
+        print(f"  汇总表共 {count} 个桶")
+
+    print("\n成交汇总重建完成！")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+根据 energy_prices 历史重建最新价格物化表
+"""
+
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from services.latest_price_service import latest_price_service
+
+
+def main():
+    """主函数"""
+    print("开始重建最新价格物化表...")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        count = latest_price_service.rebuild()
+        print(f"  已重建 {count} 个序列的最新价格")
+
+    print("\n最新价格物化表重建完成！")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+根据 energy_prices 历史重建价格K线
+"""
+
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.database import db
+from services.candle_service import candle_service
+
+
+def main():
+    """主函数"""
+    print("开始重建价格K线...")
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.create_all()
+        count = candle_service.rebuild()
+        print(f"  已生成 {count} 根K线")
+
+    print("\n价格K线重建完成！")
+
+
+if __name__ == '__main__':
+    main()
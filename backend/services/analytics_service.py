@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+价格滚动分析：移动平均、滚动波动率、收益率
+
+所有序列首尾相接为一个扁平数组，借助分段前缀和一次性计算全部序列的
+滚动统计。结果按 (序列, 窗口) 缓存，并记录计算时序列最后一个点的
+price_date 和 id；序列追加了新价格时只用最后 window 个点的尾部窗口
+计算新增部分，不做全量重算。价格存储重新读取序列时（如原地修正的报价，
+日期和 id 不变）清除该序列的缓存。
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from services.price_store import price_store
+
+logger = logging.getLogger(__name__)
+
+# 年化波动率使用的年交易日数
+TRADING_DAYS_PER_YEAR = 252
+
+# 输出的统计列
+STAT_COLUMNS = ('return', 'ma', 'volatility', 'cumulative_return')
+
+
+def rolling_stats(prices, segment_starts, window):
+    """对首尾相接的多个序列计算滚动统计
+
+    prices 为扁平价格数组，segment_starts 为每个元素所属序列的起始下标。
+    返回 {'return', 'ma', 'volatility'}，窗口未满时为 NaN。
+    """
+    count = len(prices)
+    idx = np.arange(count)
+
+    # 移动平均
+    sums = np.r_[0.0, np.cumsum(prices)]
+    lo = np.maximum(idx - window + 1, segment_starts)
+    ma = (sums[idx + 1] - sums[lo]) / (idx - lo + 1)
+    ma[idx - lo + 1 < window] = np.nan
+
+    # 日收益率与对数收益率，每个序列第一个点没有前值
+    previous = np.r_[np.nan, prices[:-1]]
+    previous[idx == segment_starts] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        simple_returns = prices / previous - 1
+        log_returns = np.log(prices / previous)
+
+    # 对数收益率的滚动标准差（样本标准差），年化
+    valid = ~np.isnan(log_returns)
+    values = np.where(valid, log_returns, 0.0)
+    value_sums = np.r_[0.0, np.cumsum(values)]
+    square_sums = np.r_[0.0, np.cumsum(values * values)]
+    valid_counts = np.r_[0, np.cumsum(valid)]
+    lo = np.minimum(np.maximum(idx - window + 1, segment_starts + 1), idx + 1)
+    n = valid_counts[idx + 1] - valid_counts[lo]
+    total = value_sums[idx + 1] - value_sums[lo]
+    squares = square_sums[idx + 1] - square_sums[lo]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (squares - total * total / n) / (n - 1)
+    volatility = np.sqrt(np.clip(variance, 0, None)) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    volatility[n < window] = np.nan
+
+    return {'return': simple_returns, 'ma': ma, 'volatility': volatility}
+
+
+class SeriesAnalytics:
+    """单个序列在某个窗口下的缓存结果"""
+
+    def __init__(self, window, first_price, last_date, last_id, stats):
+        self.window = window
+        self.first_price = first_price
+        self.last_date = last_date
+        self.last_id = last_id
+        self.stats = stats
+
+    def __len__(self):
+        return len(self.stats['ma'])
+
+
+class AnalyticsService:
+    """滚动分析服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = {}  # (product_type, region, window) -> SeriesAnalytics
+
+    def invalidate(self, keys):
+        """序列被重新读取时清除其各窗口的缓存，keys 为 (product_type, region)"""
+        keys = set(keys)
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._cache if cache_key[:2] in keys]:
+                del self._cache[cache_key]
+
+    def _is_prefix(self, cached, series):
+        """缓存结果是否仍是序列的前缀（只追加了新点）"""
+        position = len(cached) - 1
+        return (
+            0 <= position < len(series)
+            and series.dates[position] == cached.last_date
+            and series.ids[position] == cached.last_id
+        )
+
+    def _compute_full(self, items, window):
+        """对多个序列一次性全量计算"""
+        prices = np.concatenate([series.numeric['price'] for _, series in items])
+        lengths = np.array([len(series) for _, series in items])
+        offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+        segment_starts = np.repeat(offsets, lengths)
+
+        stats = rolling_stats(prices, segment_starts, window)
+        stats['cumulative_return'] = prices / prices[segment_starts] - 1
+
+        results = {}
+        for (key, series), offset, length in zip(items, offsets, lengths):
+            results[key] = SeriesAnalytics(
+                window,
+                float(series.numeric['price'][0]),
+                series.dates[-1],
+                series.ids[-1],
+                {name: stats[name][offset:offset + length] for name in STAT_COLUMNS}
+            )
+        return results
+
+    def _extend(self, cached, series):
+        """只计算新追加的点"""
+        old_count = len(cached)
+        tail_start = max(0, old_count - cached.window)
+        tail = series.numeric['price'][tail_start:]
+
+        stats = rolling_stats(tail, np.zeros(len(tail), dtype=np.int64), cached.window)
+        new_count = len(series) - old_count
+        extended = {
+            name: np.concatenate([cached.stats[name], stats[name][-new_count:]])
+            for name in ('return', 'ma', 'volatility')
+        }
+        extended['cumulative_return'] = np.concatenate([
+            cached.stats['cumulative_return'],
+            series.numeric['price'][old_count:] / cached.first_price - 1
+        ])
+        return SeriesAnalytics(cached.window, cached.first_price, series.dates[-1], series.ids[-1], extended)
+
+    def get_series_analytics(self, window, product_type=None, region=None):
+        """返回 {(product_type, region): (series, SeriesAnalytics)}"""
+        price_store.ensure_loaded()
+
+        results = {}
+        stale = []
+        for key in price_store.series_keys(product_type, region):
+            series = price_store.get_series(*key)
+            if series is None or not len(series):
+                continue
+            with self._lock:
+                cached = self._cache.get(key + (window,))
+
+            if cached is not None and len(cached) == len(series) and self._is_prefix(cached, series):
+                results[key] = (series, cached)
+            elif cached is not None and len(cached) < len(series) and self._is_prefix(cached, series):
+                results[key] = (series, self._extend(cached, series))
+            else:
+                stale.append((key, series))
+
+        if stale:
+            stale_series = dict(stale)
+            for key, analytics in self._compute_full(stale, window).items():
+                results[key] = (stale_series[key], analytics)
+
+        with self._lock:
+            for key, (_, analytics) in results.items():
+                self._cache[key + (window,)] = analytics
+
+        return results
+
+    def analytics(self, window=20, product_type=None, region=None, start=None):
+        """按序列输出区间内的滚动统计及最新值"""
+        output = []
+        for (series_type, series_region), (series, analytics) in sorted(
+                self.get_series_analytics(window, product_type, region).items()):
+            sl = series.range_slice(start)
+            dates = series.dates[sl].astype(datetime).tolist()
+            prices = series.numeric['price'][sl]
+            columns = {
+                name: np.where(np.isnan(analytics.stats[name][sl]), None, np.round(analytics.stats[name][sl], 6)).tolist()
+                for name in STAT_COLUMNS
+            }
+            data = [
+                dict({'price_date': dates[i].isoformat(), 'price': float(prices[i])},
+                     **{name: columns[name][i] for name in STAT_COLUMNS})
+                for i in range(len(dates))
+            ]
+            output.append({
+                'product_type': series_type,
+                'region': series_region,
+                'window': window,
+                'period_return': round(float(prices[-1] / prices[0] - 1), 6) if len(prices) else None,
+                'latest': data[-1] if data else None,
+                'data': data
+            })
+        return output
+
+
+# 全局分析服务实例
+analytics_service = AnalyticsService()
+
+
+def _on_series_reloaded(keys):
+    analytics_service.invalidate(keys)
+
+
+price_store.add_listener(_on_series_reloaded)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+价格K线（OHLCV）汇总维护
+
+按 (product_type, region, interval) 将 energy_prices 汇总为日/周/月K线。
+新价格入库时只重算其所在的K线桶，按序列分别读取这些桶覆盖的时间段，
+图表读取预先汇总好的K线而不是原始报价。
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from models.energy_data import EnergyPrice, EnergyPriceCandle
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# 支持的K线周期
+INTERVALS = ('day', 'week', 'month')
+
+# 参与汇总的价格列
+SOURCE_COLUMNS = (
+    'price', 'opening_price', 'closing_price', 'highest_price', 'lowest_price', 'trading_volume'
+)
+
+
+def bucket_start(value, interval):
+    """计算时间所在K线桶的起始时间（周线以周一为起点）"""
+    day = datetime(value.year, value.month, value.day)
+    if interval == 'day':
+        return day
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return datetime(value.year, value.month, 1)
+    raise ValueError(f"无效的K线周期: {interval}")
+
+
+def bucket_end(start, interval):
+    """K线桶的结束时间（不含）"""
+    if interval == 'day':
+        return start + timedelta(days=1)
+    if interval == 'week':
+        return start + timedelta(days=7)
+    if interval == 'month':
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    raise ValueError(f"无效的K线周期: {interval}")
+
+
+def merge_spans(spans):
+    """合并重叠或相接的 [start, end) 时间段，返回升序列表"""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(span) for span in merged]
+
+
+def _bucket_array(dates, interval):
+    """向量化计算每个时间点所在的K线桶"""
+    days = dates.astype('datetime64[D]')
+    if interval == 'day':
+        return days
+    if interval == 'week':
+        # 1970-01-01 为周四，偏移 3 天后按 7 取模即得到周一为 0 的星期序号
+        weekday = (days.astype(np.int64) + 3) % 7
+        return days - weekday.astype('timedelta64[D]')
+    if interval == 'month':
+        return dates.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"无效的K线周期: {interval}")
+
+
+def compute_candles(dates, columns, interval):
+    """将按时间升序排列的报价数组汇总为K线
+
+    缺失的开/收/高/低价以当期报价代替，成交量缺失按 0 计。
+    """
+    if not len(dates):
+        return []
+
+    buckets = _bucket_array(dates, interval)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(dates)] - 1
+
+    price = columns['price']
+    open_values = np.where(np.isnan(columns['opening_price']), price, columns['opening_price'])
+    close_values = np.where(np.isnan(columns['closing_price']), price, columns['closing_price'])
+    high_values = np.fmax(columns['highest_price'], price)
+    low_values = np.fmin(columns['lowest_price'], price)
+
+    opens = open_values[starts].tolist()
+    closes = close_values[ends].tolist()
+    highs = np.maximum.reduceat(high_values, starts).tolist()
+    lows = np.minimum.reduceat(low_values, starts).tolist()
+    volumes = np.add.reduceat(np.nan_to_num(columns['trading_volume']), starts).tolist()
+    counts = (ends - starts + 1).tolist()
+    bucket_starts = buckets[starts].astype('datetime64[us]').astype(datetime).tolist()
+
+    return [
+        {
+            'interval': interval,
+            'bucket_start': bucket_starts[i],
+            'open': opens[i],
+            'high': highs[i],
+            'low': lows[i],
+            'close': closes[i],
+            'volume': volumes[i],
+            'quote_count': counts[i]
+        }
+        for i in range(len(starts))
+    ]
+
+
+def _row_value(row, name):
+    """兼容模型对象和字典的取值"""
+    if isinstance(row, dict):
+        return row.get(name)
+    return getattr(row, name, None)
+
+
+class CandleService:
+    """K线汇总服务"""
+
+    def _price_query(self):
+        """按序列和时间排序的报价查询"""
+        return db.session.query(
+            EnergyPrice.product_type,
+            EnergyPrice.region,
+            EnergyPrice.price_date,
+            *[getattr(EnergyPrice, name) for name in SOURCE_COLUMNS]
+        ).order_by(EnergyPrice.product_type, EnergyPrice.region, EnergyPrice.price_date, EnergyPrice.id)
+
+    def _series_candles(self, rows, intervals=INTERVALS):
+        """对同一序列的报价行计算各周期K线"""
+        dates = np.array([row.price_date for row in rows], dtype='datetime64[us]')
+        columns = {
+            name: np.array([getattr(row, name) for row in rows], dtype=np.float64)
+            for name in SOURCE_COLUMNS
+        }
+        candles = []
+        for interval in intervals:
+            candles.extend(compute_candles(dates, columns, interval))
+        return candles
+
+    def _group_by_series(self, rows):
+        """将有序报价行按序列分组"""
+        grouped = {}
+        for row in rows:
+            grouped.setdefault((row.product_type, row.region), []).append(row)
+        return grouped
+
+    def _upsert(self, candles, chunk_size=1000):
+        """批量写入K线，已存在的桶整体覆盖"""
+        table = EnergyPriceCandle.__table__
+        now = datetime.utcnow()
+        for offset in range(0, len(candles), chunk_size):
+            chunk = [dict(candle, updated_at=now) for candle in candles[offset:offset + chunk_size]]
+            stmt = mysql_insert(table).values(chunk)
+            stmt = stmt.on_duplicate_key_update({
+                name: stmt.inserted[name]
+                for name in ('open', 'high', 'low', 'close', 'volume', 'quote_count', 'updated_at')
+            })
+            db.session.execute(stmt)
+
+    def refresh(self, prices, chunk_size=200):
+        """根据新入库的报价重算受影响的K线桶
+
+        每个序列只读取受影响桶覆盖的时间段（相邻的桶合并为一段），补录旧数据的
+        序列不会让其他序列多读历史报价，只写回新报价所在的桶。
+        不提交事务，由调用方与价格写入一并提交。
+        """
+        affected = {}
+        for price in prices:
+            key = (_row_value(price, 'product_type'), _row_value(price, 'region'))
+            price_date = _row_value(price, 'price_date')
+            buckets = affected.setdefault(key, set())
+            for interval in INTERVALS:
+                buckets.add((interval, bucket_start(price_date, interval)))
+
+        if not affected:
+            return 0
+
+        conditions = [
+            and_(
+                EnergyPrice.product_type == key[0],
+                EnergyPrice.region == key[1],
+                EnergyPrice.price_date >= start,
+                EnergyPrice.price_date < end
+            )
+            for key, buckets in affected.items()
+            for start, end in merge_spans((start, bucket_end(start, interval)) for interval, start in buckets)
+        ]
+        # 同一序列的时间段升序排列，分批查询后按序列拼接仍保持时间顺序
+        rows = []
+        for offset in range(0, len(conditions), chunk_size):
+            rows.extend(self._price_query().filter(or_(*conditions[offset:offset + chunk_size])).all())
+
+        candles = []
+        for key, series_rows in self._group_by_series(rows).items():
+            buckets = affected[key]
+            for candle in self._series_candles(series_rows):
+                if (candle['interval'], candle['bucket_start']) in buckets:
+                    candles.append(dict(candle, product_type=key[0], region=key[1]))
+
+        self._upsert(candles)
+        return len(candles)
+
+    def rebuild(self, batch_size=5000):
+        """根据 energy_prices 历史重建全部K线"""
+        try:
+            db.session.execute(EnergyPriceCandle.__table__.delete())
+            rows = self._price_query().execution_options(yield_per=batch_size)
+
+            candles = []
+            for key, series_rows in self._group_by_series(rows).items():
+                for candle in self._series_candles(series_rows):
+                    candles.append(dict(candle, product_type=key[0], region=key[1]))
+
+            self._upsert(candles)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"重建K线失败: {e}")
+            db.session.rollback()
+            raise
+
+        logger.info(f"K线重建完成: {len(candles)} 根")
+        return len(candles)
+
+    def get_candles(self, interval, product_type=None, region=None, start=None):
+        """读取K线，按序列和时间升序"""
+        query = EnergyPriceCandle.query.filter(EnergyPriceCandle.interval == interval)
+        if product_type:
+            query = query.filter(EnergyPriceCandle.product_type == product_type)
+        if region:
+            query = query.filter(EnergyPriceCandle.region == region)
+        if start:
+            query = query.filter(EnergyPriceCandle.bucket_start >= bucket_start(start, interval))
+
+        candles = query.order_by(
+            EnergyPriceCandle.product_type, EnergyPriceCandle.region, EnergyPriceCandle.bucket_start
+        ).all()
+        return [candle.to_dict() for candle in candles]
+
+
+# 全局K线服务实例
+candle_service = CandleService()
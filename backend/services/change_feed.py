@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+增量同步变更序号
+
+价格、成交、指数三个数据源各自维护一个单调递增的变更序号（change_sequences 表）。
+每次写入（一个入库批次或一次 ORM flush）分配一个新序号，写入或修改的行都记录该
+序号。分配序号时对序号行加行锁并持有到事务提交，因此序号的提交顺序与分配顺序
+一致：客户端读到游标 N 时，所有序号不大于 N 的写入都已可见，不会因为并发事务
+晚提交而漏数据。
+
+客户端首次全量拉取时拿到游标，之后带 since=<游标> 只取序号更大的行。增量结果
+按 (序号, id) 分页，每页最多 CHANGES_PAGE_SIZE 行；has_more 为 True 时游标是本页
+最后一行的序号，再带上 since_id=<cursor_id> 继续拉取同一序号中剩余的行。
+"""
+
+import logging
+
+from sqlalchemy import event, or_, select, text
+from sqlalchemy.orm import Session
+
+from models.energy_data import ChangeSequence, EnergyPrice, EnergyDeal, EnergyIndex
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# 数据源与模型
+FEEDS = {
+    'prices': EnergyPrice,
+    'deals': EnergyDeal,
+    'indexes': EnergyIndex,
+}
+FEED_BY_MODEL = {model: feed for feed, model in FEEDS.items()}
+
+# 增量同步每页最多返回的行数
+CHANGES_PAGE_SIZE = 1000
+
+# 序号行不存在时插入，存在时加一；两种情况都通过 LAST_INSERT_ID 取回新值。
+# 单条语句对序号行加锁，首次并发分配时不会出现两个事务同时插入
+ALLOCATE_SQL = text("""
+    INSERT INTO change_sequences (feed, value) VALUES (:feed, LAST_INSERT_ID(1))
+    ON DUPLICATE KEY UPDATE value = LAST_INSERT_ID(value + 1)
+""")
+
+
+class ChangeFeed:
+    """变更序号服务"""
+
+    def allocate(self, feed, session=None):
+        """为一次写入分配新序号
+
+        序号行的行锁持有到调用方事务结束，不提交事务。
+        """
+        session = session or db.session
+        session.execute(ALLOCATE_SQL, {'feed': feed})
+        return session.execute(text('SELECT LAST_INSERT_ID()')).scalar()
+
+    def current(self, feed):
+        """已提交的最新序号"""
+        table = ChangeSequence.__table__
+        value = db.session.execute(select(table.c.value).where(table.c.feed == feed)).scalar()
+        return value or 0
+
+    def changes(self, feed, since, *criteria, since_id=None, limit=CHANGES_PAGE_SIZE):
+        """序号大于 since 的一页行（since_id 不为空时还包括序号等于 since、id 更大的行）
+
+        返回 {'data', 'count', 'cursor', 'cursor_id', 'has_more', 'reset'}：
+        取完时 cursor 为当前序号、cursor_id 为 None；还有下一页时 cursor、cursor_id
+        为本页最后一行的序号和 id。since 大于当前序号说明序号已被重置，
+        客户端应重新全量拉取（reset 为 True）。
+        """
+        model = FEEDS[feed]
+        current = self.current(feed)
+        if since > current:
+            return {'data': [], 'count': 0, 'cursor': current, 'cursor_id': None, 'has_more': False, 'reset': True}
+
+        if since_id is None:
+            after = model.change_seq > since
+        else:
+            after = or_(model.change_seq > since, (model.change_seq == since) & (model.id > since_id))
+        items = model.query.filter(
+            after,
+            model.change_seq <= current,
+            *criteria
+        ).order_by(model.change_seq, model.id).limit(limit + 1).all()
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        cursor, cursor_id = (items[-1].change_seq, items[-1].id) if has_more else (current, None)
+        return {
+            'data': [item.to_dict() for item in items],
+            'count': len(items),
+            'cursor': cursor,
+            'cursor_id': cursor_id,
+            'has_more': has_more,
+            'reset': False
+        }
+
+
+# 全局变更序号服务实例
+change_feed = ChangeFeed()
+
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_changes(session, flush_context, instances):
+    """ORM 写入的新增或修改行，每个数据源每次 flush 分配一个序号
+
+    删除行不会出现在增量结果中，但同样推进序号，进程内缓存据此发现变化。
+    """
+    pending = {}
+    for obj in list(session.new) + [obj for obj in session.dirty if session.is_modified(obj)]:
+        feed = FEED_BY_MODEL.get(type(obj))
+        if feed:
+            pending.setdefault(feed, []).append(obj)
+    for obj in session.deleted:
+        feed = FEED_BY_MODEL.get(type(obj))
+        if feed:
+            pending.setdefault(feed, [])
+
+    for feed, objs in pending.items():
+        value = change_feed.allocate(feed, session)
+        for obj in objs:
+            obj.change_seq = value
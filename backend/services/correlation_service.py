@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+指数与品种价格的滚动相关系数 / Beta 矩阵
+
+面板由各能源指数的日值和各品种日K线收盘价的全国均值组成（按日期对齐，
+缺值沿用最近值），计算日对数收益率。窗口内的统计量只需要收益率之和 S
+与叉积和 C = XᵀX：
+
+    cov = (C - S Sᵀ / n) / (n - 1)
+    corr = cov / (σ σᵀ)，beta[i][j] = cov[i][j] / var[j]
+
+每个窗口保留一份滚动状态，新的一天到来时加上新行、减去滑出窗口的行，
+不必重新扫描整个窗口。结果按 (窗口, 截止日期) 缓存；面板只从发生变化的
+日期开始增量读取数据库，并使该日期及之后的状态和缓存失效。其他进程写入的
+价格和指数通过 prices / indexes 变更序号发现，从序号区间内最早的日期开始失效。
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+
+from models.energy_data import EnergyIndex, EnergyPrice, EnergyPriceCandle
+from services.change_feed import change_feed
+from utils.database import db
+from utils.freshness import VersionCheck
+
+logger = logging.getLogger(__name__)
+
+# 参与计算的指数，与 services/index_service.py 的定义一致
+INDEX_CODES = ('CNGPI', 'SHPGSI', 'HNLPI', 'HDPGI', 'HBGDSI')
+
+# 缓存的 (窗口, 截止日期) 结果数
+RESULT_CACHE_SIZE = 128
+
+# 窗口长度范围（交易日）
+MIN_WINDOW = 5
+MAX_WINDOW = 250
+
+
+def window_moments(returns):
+    """窗口内收益率的和与叉积和"""
+    return returns.sum(axis=0), returns.T @ returns
+
+
+def correlation_beta(sums, cross, n):
+    """由和与叉积和计算协方差、相关系数和 Beta 矩阵，方差为 0 的序列结果为 NaN"""
+    cov = (cross - np.outer(sums, sums) / n) / (n - 1)
+    variance = np.clip(np.diag(cov), 0, None)
+    std = np.sqrt(variance)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(std, std)
+        beta = cov / variance[np.newaxis, :]
+    corr[~np.isfinite(corr)] = np.nan
+    beta[~np.isfinite(beta)] = np.nan
+    return np.clip(corr, -1.0, 1.0), beta
+
+
+def _panel_version():
+    """面板数据的版本：价格（K线随价格入库刷新）和指数的变更序号"""
+    return change_feed.current('prices'), change_feed.current('indexes')
+
+
+def _matrix(values):
+    """NaN 转为 None，便于 JSON 输出"""
+    return [[None if np.isnan(value) else round(float(value), 6) for value in row] for row in values]
+
+
+class RollingState:
+    """某个窗口在某一行（截止日期）的滚动和"""
+
+    def __init__(self, position, sums, cross):
+        self.position = position
+        self.sums = sums
+        self.cross = cross
+
+
+class CorrelationService:
+    """相关系数 / Beta 矩阵服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._levels = None  # 日期 × 序列的水平值（指数值 / 均价）
+        self._dates = None  # 收益率行对应的日期
+        self._returns = None  # 日对数收益率，各序列都有值的行
+        self._dirty_since = None
+        self._states = {}  # window -> RollingState
+        self._results = OrderedDict()  # (window, 截止日期) -> 结果
+        self._freshness = VersionCheck(_panel_version)
+
+    def _load_levels(self, since=None):
+        """读取 since 及之后的指数值和各品种日均价"""
+        index_query = db.session.query(
+            EnergyIndex.index_code, EnergyIndex.index_date, EnergyIndex.index_value
+        ).filter(EnergyIndex.index_code.in_(INDEX_CODES))
+        price_query = db.session.query(
+            EnergyPriceCandle.product_type, EnergyPriceCandle.bucket_start, func.avg(EnergyPriceCandle.close)
+        ).filter(
+            EnergyPriceCandle.interval == 'day',
+            EnergyPriceCandle.close.isnot(None)
+        ).group_by(EnergyPriceCandle.product_type, EnergyPriceCandle.bucket_start)
+        if since is not None:
+            index_query = index_query.filter(EnergyIndex.index_date >= since)
+            price_query = price_query.filter(EnergyPriceCandle.bucket_start >= since)
+
+        records = [tuple(row) for row in index_query] + [tuple(row) for row in price_query]
+        frame = pd.DataFrame.from_records(records, columns=['series', 'day', 'value'])
+        frame['day'] = pd.to_datetime(frame['day']).dt.normalize()
+        return frame.pivot_table(index='day', columns='series', values='value', aggfunc='last')
+
+    def _refresh(self):
+        """面板未加载时全量读取，有变化时只读取变化日期及之后的数据，调用方持有锁"""
+        if self._levels is not None and self._dirty_since is None:
+            return
+
+        if self._levels is None:
+            version = self._freshness.current()
+            levels = self._load_levels()
+            self._freshness.mark(version)
+        else:
+            since = pd.Timestamp(self._dirty_since)
+            tail = self._load_levels(since)
+            levels = pd.concat([self._levels[self._levels.index < since], tail])
+            if set(tail.columns) - set(self._levels.columns):
+                # 出现新序列时收益率面板的起始行会变化，丢弃全部状态
+                self._states = {}
+                self._results.clear()
+
+        indexes = [code for code in INDEX_CODES if code in levels.columns]
+        products = sorted(column for column in levels.columns if column not in INDEX_CODES)
+        levels = levels.reindex(columns=indexes + products).sort_index()
+
+        # 缺值沿用最近值，只保留各序列都已有数据之后的收益率
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.log(levels.ffill()).diff()
+        returns = returns[returns.notna().all(axis=1) & np.isfinite(returns).all(axis=1)]
+
+        self._levels = levels
+        self._dates = returns.index
+        self._returns = returns.to_numpy(dtype=float)
+        self._dirty_since = None
+
+    def _changed_since(self, loaded, current):
+        """两个版本之间写入的价格和指数中最早的日期，没有时返回 None"""
+        (prices_from, indexes_from), (prices_to, indexes_to) = loaded, current
+        price_day = db.session.query(func.min(EnergyPrice.price_date)).filter(
+            EnergyPrice.change_seq > prices_from, EnergyPrice.change_seq <= prices_to
+        ).scalar()
+        index_day = db.session.query(func.min(EnergyIndex.index_date)).filter(
+            EnergyIndex.index_code.in_(INDEX_CODES),
+            EnergyIndex.change_seq > indexes_from, EnergyIndex.change_seq <= indexes_to
+        ).scalar()
+        days = [day for day in (price_day, index_day) if day is not None]
+        return min(days) if days else None
+
+    def _sync(self):
+        """发现其他进程写入的价格和指数，从变化的最早日期开始失效"""
+        if self._levels is None or not self._freshness.stale():
+            return
+
+        loaded, current = self._freshness.version, self._freshness.current()
+        if any(new < old for new, old in zip(current, loaded)):
+            # 序号被重置，无法判断变化范围，下次读取时全量加载
+            with self._lock:
+                self._levels = None
+                self._dirty_since = None
+                self._states = {}
+                self._results.clear()
+            return
+
+        since = self._changed_since(loaded, current)
+        if since is not None:
+            self.invalidate(since)
+        self._freshness.mark(current)
+
+    def invalidate(self, since):
+        """指数或价格在 since 及之后有变化时调用，下次读取时增量刷新"""
+        since = datetime(since.year, since.month, since.day)
+        with self._lock:
+            if self._levels is None:
+                return
+            self._dirty_since = since if self._dirty_since is None else min(self._dirty_since, since)
+            self._states = {
+                window: state for window, state in self._states.items()
+                if self._dates[state.position] < since
+            }
+            for key in [key for key in self._results if key[1] >= since]:
+                del self._results[key]
+
+    def _moments(self, window, position):
+        """截止到第 position 行的窗口和，能从已有状态向前滚动时不重新扫描窗口"""
+        state = self._states.get(window)
+        if state is not None and state.position <= position < state.position + window:
+            sums, cross = state.sums.copy(), state.cross.copy()
+            for row in range(state.position + 1, position + 1):
+                entering, leaving = self._returns[row], self._returns[row - window]
+                sums += entering - leaving
+                cross += np.outer(entering, entering) - np.outer(leaving, leaving)
+        else:
+            sums, cross = window_moments(self._returns[position - window + 1:position + 1])
+
+        if state is None or position >= state.position:
+            self._states[window] = RollingState(position, sums, cross)
+        return sums, cross
+
+    def matrix(self, window=20, as_of=None):
+        """截止 as_of（默认最新）的 window 日滚动相关系数和 Beta 矩阵"""
+        if window < MIN_WINDOW or window > MAX_WINDOW:
+            raise ValueError(f'窗口长度应在 {MIN_WINDOW} 到 {MAX_WINDOW} 之间')
+
+        self._sync()
+        with self._lock:
+            self._refresh()
+            if as_of is None:
+                position = len(self._dates) - 1
+            else:
+                position = int(self._dates.searchsorted(pd.Timestamp(as_of), side='right')) - 1
+            if position < window - 1:
+                raise ValueError('截止日期之前的数据不足一个窗口')
+
+            as_of_date = self._dates[position].to_pydatetime()
+            key = (window, as_of_date)
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                return result
+
+            sums, cross = self._moments(window, position)
+            corr, beta = correlation_beta(sums, cross, window)
+            result = {
+                'window': window,
+                'as_of': as_of_date.strftime('%Y-%m-%d'),
+                'series': list(self._levels.columns),
+                'correlation': _matrix(corr),
+                'beta': _matrix(beta)
+            }
+            self._results[key] = result
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return result
+
+
+# 全局相关系数服务实例
+correlation_service = CorrelationService()
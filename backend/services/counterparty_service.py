@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+交易对手成交汇总
+
+每笔成交在 energy_counterparty_rollups 中按月记两行：买方视角（side=buy，对手方为卖方）
+和卖方视角（side=sell，对手方为买方）。名称使用入库时计算好的规范化键
+（EnergyDeal.buyer_key / seller_key），查询某公司的成交只按键读取汇总表，
+不对成交表做 LIKE 扫描。新成交写入时累加增量，成交被修改或删除时重算所在的月份。
+"""
+
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import bindparam, event, func, inspect, literal, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from models.energy_data import EnergyDeal, EnergyCounterpartyRollup
+from utils.database import db
+from utils.names import normalize_company_name
+
+logger = logging.getLogger(__name__)
+
+# 买卖方向：(方向, 本方字段, 对手方字段)
+SIDES = (
+    ('buy', 'buyer', 'seller'),
+    ('sell', 'seller', 'buyer'),
+)
+
+# 对手方列表最多返回的条数
+MAX_COUNTERPARTS = 20
+
+
+def month_start(value):
+    """日期所在月份的月初"""
+    return date(value.year, value.month, 1)
+
+
+def next_month(value):
+    """下个月月初"""
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _deal_value(deal, name):
+    """兼容模型对象和字典的取值"""
+    if isinstance(deal, dict):
+        return deal.get(name)
+    return getattr(deal, name, None)
+
+
+def _month_expression(column):
+    """SQL 中日期所在月份的月初（YYYY-MM-01）"""
+    return func.date_format(column, '%Y-%m-01')
+
+
+class CounterpartyService:
+    """交易对手汇总服务"""
+
+    def aggregate(self, deals):
+        """在内存中将一批成交按桶合并为增量"""
+        buckets = {}
+        for deal in deals:
+            month = month_start(_deal_value(deal, 'deal_date'))
+            for side, own, other in SIDES:
+                own_name, other_name = _deal_value(deal, own), _deal_value(deal, other)
+                own_key = normalize_company_name(own_name)
+                if not own_key:
+                    continue
+                key = (
+                    own_key, month, side,
+                    _deal_value(deal, 'product_type'), normalize_company_name(other_name) or ''
+                )
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = {
+                        'counterparty_name': own_name, 'counterpart_name': other_name,
+                        'deal_count': 0, 'volume': 0.0, 'amount': 0.0
+                    }
+                bucket['deal_count'] += 1
+                bucket['volume'] += _deal_value(deal, 'deal_quantity') or 0.0
+                bucket['amount'] += _deal_value(deal, 'deal_amount') or 0.0
+        return buckets
+
+    def apply(self, deals, session=None, chunk_size=1000):
+        """把新成交累加到汇总表
+
+        不提交事务，由调用方与成交写入一并提交。
+        """
+        session = session or db.session
+        buckets = self.aggregate(deals)
+        if not buckets:
+            return 0
+
+        table = EnergyCounterpartyRollup.__table__
+        now = datetime.utcnow()
+        rows = [
+            dict(values, counterparty_key=key[0], month=key[1], side=key[2],
+                 product_type=key[3], counterpart_key=key[4], updated_at=now)
+            for key, values in buckets.items()
+        ]
+        for offset in range(0, len(rows), chunk_size):
+            stmt = mysql_insert(table).values(rows[offset:offset + chunk_size])
+            stmt = stmt.on_duplicate_key_update({
+                'deal_count': table.c.deal_count + stmt.inserted.deal_count,
+                'volume': table.c.volume + stmt.inserted.volume,
+                'amount': table.c.amount + stmt.inserted.amount,
+                'counterparty_name': stmt.inserted.counterparty_name,
+                'counterpart_name': stmt.inserted.counterpart_name,
+                'updated_at': stmt.inserted.updated_at
+            })
+            session.execute(stmt)
+        return len(rows)
+
+    def _insert_from_select(self, session, criteria):
+        """按买卖两个方向从原始成交汇总写入，criteria(本方键列) 返回过滤条件"""
+        deals = EnergyDeal.__table__
+        columns = [
+            'counterparty_key', 'counterparty_name', 'month', 'side', 'product_type',
+            'counterpart_key', 'counterpart_name', 'deal_count', 'volume', 'amount', 'updated_at'
+        ]
+        month = _month_expression(deals.c.deal_date)
+        for side, own, other in SIDES:
+            own_key, other_key = deals.c[f'{own}_key'], func.coalesce(deals.c[f'{other}_key'], '')
+            query = select(
+                own_key, func.max(deals.c[own]), month, literal(side),
+                deals.c.product_type, other_key, func.max(deals.c[other]),
+                func.count(), func.sum(deals.c.deal_quantity), func.sum(deals.c.deal_amount),
+                literal(datetime.utcnow())
+            ).where(*criteria(own_key)).group_by(own_key, month, deals.c.product_type, other_key)
+            session.execute(EnergyCounterpartyRollup.__table__.insert().from_select(columns, query))
+
+    def refresh(self, keys, session=None):
+        """按原始成交重算指定 (规范化名称, 月份) 的汇总（成交被修改或删除时使用）
+
+        不提交事务，由调用方一并提交。
+        """
+        session = session or db.session
+        keys = {(key, month) for key, month in keys if key}
+        if not keys:
+            return 0
+
+        rollups = EnergyCounterpartyRollup.__table__
+        session.execute(rollups.delete().where(
+            tuple_(rollups.c.counterparty_key, rollups.c.month).in_(list(keys))
+        ))
+
+        deals = EnergyDeal.__table__
+        months = [month for _, month in keys]
+        month_keys = [(key, month.strftime('%Y-%m-01')) for key, month in keys]
+        self._insert_from_select(session, lambda own_key: (
+            deals.c.deal_date >= min(months),
+            deals.c.deal_date < next_month(max(months)),
+            tuple_(own_key, _month_expression(deals.c.deal_date)).in_(month_keys)
+        ))
+        return len(keys)
+
+    def backfill_keys(self, batch_size=1000):
+        """为历史成交补算规范化名称"""
+        deals = EnergyDeal.__table__
+        update = deals.update().where(deals.c.id == bindparam('_id')).values(
+            buyer_key=bindparam('_buyer_key'), seller_key=bindparam('_seller_key')
+        )
+        total = 0
+        while True:
+            rows = db.session.execute(
+                select(deals.c.id, deals.c.buyer, deals.c.seller)
+                .where((deals.c.buyer_key.is_(None)) | (deals.c.seller_key.is_(None)))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return total
+            db.session.execute(update, [
+                {
+                    '_id': row.id,
+                    '_buyer_key': normalize_company_name(row.buyer) or '',
+                    '_seller_key': normalize_company_name(row.seller) or ''
+                }
+                for row in rows
+            ])
+            total += len(rows)
+
+    def rebuild(self):
+        """补算规范化名称并根据 energy_deals 重建全部汇总"""
+        try:
+            backfilled = self.backfill_keys()
+            db.session.execute(EnergyCounterpartyRollup.__table__.delete())
+            self._insert_from_select(db.session, lambda own_key: (own_key.isnot(None), own_key != ''))
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"重建交易对手汇总失败: {e}")
+            db.session.rollback()
+            raise
+
+        count = EnergyCounterpartyRollup.query.count()
+        logger.info(f"交易对手汇总重建完成: 补算 {backfilled} 笔成交, {count} 个桶")
+        return backfilled, count
+
+    def get_profile(self, name, start_month, end_month):
+        """交易对手在 [start_month, end_month] 各月的成交画像，只读汇总表"""
+        key = normalize_company_name(name)
+        if not key:
+            raise ValueError('交易对手名称不能为空')
+
+        rows = EnergyCounterpartyRollup.query.filter(
+            EnergyCounterpartyRollup.counterparty_key == key,
+            EnergyCounterpartyRollup.month >= month_start(start_month),
+            EnergyCounterpartyRollup.month <= month_start(end_month)
+        ).order_by(EnergyCounterpartyRollup.month).all()
+
+        def totals():
+            return {'deal_count': 0, 'volume': 0.0, 'amount': 0.0}
+
+        def add(target, row):
+            target['deal_count'] += row.deal_count
+            target['volume'] += row.volume
+            target['amount'] += row.amount
+
+        summary = {'buy': totals(), 'sell': totals(), 'total': totals()}
+        products, counterparts, monthly = {}, {}, {}
+        for row in rows:
+            add(summary[row.side], row)
+            add(summary['total'], row)
+            add(products.setdefault((row.product_type, row.side), totals()), row)
+            add(monthly.setdefault((row.month, row.side), totals()), row)
+
+            counterpart = counterparts.setdefault(row.counterpart_key, dict(
+                totals(), name=row.counterpart_name, buy_amount=0.0, sell_amount=0.0
+            ))
+            add(counterpart, row)
+            counterpart[f'{row.side}_amount'] += row.amount
+
+        return {
+            'counterparty': rows[-1].counterparty_name if rows else name,
+            'start': month_start(start_month).strftime('%Y-%m'),
+            'end': month_start(end_month).strftime('%Y-%m'),
+            'summary': summary,
+            'products': [
+                dict(values, product_type=product_type, side=side)
+                for (product_type, side), values in sorted(products.items())
+            ],
+            'counterparts': sorted(
+                counterparts.values(), key=lambda item: item['amount'], reverse=True
+            )[:MAX_COUNTERPARTS],
+            'monthly': [
+                dict(values, month=month.strftime('%Y-%m'), side=side)
+                for (month, side), values in sorted(monthly.items())
+            ]
+        }
+
+
+# 全局交易对手汇总服务实例
+counterparty_service = CounterpartyService()
+
+
+def _previous_keys(deal):
+    """成交修改前涉及的 (规范化名称, 月份)"""
+    state = inspect(deal)
+
+    def previous(name):
+        history = state.attrs[name].history
+        return history.deleted[0] if history.deleted else getattr(deal, name)
+
+    month = month_start(previous('deal_date'))
+    return {(normalize_company_name(previous(name)), month) for name in ('buyer', 'seller')}
+
+
+@event.listens_for(Session, 'after_flush')
+def _rollup_counterparties(session, flush_context):
+    """ORM 写入成交时同步交易对手汇总：新增累加，修改或删除重算所在月份"""
+    new_deals = [obj for obj in session.new if isinstance(obj, EnergyDeal)]
+    if new_deals:
+        counterparty_service.apply(new_deals, session)
+
+    keys = set()
+    for obj in session.dirty:
+        if isinstance(obj, EnergyDeal) and session.is_modified(obj):
+            keys |= _previous_keys(obj)
+            month = month_start(obj.deal_date)
+            keys |= {(obj.buyer_key, month), (obj.seller_key, month)}
+    for obj in session.deleted:
+        if isinstance(obj, EnergyDeal):
+            keys |= _previous_keys(obj)
+    if keys:
+        counterparty_service.refresh(keys, session)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+能源成交批量入库
+
+CSV / JSON 按批读取，每批先用 pandas 向量化校验，再按 deal_id 用多行
+INSERT ... ON DUPLICATE KEY UPDATE 写入，重复导入同一批数据不会产生重复成交。
+成交日汇总、交易对手汇总在同一事务内每批更新一次：新成交累加增量，
+被修改的成交重算所在的桶；提交后再更新热门成交和相关指数。
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from models.energy_data import EnergyDeal
+from services.change_feed import change_feed
+from services.counterparty_service import counterparty_service, month_start
+from services.deal_rollup_service import deal_rollup_service, rollup_key, KEY_FIELDS
+from services.hot_deal_service import hot_deal_service, WINDOW_HOURS
+from services.index_service import index_service
+from utils.database import db
+from utils.names import normalize_company_name
+
+logger = logging.getLogger(__name__)
+
+# 每批读取和写入的行数
+DEFAULT_BATCH_SIZE = 5000
+
+# 必填字段
+REQUIRED_COLUMNS = (
+    'deal_id', 'product_name', 'product_type', 'buyer', 'seller',
+    'deal_price', 'deal_quantity', 'deal_date'
+)
+
+# 可选字段
+OPTIONAL_TEXT_COLUMNS = (
+    'price_unit', 'quantity_unit', 'region', 'delivery_location', 'deal_type', 'contract_period'
+)
+
+# deal_id 已存在时覆盖的字段，deal_date 入库后不再变化（分区表唯一键包含成交日期）
+UPDATE_COLUMNS = (
+    'product_name', 'product_type', 'buyer', 'seller', 'buyer_key', 'seller_key',
+    'deal_price', 'deal_quantity', 'deal_amount'
+) + OPTIONAL_TEXT_COLUMNS
+
+
+def _blank(values):
+    """空值或空白字符串"""
+    return values.isna() | (values.astype('string').str.strip() == '')
+
+
+def _same(old, new):
+    """判断字段值是否未变化，FLOAT 列读回有精度误差"""
+    if isinstance(old, float) or isinstance(new, float):
+        return old is not None and new is not None and math.isclose(old, new, rel_tol=1e-6)
+    return old == new
+
+
+class DealIngestService:
+    """成交批量入库服务"""
+
+    def parse_records(self, records, batch_size=DEFAULT_BATCH_SIZE):
+        """将字典列表按批转换为待校验的数据表，行号沿用列表下标"""
+        for offset in range(0, len(records), batch_size):
+            batch = records[offset:offset + batch_size]
+            yield pd.DataFrame.from_records(batch, index=range(offset, offset + len(batch)))
+
+    def parse_csv(self, source, batch_size=DEFAULT_BATCH_SIZE):
+        """按批读取CSV，source 为文件路径或文件对象（包括请求体流）"""
+        return pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=batch_size)
+
+    def parse_json_lines(self, source, batch_size=DEFAULT_BATCH_SIZE):
+        """按批读取每行一个 JSON 对象的文件"""
+        return pd.read_json(source, lines=True, dtype=False, convert_dates=False, chunksize=batch_size)
+
+    def validate(self, frame):
+        """向量化校验一批成交
+
+        返回 (rows, rejects)：rows 为可直接写入的字典列表，
+        rejects 为 {'row': 行号, 'deal_id': 成交编号, 'error': 原因} 列表，行号从 0 开始。
+        """
+        missing = [name for name in REQUIRED_COLUMNS if name not in frame.columns]
+        if missing:
+            raise ValueError(f"缺少必填字段: {', '.join(missing)}")
+
+        errors = pd.Series('', index=frame.index, dtype=object)
+
+        def reject(mask, reason):
+            errors[mask & (errors == '')] = reason
+
+        clean = pd.DataFrame(index=frame.index)
+        for name in ('deal_id', 'product_name', 'product_type', 'buyer', 'seller'):
+            reject(_blank(frame[name]), f'缺少{name}')
+            clean[name] = frame[name].astype('string').str.strip()
+
+        # 名称规范化键在入库时计算一次，与 EnergyDeal 的 validates 钩子一致
+        for name in ('buyer', 'seller'):
+            clean[f'{name}_key'] = clean[name].map(normalize_company_name, na_action='ignore')
+            reject(clean[f'{name}_key'].isna(), f'{name}无效')
+
+        for name in ('deal_price', 'deal_quantity'):
+            clean[name] = pd.to_numeric(frame[name], errors='coerce')
+            reject(clean[name].isna() | (clean[name] <= 0), f'{name}无效')
+
+        # 未提供成交金额时按价格 × 数量计算
+        if 'deal_amount' in frame.columns:
+            clean['deal_amount'] = pd.to_numeric(frame['deal_amount'], errors='coerce')
+            reject((clean['deal_amount'].isna() & ~_blank(frame['deal_amount'])) | (clean['deal_amount'] < 0), 'deal_amount无效')
+            clean['deal_amount'] = clean['deal_amount'].fillna(clean['deal_price'] * clean['deal_quantity'])
+        else:
+            clean['deal_amount'] = clean['deal_price'] * clean['deal_quantity']
+
+        clean['deal_date'] = pd.to_datetime(frame['deal_date'], errors='coerce', format='mixed')
+        reject(clean['deal_date'].isna(), '成交日期无效')
+
+        for name in OPTIONAL_TEXT_COLUMNS:
+            if name in frame.columns:
+                clean[name] = frame[name].astype('string').str.strip().replace('', pd.NA)
+            else:
+                clean[name] = pd.NA
+
+        # 同一批次内重复的 deal_id 只保留最后一条
+        duplicated = clean['deal_id'].duplicated(keep='last')
+        reject(duplicated & (errors == ''), '批次内重复成交')
+
+        valid = clean[errors == '']
+        rejects = [
+            {'row': int(row), 'deal_id': None if pd.isna(clean.at[row, 'deal_id']) else clean.at[row, 'deal_id'], 'error': reason}
+            for row, reason in errors[errors != ''].items()
+        ]
+
+        # 转换为 Python 原生类型，NaN/NA 转为 None；MySQL DATETIME 不保存微秒
+        columns = {}
+        for name in valid.columns:
+            if name == 'deal_date':
+                columns[name] = [value.to_pydatetime().replace(microsecond=0) for value in valid[name]]
+            else:
+                columns[name] = valid[name].astype(object).where(valid[name].notna(), None).tolist()
+
+        rows = [
+            {'row': int(row), **{name: values[i] for name, values in columns.items()}}
+            for i, row in enumerate(valid.index)
+        ]
+        return rows, rejects
+
+    def _load_existing(self, deal_ids, chunk_size=1000):
+        """读取本批中已入库的成交，deal_id -> 行"""
+        table = EnergyDeal.__table__
+        existing = {}
+        for offset in range(0, len(deal_ids), chunk_size):
+            result = db.session.execute(
+                select(table).where(table.c.deal_id.in_(deal_ids[offset:offset + chunk_size]))
+            )
+            existing.update({row.deal_id: row for row in result})
+        return existing
+
+    def ingest(self, frame, chunk_size=1000):
+        """校验并写入一批成交，整批一个事务"""
+        rows, rejects = self.validate(frame)
+        result = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': rejects}
+        if not rows:
+            return result
+
+        table = EnergyDeal.__table__
+        now = datetime.utcnow()
+        inserted, updated, previous = [], [], []
+
+        try:
+            # 整批共用一个变更序号；序号行锁持有到提交，同时串行化并发的成交入库，
+            # 下面读到的已有成交在提交前不会被其他批次修改
+            seq = change_feed.allocate('deals')
+            existing = self._load_existing([row['deal_id'] for row in rows])
+
+            for row in rows:
+                old = existing.get(row['deal_id'])
+                if old is None:
+                    inserted.append(row)
+                elif old.deal_date != row['deal_date']:
+                    rejects.append({'row': row['row'], 'deal_id': row['deal_id'], 'error': '成交日期与已入库成交不一致'})
+                elif all(_same(getattr(old, name), row[name]) for name in UPDATE_COLUMNS):
+                    result['unchanged'] += 1
+                else:
+                    updated.append(row)
+                    previous.append(dict(old._mapping))
+
+            changed = inserted + updated
+            values = [
+                dict({name: row[name] for name in UPDATE_COLUMNS + ('deal_id', 'deal_date')},
+                     created_at=now, change_seq=seq)
+                for row in changed
+            ]
+            for offset in range(0, len(values), chunk_size):
+                stmt = mysql_insert(table).values(values[offset:offset + chunk_size])
+                stmt = stmt.on_duplicate_key_update(
+                    {name: stmt.inserted[name] for name in UPDATE_COLUMNS + ('change_seq',)}
+                )
+                db.session.execute(stmt)
+
+            # Core 语句不经过 ORM 事件，汇总表在这里按批更新
+            if inserted:
+                deal_rollup_service.apply(inserted)
+                counterparty_service.apply(inserted)
+            if updated:
+                deal_rollup_service.refresh_buckets(
+                    rollup_key(*[deal[name] for name in KEY_FIELDS]) for deal in previous + updated
+                )
+                counterparty_service.refresh(
+                    (deal_key, month_start(deal['deal_date']))
+                    for deal in previous + updated
+                    for deal_key in (deal['buyer_key'], deal['seller_key'])
+                )
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"批量写入成交失败: {e}")
+            db.session.rollback()
+            raise
+
+        result['inserted'] = len(inserted)
+        result['updated'] = len(updated)
+        self._publish(changed)
+        index_service.on_deals(changed)
+
+        logger.info(
+            f"批量写入成交成功: 新增 {len(inserted)} 条, 更新 {len(updated)} 条, "
+            f"未变化 {result['unchanged']} 条, 拒绝 {len(rejects)} 条"
+        )
+        return result
+
+    def _publish(self, rows, chunk_size=1000):
+        """把热门成交窗口内的新成交交给热门成交服务，多行写入拿不到 id，按 deal_id 回读"""
+        window_start = datetime.now() - timedelta(hours=WINDOW_HOURS)
+        deal_ids = [row['deal_id'] for row in rows if row['deal_date'] >= window_start]
+        for offset in range(0, len(deal_ids), chunk_size):
+            deals = EnergyDeal.query.filter(EnergyDeal.deal_id.in_(deal_ids[offset:offset + chunk_size])).all()
+            hot_deal_service.add([deal.to_dict() for deal in deals])
+
+    def ingest_batches(self, frames, chunk_size=1000):
+        """逐批写入，每批单独提交
+
+        中途失败时已提交的批次保留；按 deal_id 幂等，修正后可整份重新导入。
+        """
+        summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': [], 'batches': 0}
+        for frame in frames:
+            result = self.ingest(frame, chunk_size)
+            for name in ('inserted', 'updated', 'unchanged'):
+                summary[name] += result[name]
+            summary['rejected'].extend(result['rejected'])
+            summary['batches'] += 1
+
+        written = summary['inserted'] + summary['updated'] + summary['unchanged']
+        summary['success'] = written > 0
+        summary['message'] = '导入成功' if written else '没有有效的成交'
+        return summary
+
+
+# 全局成交入库服务实例
+deal_ingest_service = DealIngestService()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+成交日汇总（VWAP / 成交量）维护
+
+按 (product_type, region, deal_type, 日) 将 energy_deals 汇总到 energy_deal_rollups。
+新成交写入时先在内存中按桶合并，再用一条 INSERT ... ON DUPLICATE KEY UPDATE
+把增量累加到汇总行；成交被修改或删除时重算其所在的桶。
+统计接口只读汇总表，不扫描原始成交。
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, inspect, literal, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from models.energy_data import EnergyDeal, EnergyDealRollup
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# 决定汇总桶的成交字段
+KEY_FIELDS = ('product_type', 'region', 'deal_type', 'deal_date')
+
+
+def rollup_key(product_type, region, deal_type, deal_date):
+    """成交所在的汇总桶，空地区/类型以空字符串表示"""
+    return (product_type, region or '', deal_type or '', deal_date.date())
+
+
+def _deal_value(deal, name):
+    """兼容模型对象和字典的取值"""
+    if isinstance(deal, dict):
+        return deal.get(name)
+    return getattr(deal, name, None)
+
+
+class DealRollupService:
+    """成交汇总服务"""
+
+    def aggregate(self, deals):
+        """在内存中将一批成交按桶合并为增量"""
+        buckets = {}
+        for deal in deals:
+            key = rollup_key(*[_deal_value(deal, name) for name in KEY_FIELDS])
+            price = _deal_value(deal, 'deal_price')
+            quantity = _deal_value(deal, 'deal_quantity')
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {
+                    'deal_count': 0, 'volume': 0.0, 'amount': 0.0, 'price_volume': 0.0,
+                    'high_price': price, 'low_price': price
+                }
+            bucket['deal_count'] += 1
+            bucket['volume'] += quantity
+            bucket['amount'] += _deal_value(deal, 'deal_amount') or 0.0
+            bucket['price_volume'] += price * quantity
+            bucket['high_price'] = max(bucket['high_price'], price)
+            bucket['low_price'] = min(bucket['low_price'], price)
+        return buckets
+
+    def apply(self, deals, session=None, chunk_size=1000):
+        """把新成交累加到汇总表
+
+        不提交事务，由调用方与成交写入一并提交。
+        """
+        session = session or db.session
+        buckets = self.aggregate(deals)
+        if not buckets:
+            return 0
+
+        table = EnergyDealRollup.__table__
+        now = datetime.utcnow()
+        rows = [
+            dict(values, product_type=key[0], region=key[1], deal_type=key[2], day=key[3], updated_at=now)
+            for key, values in buckets.items()
+        ]
+        for offset in range(0, len(rows), chunk_size):
+            stmt = mysql_insert(table).values(rows[offset:offset + chunk_size])
+            stmt = stmt.on_duplicate_key_update({
+                'deal_count': table.c.deal_count + stmt.inserted.deal_count,
+                'volume': table.c.volume + stmt.inserted.volume,
+                'amount': table.c.amount + stmt.inserted.amount,
+                'price_volume': table.c.price_volume + stmt.inserted.price_volume,
+                'high_price': func.greatest(table.c.high_price, stmt.inserted.high_price),
+                'low_price': func.least(table.c.low_price, stmt.inserted.low_price),
+                'updated_at': stmt.inserted.updated_at
+            })
+            session.execute(stmt)
+        return len(rows)
+
+    def _aggregate_select(self, *criteria):
+        """从原始成交按桶汇总的查询，列顺序与 INSERT 列表一致"""
+        deals = EnergyDeal.__table__
+        region = func.coalesce(deals.c.region, '')
+        deal_type = func.coalesce(deals.c.deal_type, '')
+        day = func.date(deals.c.deal_date)
+        return select(
+            deals.c.product_type, region, deal_type, day,
+            func.count(),
+            func.sum(deals.c.deal_quantity),
+            func.sum(deals.c.deal_amount),
+            func.sum(deals.c.deal_price * deals.c.deal_quantity),
+            func.max(deals.c.deal_price),
+            func.min(deals.c.deal_price),
+            literal(datetime.utcnow())
+        ).where(*criteria).group_by(deals.c.product_type, region, deal_type, day)
+
+    def _insert_from_select(self, session, *criteria):
+        columns = [
+            'product_type', 'region', 'deal_type', 'day', 'deal_count', 'volume',
+            'amount', 'price_volume', 'high_price', 'low_price', 'updated_at'
+        ]
+        session.execute(EnergyDealRollup.__table__.insert().from_select(columns, self._aggregate_select(*criteria)))
+
+    def refresh_buckets(self, keys, session=None):
+        """按原始成交重算指定的桶（成交被修改或删除时使用）
+
+        不提交事务，由调用方一并提交。
+        """
+        session = session or db.session
+        keys = list(set(keys))
+        if not keys:
+            return 0
+
+        rollups = EnergyDealRollup.__table__
+        session.execute(rollups.delete().where(
+            tuple_(rollups.c.product_type, rollups.c.region, rollups.c.deal_type, rollups.c.day).in_(keys)
+        ))
+
+        deals = EnergyDeal.__table__
+        days = [key[3] for key in keys]
+        start = datetime.combine(min(days), datetime.min.time())
+        end = datetime.combine(max(days), datetime.min.time()) + timedelta(days=1)
+        self._insert_from_select(
+            session,
+            deals.c.product_type.in_({key[0] for key in keys}),
+            deals.c.deal_date >= start,
+            deals.c.deal_date < end,
+            tuple_(
+                deals.c.product_type,
+                func.coalesce(deals.c.region, ''),
+                func.coalesce(deals.c.deal_type, ''),
+                func.date(deals.c.deal_date)
+            ).in_(keys)
+        )
+        return len(keys)
+
+    def rebuild(self, start=None):
+        """根据 energy_deals 重新汇总，指定 start 时只重算该日及之后的桶"""
+        rollups = EnergyDealRollup.__table__
+        deals = EnergyDeal.__table__
+        try:
+            if start:
+                db.session.execute(rollups.delete().where(rollups.c.day >= start.date()))
+                self._insert_from_select(db.session, deals.c.deal_date >= datetime.combine(start.date(), datetime.min.time()))
+            else:
+                db.session.execute(rollups.delete())
+                self._insert_from_select(db.session)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"重建成交汇总失败: {e}")
+            db.session.rollback()
+            raise
+
+        count = EnergyDealRollup.query.count()
+        logger.info(f"成交汇总重建完成: {count} 个桶")
+        return count
+
+    def get_stats(self, product_type=None, region=None, deal_type=None, start=None, end=None):
+        """读取日汇总及区间合计，只访问汇总表"""
+        criteria = []
+        if product_type:
+            criteria.append(EnergyDealRollup.product_type == product_type)
+        if region:
+            criteria.append(EnergyDealRollup.region == region)
+        if deal_type:
+            criteria.append(EnergyDealRollup.deal_type == deal_type)
+        if start:
+            criteria.append(EnergyDealRollup.day >= start.date())
+        if end:
+            criteria.append(EnergyDealRollup.day <= end.date())
+
+        daily = EnergyDealRollup.query.filter(*criteria).order_by(
+            EnergyDealRollup.product_type, EnergyDealRollup.region,
+            EnergyDealRollup.deal_type, EnergyDealRollup.day
+        ).all()
+
+        group = (EnergyDealRollup.product_type, EnergyDealRollup.region, EnergyDealRollup.deal_type)
+        totals = db.session.query(
+            *group,
+            func.sum(EnergyDealRollup.deal_count),
+            func.sum(EnergyDealRollup.volume),
+            func.sum(EnergyDealRollup.amount),
+            func.sum(EnergyDealRollup.price_volume),
+            func.max(EnergyDealRollup.high_price),
+            func.min(EnergyDealRollup.low_price)
+        ).filter(*criteria).group_by(*group).order_by(*group).all()
+
+        summary = [
+            {
+                'product_type': row[0],
+                'region': row[1] or None,
+                'deal_type': row[2] or None,
+                'deal_count': int(row[3] or 0),
+                'volume': row[4],
+                'amount': row[5],
+                'vwap': row[6] / row[4] if row[4] else None,
+                'high_price': row[7],
+                'low_price': row[8]
+            }
+            for row in totals
+        ]
+        return {'daily': [item.to_dict() for item in daily], 'summary': summary}
+
+
+# 全局成交汇总服务实例
+deal_rollup_service = DealRollupService()
+
+
+def _previous_key(deal):
+    """成交修改前所在的桶"""
+    state = inspect(deal)
+    values = []
+    for name in KEY_FIELDS:
+        history = state.attrs[name].history
+        values.append(history.deleted[0] if history.deleted else getattr(deal, name))
+    return rollup_key(*values)
+
+
+@event.listens_for(Session, 'after_flush')
+def _rollup_deals(session, flush_context):
+    """ORM 写入成交时同步汇总表：新增累加，修改或删除重算所在的桶"""
+    new_deals = [obj for obj in session.new if isinstance(obj, EnergyDeal)]
+    if new_deals:
+        deal_rollup_service.apply(new_deals, session)
+
+    keys = set()
+    for obj in session.dirty:
+        if isinstance(obj, EnergyDeal) and session.is_modified(obj):
+            keys.add(_previous_key(obj))
+            keys.add(rollup_key(*[getattr(obj, name) for name in KEY_FIELDS]))
+    for obj in session.deleted:
+        if isinstance(obj, EnergyDeal):
+            keys.add(_previous_key(obj))
+    if keys:
+        deal_rollup_service.refresh_buckets(keys, session)
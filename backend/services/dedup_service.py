@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+资讯 / 研报近似重复检测
+
+每篇资讯、研报在写入时计算 MinHash 签名（utils/fingerprint.py）并存入 fingerprint 列。
+内存中按 LSH 分段建立索引：段号 -> 段值 -> 内容集合。查重时只取与待查签名至少
+有一段相同的候选估算相似度，耗时与库中内容总数无关。
+
+索引只包含已发布的资讯和全部研报，首次使用时从 fingerprint 列加载，之后在提交后
+增量更新；其他进程写入的内容按资讯 / 研报版本发现后重新加载。新发布的内容与已有内容近似重复时记录告警；知识库导入在写入前查重并跳过。
+"""
+
+import logging
+import threading
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models.energy_data import EnergyNews
+from services.search_service import DOC_TYPES, content_version
+from utils.fingerprint import BAND_COUNT, DEFAULT_THRESHOLD, bands, minhash, similarity
+from utils.freshness import VersionCheck
+
+logger = logging.getLogger(__name__)
+
+# 参与计算签名的字段
+FINGERPRINT_FIELDS = {
+    'news': ('title', 'content', 'summary'),
+    'report': ('title', 'summary'),
+}
+
+
+def fingerprint_text(obj):
+    """计算签名用的文本：标题加正文（研报为摘要）"""
+    if isinstance(obj, EnergyNews):
+        return ' '.join(filter(None, [obj.title, obj.content or obj.summary]))
+    return ' '.join(filter(None, [obj.title, obj.summary]))
+
+
+def _doc_type(obj):
+    for doc_type, model in DOC_TYPES.items():
+        if isinstance(obj, model):
+            return doc_type
+    return None
+
+
+def _indexable(obj):
+    return not isinstance(obj, EnergyNews) or obj.status == 'published'
+
+
+class DedupService:
+    """近似重复检测服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fingerprints = {}  # (类型, id) -> 签名
+        self._bands = [{} for _ in range(BAND_COUNT)]  # 段号 -> {段值: {(类型, id)}}
+        self._freshness = VersionCheck(content_version)
+        self._loaded = False
+
+    def _remove(self, key):
+        """移除内容，调用方持有锁"""
+        value = self._fingerprints.pop(key, None)
+        if value is None:
+            return
+        for band, band_value in bands(value):
+            bucket = self._bands[band].get(band_value)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._bands[band][band_value]
+
+    def _add(self, key, value):
+        """加入或替换内容，调用方持有锁"""
+        self._remove(key)
+        if value is None:
+            return
+        self._fingerprints[key] = value
+        for band, band_value in bands(value):
+            self._bands[band].setdefault(band_value, set()).add(key)
+
+    def load(self):
+        """从 fingerprint 列加载已发布资讯和全部研报的签名"""
+        version = self._freshness.current()
+        entries = []
+        for doc_type, model in DOC_TYPES.items():
+            query = model.query.with_entities(model.id, model.fingerprint).filter(model.fingerprint.isnot(None))
+            if model is EnergyNews:
+                query = query.filter(EnergyNews.status == 'published')
+            entries.extend(((doc_type, id_), value) for id_, value in query.yield_per(5000))
+
+        with self._lock:
+            self._fingerprints = {}
+            self._bands = [{} for _ in range(BAND_COUNT)]
+            for key, value in entries:
+                self._add(key, value)
+            self._loaded = True
+        self._freshness.mark(version)
+        logger.info(f"内容签名加载完成: {len(self._fingerprints)} 篇")
+
+    def missing_count(self):
+        """fingerprint 列为空、不在索引中的内容数（增加该列后尚未回填签名）"""
+        count = 0
+        for model in DOC_TYPES.values():
+            query = model.query.filter(model.fingerprint.is_(None))
+            if model is EnergyNews:
+                query = query.filter(EnergyNews.status == 'published')
+            count += query.count()
+        return count
+
+    def ensure_loaded(self):
+        """首次使用时加载，之后其他进程修改过内容时重新加载"""
+        if not self._loaded or self._freshness.stale():
+            self.load()
+
+    def add(self, key, value):
+        """登记一篇内容的签名，批量导入时用于同一批次内查重"""
+        self.ensure_loaded()
+        with self._lock:
+            self._add(key, value)
+
+    def apply(self, changes):
+        """提交后增量更新，changes 为 {(类型, id): 签名}，None 表示删除或下线"""
+        if not self._loaded:
+            return
+        with self._lock:
+            for key, value in changes.items():
+                self._add(key, value)
+
+    def find(self, value, exclude=None, threshold=DEFAULT_THRESHOLD):
+        """与签名近似重复的内容 [((类型, id), 估算相似度)]，按相似度降序"""
+        if value is None:
+            return []
+        self.ensure_loaded()
+        with self._lock:
+            candidates = set()
+            for band, band_value in bands(value):
+                candidates |= self._bands[band].get(band_value, set())
+            matches = [
+                (key, similarity(value, self._fingerprints[key]))
+                for key in candidates if key != exclude
+            ]
+        return sorted(
+            (match for match in matches if match[1] >= threshold),
+            key=lambda match: (-match[1], match[0])
+        )
+
+    def find_text(self, text, exclude=None, threshold=DEFAULT_THRESHOLD):
+        """与文本近似重复的内容，返回 (签名, 匹配列表)"""
+        value = minhash(text)
+        return value, self.find(value, exclude=exclude, threshold=threshold)
+
+
+# 全局查重服务实例
+dedup_service = DedupService()
+
+
+def _fields_changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+@event.listens_for(Session, 'before_flush')
+def _compute_fingerprints(session, flush_context, instances):
+    """新增内容或标题、正文变化时计算签名，调用方已写入签名（如导入时查重）时不重复计算"""
+    for obj in list(session.new) + list(session.dirty):
+        doc_type = _doc_type(obj)
+        if not doc_type:
+            continue
+        if obj in session.new:
+            if obj.fingerprint is None:
+                obj.fingerprint = minhash(fingerprint_text(obj))
+        elif _fields_changed(obj, FINGERPRINT_FIELDS[doc_type]) and not _fields_changed(obj, ('fingerprint',)):
+            obj.fingerprint = minhash(fingerprint_text(obj))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_fingerprints(session, flush_context):
+    """记录本事务中签名或发布状态的变化，提交后再更新索引；新发布内容近似重复时告警"""
+    pending = session.info.setdefault('dedup_fingerprints', {})
+    for obj in list(session.new) + list(session.dirty):
+        doc_type = _doc_type(obj)
+        if not doc_type:
+            continue
+        status_changed = obj in session.new or _fields_changed(obj, ('status',))
+        if not status_changed and not _fields_changed(obj, ('fingerprint',)):
+            continue
+
+        key = (doc_type, obj.id)
+        value = obj.fingerprint if _indexable(obj) else None
+        pending[key] = value
+        if status_changed and value is not None:
+            matches = dedup_service.find(value, exclude=key)
+            if matches:
+                logger.warning(f"发现近似重复内容: {doc_type} {obj.id}《{obj.title}》 与 {matches[:5]}")
+    for obj in session.deleted:
+        doc_type = _doc_type(obj)
+        if doc_type:
+            pending[(doc_type, obj.id)] = None
+    if not pending:
+        session.info.pop('dedup_fingerprints', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_fingerprints(session):
+    pending = session.info.pop('dedup_fingerprints', None)
+    if pending:
+        dedup_service.apply(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_fingerprints(session):
+    session.info.pop('dedup_fingerprints', None)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+价格 / 成交历史数据流式导出
+
+通过服务端游标（stream_results）按块读取，每读到一块立即编码输出，
+内存占用只与块大小有关，与导出总行数无关；HTTP 响应在查询结束前即开始发送。
+支持 CSV、NDJSON，以及安装 pyarrow 后的 Parquet 和 Arrow IPC 流。
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.types import BigInteger, Boolean, DateTime, Float, Integer
+
+from models.energy_data import EnergyPrice, EnergyDeal
+from utils.database import db
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet / Arrow 导出为可选功能
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# 可导出的数据集：(模型, 日期列)
+DATASETS = {
+    'prices': (EnergyPrice, 'price_date'),
+    'deals': (EnergyDeal, 'deal_date'),
+}
+
+# 导出格式：(MIME 类型, 文件扩展名)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _json_default(value):
+    """datetime 输出为 ISO 字符串"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def _arrow_type(column):
+    """SQLAlchemy 列类型对应的 Arrow 类型"""
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, (Integer, BigInteger)):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+class _ByteSink:
+    """供 pyarrow 写入的文件对象，每写完一块取出已写字节"""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+class ExportService:
+    """历史数据导出服务"""
+
+    def build_query(self, dataset, product_type=None, region=None, start=None, end=None):
+        """按条件构建导出查询，按日期和 id 升序"""
+        model, date_column = DATASETS[dataset]
+        table = model.__table__
+        query = select(table)
+        if product_type:
+            query = query.where(table.c.product_type == product_type)
+        if region:
+            query = query.where(table.c.region == region)
+        if start:
+            query = query.where(table.c[date_column] >= start)
+        if end:
+            query = query.where(table.c[date_column] < end)
+        return query.order_by(table.c[date_column], table.c.id)
+
+    def iter_chunks(self, query, chunk_size=DEFAULT_CHUNK_SIZE):
+        """用服务端游标逐块读取，每块为行元组列表"""
+        with db.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+            for chunk in result.partitions():
+                yield chunk
+
+    def stream(self, dataset, fmt, chunk_size=DEFAULT_CHUNK_SIZE, **filters):
+        """返回逐块输出字节的生成器
+
+        参数在返回生成器之前校验，调用方可以在开始输出之前得到 ValueError。
+        """
+        if dataset not in DATASETS:
+            raise ValueError(f"不支持的数据集: {dataset}")
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        if fmt in ('parquet', 'arrow') and pa is None:
+            raise ValueError('Parquet/Arrow 导出需要安装 pyarrow')
+
+        query = self.build_query(dataset, **filters)
+        columns = [column.name for column in DATASETS[dataset][0].__table__.columns]
+        chunks = self.iter_chunks(query, chunk_size)
+        writer = getattr(self, f'_write_{fmt}')
+        return writer(DATASETS[dataset][0].__table__, columns, chunks)
+
+    def _write_csv(self, table, columns, chunks):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def _write_ndjson(self, table, columns, chunks):
+        for chunk in chunks:
+            lines = [
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default)
+                for row in chunk
+            ]
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _arrow_batches(self, table, columns, chunks):
+        """每块转为一个 RecordBatch，列类型取自表结构，保证各块一致"""
+        schema = pa.schema([(column.name, _arrow_type(column)) for column in table.columns])
+        batches = (
+            pa.RecordBatch.from_arrays(
+                [pa.array([row[i] for row in chunk], type=schema.field(i).type) for i in range(len(columns))],
+                schema=schema
+            )
+            for chunk in chunks
+        )
+        return schema, batches
+
+    def _write_parquet(self, table, columns, chunks):
+        schema, batches = self._arrow_batches(table, columns, chunks)
+        sink = _ByteSink()
+        writer = pq.ParquetWriter(sink, schema)
+        for batch in batches:
+            writer.write_batch(batch)  # 每块一个 row group
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    def _write_arrow(self, table, columns, chunks):
+        schema, batches = self._arrow_batches(table, columns, chunks)
+        sink = _ByteSink()
+        writer = pa.ipc.new_stream(sink, schema)
+        yield sink.drain()
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+
+# 全局导出服务实例
+export_service = ExportService()
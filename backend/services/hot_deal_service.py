@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+热门成交 Top-K 维护
+
+最近 WINDOW_HOURS 小时内的成交按品种、按小时分桶，每个桶用有界最小堆只保留
+成交金额（deal_amount）最大的 BUCKET_SIZE 笔。新成交提交后压入所在的桶，
+整桶滑出时间窗口后直接丢弃。读取时合并窗口内各桶得到 Top-K 并缓存，
+直到有新成交或有桶过期才重新合并，热门成交的读取为 O(K)。
+
+其他进程写入或删除成交时 deals 变更序号前进，读取时发现后重新加载（utils/freshness.py）。
+"""
+
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.energy_data import EnergyDeal
+from services.change_feed import change_feed
+from utils.freshness import VersionCheck
+
+logger = logging.getLogger(__name__)
+
+# 热门成交统计窗口（小时），与原来的“最近3天”一致
+WINDOW_HOURS = 72
+
+# 每个小时桶保留的成交数，也是可读取的 Top-K 上限
+BUCKET_SIZE = 20
+
+
+def _hour(value):
+    """时间所在的小时桶"""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _deals_version():
+    return change_feed.current('deals')
+
+
+class HotDealService:
+    """热门成交服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # (product_type, 小时) -> [(deal_amount, id, 成交字典)] 最小堆
+        self._located = {}  # 成交 id -> 桶键，成交被修改时用于替换旧记录
+        self._ranked = {}  # product_type 或 None（全部品种） -> 合并后的 Top-K 缓存
+        self._freshness = VersionCheck(_deals_version)
+        self._loaded = False
+
+    def _window_start(self, now=None):
+        return _hour(now or datetime.now()) - timedelta(hours=WINDOW_HOURS - 1)
+
+    def _discard(self, deal_id):
+        """移除一笔成交，调用方持有锁，返回是否移除"""
+        key = self._located.pop(deal_id, None)
+        if key is None:
+            return False
+        heap = self._buckets.get(key, [])
+        heap[:] = [entry for entry in heap if entry[1] != deal_id]
+        heapq.heapify(heap)
+        return True
+
+    def _push(self, deal, window_start):
+        """压入一笔成交，调用方持有锁，返回桶是否变化"""
+        # 成交被修改时先移除旧记录，修改后移出窗口的成交也不再保留；
+        # 金额调小时桶内已淘汰的成交不会回补，重新加载后恢复
+        removed = self._discard(deal['id'])
+        if deal['deal_date'] is None or deal['deal_date'] < window_start:
+            return removed
+
+        key = (deal['product_type'], _hour(deal['deal_date']))
+        heap = self._buckets.setdefault(key, [])
+        entry = (deal['deal_amount'] or 0.0, deal['id'], deal)
+        if len(heap) < BUCKET_SIZE:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            evicted = heapq.heapreplace(heap, entry)
+            self._located.pop(evicted[1], None)
+        else:
+            return removed
+
+        self._located[deal['id']] = key
+        return True
+
+    def _expire(self, window_start):
+        """丢弃滑出窗口的桶，调用方持有锁"""
+        expired = [key for key in self._buckets if key[1] < window_start]
+        for key in expired:
+            for _, deal_id, _ in self._buckets.pop(key):
+                self._located.pop(deal_id, None)
+        return bool(expired)
+
+    def load(self):
+        """从数据库加载窗口内的成交"""
+        version = self._freshness.current()
+        window_start = self._window_start()
+        deals = EnergyDeal.query.filter(EnergyDeal.deal_date >= window_start).yield_per(1000)
+
+        with self._lock:
+            self._buckets = {}
+            self._located = {}
+            self._ranked = {}
+            count = 0
+            for deal in deals:
+                item = deal.to_dict()
+                item['deal_date'] = deal.deal_date
+                count += self._push(item, window_start)
+            self._loaded = True
+        self._freshness.mark(version)
+        logger.info(f"热门成交加载完成: {count} 笔")
+
+    def ensure_loaded(self):
+        """首次使用时加载，之后其他进程写入过成交时重新加载"""
+        if not self._loaded or self._freshness.stale():
+            self.load()
+
+    def add(self, deals):
+        """新成交提交后调用，deals 为 to_dict 格式的字典"""
+        if not self._loaded:
+            return
+
+        window_start = self._window_start()
+        with self._lock:
+            changed = False
+            for deal in deals:
+                item = dict(deal)
+                if isinstance(item['deal_date'], str):
+                    item['deal_date'] = datetime.fromisoformat(item['deal_date'])
+                changed |= self._push(item, window_start)
+            if changed:
+                self._ranked = {}
+
+    def remove(self, deal_ids):
+        """成交删除提交后调用"""
+        if not self._loaded:
+            return
+
+        with self._lock:
+            removed = [self._discard(deal_id) for deal_id in deal_ids]
+            if any(removed):
+                self._ranked = {}
+
+    def top(self, product_type=None, limit=5):
+        """窗口内成交金额最大的 limit 笔，按金额、时间倒序"""
+        self.ensure_loaded()
+        limit = min(limit, BUCKET_SIZE)
+        window_start = self._window_start()
+
+        with self._lock:
+            if self._expire(window_start):
+                self._ranked = {}
+
+            ranked = self._ranked.get(product_type)
+            if ranked is None:
+                entries = (
+                    entry
+                    for key, heap in self._buckets.items()
+                    if product_type is None or key[0] == product_type
+                    for entry in heap
+                )
+                ranked = heapq.nlargest(
+                    BUCKET_SIZE, entries, key=lambda entry: (entry[0], entry[2]['deal_date'], entry[1])
+                )
+                self._ranked[product_type] = ranked
+
+        return [
+            dict(deal, deal_date=deal['deal_date'].isoformat())
+            for _, _, deal in ranked[:limit]
+        ]
+
+
+# 全局热门成交服务实例
+hot_deal_service = HotDealService()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_deals(session, flush_context):
+    """记录本事务写入、修改或删除的成交，提交后再更新热门成交
+
+    flush 之后 id 已分配，此时转为字典，提交后不再访问已过期的模型属性。
+    """
+    deals = [
+        obj.to_dict() for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, EnergyDeal)
+    ]
+    if deals:
+        session.info.setdefault('hot_deals', []).extend(deals)
+
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, EnergyDeal)]
+    if deleted:
+        session.info.setdefault('hot_deals_deleted', []).extend(deleted)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_deals(session):
+    deals = session.info.pop('hot_deals', None)
+    if deals:
+        hot_deal_service.add(deals)
+    deleted = session.info.pop('hot_deals_deleted', None)
+    if deleted:
+        hot_deal_service.remove(deleted)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_deals(session):
+    session.info.pop('hot_deals', None)
+    session.info.pop('hot_deals_deleted', None)
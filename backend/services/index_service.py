@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+能源指数计算
+
+每个指数定义为若干成分序列的加权篮子，成分取自日K线（收盘价 / 成交量）
+或成交日汇总（VWAP）。以各成分都有正值数据的第一天为基期（基期值 100），
+成交量为 0 的日期不能作为基期值，顺延到有成交量的日期：
+
+    指数 = 100 × Σ 权重ᵢ × 成分ᵢ当日值 / 成分ᵢ基期值
+
+成分当日没有新数据时沿用最近一个值。某个成分序列有新数据时，只重算包含它的指数
+从新数据日期起的各天：取该日期之前各成分的最近值作为起点，再读取之后的日数据，
+整个篮子在 numpy 中一次算完，按 (index_code, index_date) 写回 energy_indexes。
+基期每次计算时从数据库重新确定，不在进程内缓存，多个进程写入时结果一致。
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, tuple_
+
+from models.energy_data import EnergyIndex, EnergyPriceCandle, EnergyDealRollup
+from services.correlation_service import correlation_service
+from services.market_stream import market_publisher
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# 基期指数值
+BASE_VALUE = 100.0
+
+CALCULATION_METHOD = '加权平均法'
+
+# 指数定义，成分为 (来源, product_type, region, 权重)；
+# 来源 price 为日K线收盘价，volume 为日K线成交量，deal 为成交日汇总 VWAP
+INDEX_DEFINITIONS = {
+    'CNGPI': {
+        'name': '中国天然气价格指数',
+        'category': '价格指数',
+        'region': '全国',
+        'description': '中国天然气价格指数反映全国管道气、LNG、CNG 主要市场的价格变化趋势',
+        'constituents': (
+            ('price', 'PNG', '北京', 0.15),
+            ('price', 'PNG', '上海', 0.15),
+            ('price', 'PNG', '广州', 0.15),
+            ('price', 'PNG', '四川', 0.15),
+            ('price', 'LNG', '上海', 0.15),
+            ('price', 'LNG', '广州', 0.15),
+            ('price', 'CNG', '北京', 0.10),
+        ),
+    },
+    'SHPGSI': {
+        'name': '上海石油天然气现货指数',
+        'category': '市场指数',
+        'region': '华东',
+        'description': '上海石油天然气现货指数反映上海市场管道气、LNG 报价及现货成交价格的变化趋势',
+        'constituents': (
+            ('price', 'PNG', '上海', 0.4),
+            ('price', 'LNG', '上海', 0.3),
+            ('deal', 'PNG', '上海', 0.3),
+        ),
+    },
+    'HNLPI': {
+        'name': '华南LNG价格指数',
+        'category': '价格指数',
+        'region': '华南',
+        'description': '华南LNG价格指数反映广东地区 LNG 报价及成交价格的变化趋势',
+        'constituents': (
+            ('price', 'LNG', '广州', 0.4),
+            ('price', 'LNG', '深圳', 0.4),
+            ('deal', 'LNG', '广东', 0.2),
+        ),
+    },
+    'HDPGI': {
+        'name': '华东管道气价格指数',
+        'category': '价格指数',
+        'region': '华东',
+        'description': '华东管道气价格指数反映华东各省市管道天然气价格的变化趋势',
+        'constituents': (
+            ('price', 'PNG', '上海', 0.3),
+            ('price', 'PNG', '江苏', 0.25),
+            ('price', 'PNG', '浙江', 0.25),
+            ('price', 'PNG', '山东', 0.2),
+        ),
+    },
+    'HBGDSI': {
+        'name': '华北天然气供需指数',
+        'category': '供需指数',
+        'region': '华北',
+        'description': '华北天然气供需指数以京津冀管道气成交量反映华北市场的供需变化',
+        'constituents': (
+            ('volume', 'PNG', '北京', 0.4),
+            ('volume', 'PNG', '天津', 0.3),
+            ('volume', 'PNG', '河北', 0.3),
+        ),
+    },
+}
+
+
+def _day(value):
+    """时间所在的日期（零点）"""
+    return datetime(value.year, value.month, value.day)
+
+
+def _candle_column(source):
+    """K线来源对应的列：price 为收盘价，volume 为成交量"""
+    return EnergyPriceCandle.close if source == 'price' else EnergyPriceCandle.volume
+
+
+def _constituent_keys(code):
+    return [constituent[:3] for constituent in INDEX_DEFINITIONS[code]['constituents']]
+
+
+def basket_values(seed, matrix, base, weights):
+    """按篮子计算指数序列
+
+    seed 为起始日之前各成分的最近值，matrix 为各日的成分值（无数据为 NaN），
+    逐列沿用最近值后按基期值加权。仍有成分缺值的日期结果为 NaN。
+    """
+    values = pd.DataFrame(np.vstack([seed, matrix])).ffill().to_numpy()
+    return BASE_VALUE * (values / base) @ weights
+
+
+class IndexService:
+    """指数计算服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _candle_query(self, keys, *criteria):
+        candles = EnergyPriceCandle
+        return db.session.query(
+            candles.product_type, candles.region, candles.bucket_start, candles.close, candles.volume
+        ).filter(
+            candles.interval == 'day',
+            tuple_(candles.product_type, candles.region).in_(keys),
+            *criteria
+        )
+
+    def _deal_query(self, keys, *criteria):
+        rollups = EnergyDealRollup
+        return db.session.query(
+            rollups.product_type, rollups.region, rollups.day,
+            func.sum(rollups.price_volume) / func.sum(rollups.volume)
+        ).filter(
+            tuple_(rollups.product_type, rollups.region).in_(keys),
+            rollups.volume > 0,
+            *criteria
+        ).group_by(rollups.product_type, rollups.region, rollups.day)
+
+    def _fetch_points(self, constituents, start):
+        """读取 start 及之后各成分的日值，返回以日期为索引、成分序号为列的数据表"""
+        positions = {key: position for position, key in enumerate(constituents)}
+        records = []
+
+        def add(key, day, value):
+            if key in positions and value is not None:
+                records.append((positions[key], day, value))
+
+        candle_keys = sorted({key[1:] for key in constituents if key[0] != 'deal'})
+        if candle_keys:
+            for product_type, region, day, close, volume in self._candle_query(
+                candle_keys, EnergyPriceCandle.bucket_start >= start
+            ):
+                add(('price', product_type, region), day, close)
+                add(('volume', product_type, region), day, volume)
+
+        deal_keys = sorted({key[1:] for key in constituents if key[0] == 'deal'})
+        if deal_keys:
+            for product_type, region, day, vwap in self._deal_query(
+                deal_keys, EnergyDealRollup.day >= start.date()
+            ):
+                add(('deal', product_type, region), _day(day), vwap)
+
+        frame = pd.DataFrame.from_records(records, columns=['position', 'day', 'value'])
+        frame['day'] = pd.to_datetime(frame['day'])
+        return frame.pivot_table(index='day', columns='position', values='value', aggfunc='last') \
+            .reindex(columns=range(len(constituents)))
+
+    def _latest_before(self, key, before, positive=False):
+        """成分在 before 之前的最近一个日值，positive 时只取大于 0 的值"""
+        source, product_type, region = key
+        if source == 'deal':
+            # 成交日汇总只统计成交量大于 0 的行，VWAP 总为正值
+            row = self._deal_query(
+                [(product_type, region)], EnergyDealRollup.day < before.date()
+            ).order_by(EnergyDealRollup.day.desc()).first()
+            return row[3] if row else np.nan
+
+        criteria = [EnergyPriceCandle.bucket_start < before]
+        if positive:
+            criteria.append(_candle_column(source) > 0)
+        row = self._candle_query(
+            [(product_type, region)], *criteria
+        ).order_by(EnergyPriceCandle.bucket_start.desc()).first()
+        if row is None:
+            return np.nan
+        value = row.close if source == 'price' else row.volume
+        return np.nan if value is None else value
+
+    def _first_day(self, key):
+        """成分最早有正值数据的日期"""
+        source, product_type, region = key
+        if source == 'deal':
+            day = db.session.query(func.min(EnergyDealRollup.day)).filter(
+                EnergyDealRollup.product_type == product_type, EnergyDealRollup.region == region
+            ).scalar()
+            return _day(day) if day else None
+
+        return db.session.query(func.min(EnergyPriceCandle.bucket_start)).filter(
+            EnergyPriceCandle.product_type == product_type,
+            EnergyPriceCandle.region == region,
+            EnergyPriceCandle.interval == 'day',
+            _candle_column(source) > 0
+        ).scalar()
+
+    def _base(self, code):
+        """指数的基期日期和各成分基期值，成分缺少正值数据时返回 None"""
+        keys = _constituent_keys(code)
+        first_days = [self._first_day(key) for key in keys]
+        if any(day is None for day in first_days):
+            return None
+
+        base_date = max(first_days)
+        values = np.array([
+            self._latest_before(key, base_date + timedelta(days=1), positive=True) for key in keys
+        ])
+        if np.isnan(values).any() or (values <= 0).any():
+            return None
+        return base_date, values
+
+    def _save(self, code, points, chunk_size=1000):
+        """按 (index_code, index_date) 写入指数值，已有的行原地更新"""
+        definition = INDEX_DEFINITIONS[code]
+        days = [day for day, _, _ in points]
+        existing = {}
+        for offset in range(0, len(days), chunk_size):
+            for index in EnergyIndex.query.filter(
+                EnergyIndex.index_code == code,
+                EnergyIndex.index_date.in_(days[offset:offset + chunk_size])
+            ):
+                existing[index.index_date] = index
+
+        saved = []
+        for day, value, previous in points:
+            index = existing.get(day)
+            if index is None:
+                index = EnergyIndex(index_code=code, index_date=day)
+                db.session.add(index)
+            index.index_name = definition['name']
+            index.index_value = round(value, 2)
+            index.base_value = BASE_VALUE
+            index.change_amount = round(value - previous, 2) if previous is not None else None
+            index.change_percent = round((value - previous) / previous * 100, 2) if previous else None
+            index.category = definition['category']
+            index.region = definition['region']
+            index.description = definition['description']
+            index.calculation_method = CALCULATION_METHOD
+            index.is_active = True
+            saved.append(index)
+        return saved
+
+    def update(self, changes):
+        """成分序列有新数据后重算受影响的指数
+
+        changes 为 {(来源, product_type, region): 最早的新数据时间}。
+        只重算包含这些成分的指数、从最早新数据日期开始的各天，写入后提交并推送最新值。
+        """
+        affected = {}
+        for code in INDEX_DEFINITIONS:
+            dates = [changes[key] for key in _constituent_keys(code) if key in changes]
+            if dates:
+                affected[code] = _day(min(dates))
+        if not affected:
+            return []
+
+        with self._lock:
+            start = min(affected.values())
+            constituents = sorted({key for code in affected for key in _constituent_keys(code)})
+            points = self._fetch_points(constituents, start)
+            seeds = {key: self._latest_before(key, start) for key in constituents}
+
+            latest = []
+            try:
+                for code, since in affected.items():
+                    base = self._base(code)
+                    if base is None:
+                        logger.warning(f"指数 {code} 的成分缺少数据，跳过计算")
+                        continue
+                    base_date, base_values = base
+                    keys = _constituent_keys(code)
+                    weights = np.array([constituent[3] for constituent in INDEX_DEFINITIONS[code]['constituents']])
+                    weights = weights / weights.sum()
+
+                    # 只保留本指数成分有数据的日期
+                    matrix = points[[constituents.index(key) for key in keys]]
+                    matrix = matrix[matrix.notna().any(axis=1)]
+                    seed = np.array([seeds[key] for key in keys], dtype=float)
+                    values = basket_values(seed, matrix.to_numpy(dtype=float), base_values, weights)
+
+                    # values[0] 为起始日之前的指数值，用于计算第一天的涨跌
+                    rows = []
+                    previous = None if np.isnan(values[0]) else float(values[0])
+                    for day, value in zip(matrix.index, values[1:]):
+                        value = None if np.isnan(value) else float(value)
+                        if value is not None and day >= max(since, base_date):
+                            rows.append((day.to_pydatetime(), value, previous))
+                        previous = value if value is not None else previous
+
+                    saved = self._save(code, rows)
+                    if saved:
+                        latest.append(saved[-1])
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"计算指数失败: {e}")
+                db.session.rollback()
+                raise
+
+        latest = [index.to_dict() for index in latest]
+        correlation_service.invalidate(start)
+        market_publisher.publish_indexes(latest)
+        logger.info(f"指数计算完成: {', '.join(affected)}")
+        return latest
+
+    def on_prices(self, rows):
+        """价格入库提交后调用（K线已刷新），计算失败不影响入库"""
+        changes = {}
+        for row in rows:
+            for source in ('price', 'volume'):
+                key = (source, row['product_type'], row['region'])
+                changes[key] = min(changes.get(key, row['price_date']), row['price_date'])
+        self._update_quietly(changes)
+
+    def on_deals(self, rows):
+        """成交入库提交后调用（成交日汇总已更新），计算失败不影响入库"""
+        changes = {}
+        for row in rows:
+            key = ('deal', row['product_type'], row.get('region') or '')
+            changes[key] = min(changes.get(key, row['deal_date']), row['deal_date'])
+        self._update_quietly(changes)
+
+    def _update_quietly(self, changes):
+        try:
+            self.update(changes)
+        except Exception as e:
+            logger.error(f"更新指数失败: {e}")
+
+    def recompute(self, since):
+        """重算全部指数 since 及之后的各天（如每日收盘后补算）"""
+        return self.update({
+            key: since for code in INDEX_DEFINITIONS for key in _constituent_keys(code)
+        })
+
+    def rebuild(self):
+        """重新计算全部指数，删除不是由引擎写入的旧指数行（如示例随机数据）
+
+        删除的行不会出现在 since 增量同步中，重建后客户端应全量拉取。
+        """
+        self.recompute(datetime(1970, 1, 1))
+
+        stale = 0
+        for code in INDEX_DEFINITIONS:
+            base = self._base(code)
+            if base is None:
+                continue
+            # 引擎只写基期及之后的零点日期
+            stale += EnergyIndex.query.filter(
+                EnergyIndex.index_code == code,
+                (EnergyIndex.index_date < base[0]) | (func.time(EnergyIndex.index_date) != '00:00:00')
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        return EnergyIndex.query.filter(EnergyIndex.index_code.in_(list(INDEX_DEFINITIONS))).count(), stale
+
+
+# 全局指数计算服务实例
+index_service = IndexService()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+最新价格物化表维护
+
+energy_latest_prices 以 (product_type, region) 为唯一键，每个序列一行。
+新价格入库时在同一事务内刷新受影响的序列，读取最新价格只需按键查找。
+"""
+
+import logging
+from sqlalchemy import and_, func, select, text, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from models.energy_data import EnergyPrice, EnergyLatestPrice
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# 随最新价格一起物化的列
+LATEST_COLUMNS = (
+    'product_name', 'price', 'price_unit', 'opening_price', 'closing_price',
+    'highest_price', 'lowest_price', 'change_amount', 'change_percent',
+    'market', 'trading_volume', 'created_at'
+)
+
+
+class LatestPriceService:
+    """最新价格服务"""
+
+    def _newest_prices_select(self, keys=None):
+        """每个序列最新一条价格（同一日期取 id 最大者）"""
+        prices = EnergyPrice.__table__
+
+        latest_dates = select(
+            prices.c.product_type,
+            prices.c.region,
+            func.max(prices.c.price_date).label('price_date')
+        ).group_by(prices.c.product_type, prices.c.region)
+        if keys is not None:
+            latest_dates = latest_dates.where(tuple_(prices.c.product_type, prices.c.region).in_(list(keys)))
+        latest_dates = latest_dates.subquery('latest_dates')
+
+        candidates = prices.alias('candidates')
+        newest_ids = select(func.max(candidates.c.id).label('id')).select_from(
+            candidates.join(latest_dates, and_(
+                candidates.c.product_type == latest_dates.c.product_type,
+                candidates.c.region == latest_dates.c.region,
+                candidates.c.price_date == latest_dates.c.price_date
+            ))
+        ).group_by(candidates.c.product_type, candidates.c.region).subquery('newest_ids')
+
+        return select(
+            prices.c.product_type,
+            prices.c.region,
+            prices.c.id,
+            *[prices.c[name] for name in LATEST_COLUMNS],
+            func.now(),
+            prices.c.price_date
+        ).select_from(prices.join(newest_ids, prices.c.id == newest_ids.c.id))
+
+    def refresh_series(self, keys=None):
+        """从 energy_prices 刷新指定序列（keys 为 None 时刷新全部）
+
+        使用 INSERT ... SELECT ... ON DUPLICATE KEY UPDATE 单语句完成，仅当候选
+        价格日期不早于现有记录时才覆盖，并发写入时旧报价不会回盖新报价。
+        price_date 必须放在更新列表最后，前面的条件判断才能读到旧值。
+        不提交事务，由调用方与价格写入一并提交。
+        """
+        if keys is not None:
+            keys = {tuple(key) for key in keys}
+            if not keys:
+                return
+
+        table = EnergyLatestPrice.__table__
+        columns = ['product_type', 'region', 'price_id', *LATEST_COLUMNS, 'updated_at', 'price_date']
+        stmt = mysql_insert(table).from_select(columns, self._newest_prices_select(keys))
+
+        is_newer = stmt.inserted.price_date >= table.c.price_date
+        updates = [
+            (name, func.if_(is_newer, stmt.inserted[name], table.c[name]))
+            for name in columns[2:]
+        ]
+        db.session.execute(stmt.on_duplicate_key_update(updates))
+
+    def rebuild(self):
+        """根据 energy_prices 历史重建物化表，并同步 is_latest 标记"""
+        try:
+            db.session.execute(EnergyLatestPrice.__table__.delete())
+            self.refresh_series()
+            db.session.execute(text("""
+                UPDATE energy_prices p
+                LEFT JOIN energy_latest_prices l ON l.price_id = p.id
+                SET p.is_latest = (l.price_id IS NOT NULL)
+            """))
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"重建最新价格失败: {e}")
+            db.session.rollback()
+            raise
+
+        count = EnergyLatestPrice.query.count()
+        logger.info(f"最新价格重建完成: {count} 个序列")
+        return count
+
+    def get_all(self):
+        """获取全部序列的最新价格"""
+        latest = EnergyLatestPrice.query.order_by(
+            EnergyLatestPrice.product_type, EnergyLatestPrice.region
+        ).all()
+        return [item.to_dict() for item in latest]
+
+    def get_many(self, keys):
+        """按 (product_type, region) 批量获取最新价格，返回以键为索引的字典"""
+        keys = [tuple(key) for key in keys]
+        if not keys:
+            return {}
+        latest = EnergyLatestPrice.query.filter(
+            tuple_(EnergyLatestPrice.product_type, EnergyLatestPrice.region).in_(keys)
+        ).all()
+        return {(item.product_type, item.region): item.to_dict() for item in latest}
+
+
+# 全局最新价格服务实例
+latest_price_service = LatestPriceService()
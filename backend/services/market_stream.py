@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+行情推送（Server-Sent Events）
+
+进程内单一发布者：价格存储重新读取序列时（本进程入库，或发现导入脚本、其他
+worker 的写入）取回这些序列的最新价格交给发布者；指数按 indexes 变更序号发现
+新写入的值。发布者与最近一次推送的值比较，只把新增或变化的值放入订阅了对应
+品种/地区的客户端队列。首次订阅时的快照来自发布者的内存缓存。
+
+推送连接每隔 SYNC_SECONDS 秒调用一次 sync()，全进程同一时间只有一个连接
+实际检查数据库，其余连接直接跳过。
+
+每个 SSE 连接在同步 WSGI 服务器上长期占用一个工作线程，部署时线程数需大于
+同时在线的订阅数（如 gunicorn --worker-class gthread --threads N），或改用
+gevent 等异步 worker 承载 /api/energy/stream。
+"""
+
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+
+from sqlalchemy import func, tuple_
+
+from models.energy_data import EnergyIndex
+from services.change_feed import change_feed
+from services.latest_price_service import latest_price_service
+from services.price_store import price_store
+from utils.database import db
+from utils.freshness import VersionCheck
+
+logger = logging.getLogger(__name__)
+
+# 推送频道
+CHANNELS = ('prices', 'indexes')
+
+# 无事件时的心跳间隔（秒），防止代理断开空闲连接
+HEARTBEAT_SECONDS = 15
+
+# 推送连接检查其他进程写入的间隔（秒）
+SYNC_SECONDS = 5
+
+# 单个客户端最多缓存的事件数，慢客户端丢弃最旧事件
+SUBSCRIBER_QUEUE_SIZE = 500
+
+# 价格变化判断使用的字段
+PRICE_COMPARE_FIELDS = ('price', 'price_date', 'opening_price', 'closing_price', 'highest_price', 'lowest_price', 'trading_volume')
+INDEX_COMPARE_FIELDS = ('index_value', 'index_date')
+
+
+def _jsonable(value):
+    """datetime 转为 ISO 字符串"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _indexes_version():
+    return change_feed.current('indexes')
+
+
+def latest_indexes(since=None, until=None):
+    """各指数的最新一条，给出序号区间时只看区间内写入或修改的行"""
+    criteria = [EnergyIndex.index_code.isnot(None)]
+    if since is not None:
+        criteria += [EnergyIndex.change_seq > since, EnergyIndex.change_seq <= until]
+    latest = db.session.query(EnergyIndex.index_code, func.max(EnergyIndex.index_date)).filter(
+        *criteria
+    ).group_by(EnergyIndex.index_code).all()
+    if not latest:
+        return []
+    rows = EnergyIndex.query.filter(
+        tuple_(EnergyIndex.index_code, EnergyIndex.index_date).in_([tuple(row) for row in latest])
+    ).order_by(EnergyIndex.id).all()
+    return [row.to_dict() for row in rows]
+
+
+def _payload(item):
+    """将模型对象或字典转换为推送内容"""
+    if not isinstance(item, dict):
+        item = item.to_dict()
+    return {key: _jsonable(value) for key, value in item.items()}
+
+
+class Subscriber:
+    """单个推送客户端"""
+
+    def __init__(self, channels, products=None, regions=None):
+        self.channels = set(channels)
+        self.products = set(products) if products else None
+        self.regions = set(regions) if regions else None
+        self.events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def matches(self, channel, product_type=None, region=None):
+        """是否订阅了该事件"""
+        if channel not in self.channels:
+            return False
+        if channel == 'prices':
+            if self.products is not None and product_type not in self.products:
+                return False
+            if self.regions is not None and region not in self.regions:
+                return False
+        return True
+
+    def offer(self, event):
+        """非阻塞放入事件，队列满时丢弃最旧的事件"""
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class MarketPublisher:
+    """行情发布者，进程内单例使用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._last_prices = {}
+        self._last_indexes = {}
+        self._seeded = False
+        self._sync_lock = threading.Lock()
+        self._index_freshness = VersionCheck(_indexes_version, interval=SYNC_SECONDS)
+
+    def _seed(self):
+        """首次订阅时从最新价格物化表和指数表填充缓存（全进程仅一次）"""
+        if self._seeded:
+            return
+        try:
+            version = self._index_freshness.current()
+            for item in latest_price_service.get_all():
+                self._last_prices.setdefault((item['product_type'], item['region']), item)
+            for item in latest_indexes():
+                self._last_indexes.setdefault(item.get('index_code'), _payload(item))
+            self._index_freshness.mark(version)
+            self._seeded = True
+        except Exception as e:
+            logger.error(f"初始化行情缓存失败: {e}")
+
+    def sync(self):
+        """发现其他进程写入的价格和指数并推送，需在应用上下文中调用
+
+        价格由价格存储检查变更序号，重新读取的序列经监听回调推送；指数按变更
+        序号区间取各指数最新值。其他连接正在检查时直接返回。
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            price_store.ensure_loaded()
+            if self._seeded and self._index_freshness.stale():
+                loaded, current = self._index_freshness.version, self._index_freshness.current()
+                if current > loaded:
+                    self.publish_indexes(latest_indexes(loaded, current))
+                self._index_freshness.mark(current)
+        except Exception as e:
+            logger.error(f"检查行情更新失败: {e}")
+        finally:
+            # 结束只读事务，下次检查能看到新提交的数据，连接也归还连接池
+            db.session.rollback()
+            self._sync_lock.release()
+
+    def subscribe(self, channels=CHANNELS, products=None, regions=None):
+        """注册客户端并返回订阅对象和当前快照"""
+        subscriber = Subscriber(channels, products, regions)
+        with self._lock:
+            self._seed()
+            self._subscribers.add(subscriber)
+            snapshot = []
+            if 'prices' in subscriber.channels:
+                snapshot.extend(
+                    ('price', item) for key, item in self._last_prices.items()
+                    if subscriber.matches('prices', *key)
+                )
+            if 'indexes' in subscriber.channels:
+                snapshot.extend(('index', item) for item in self._last_indexes.values())
+        return subscriber, snapshot
+
+    def unsubscribe(self, subscriber):
+        """注销客户端"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _changed(self, cache, key, payload, fields, date_field):
+        """与缓存比较，有变化时更新缓存并返回 True"""
+        previous = cache.get(key)
+        if previous is not None:
+            if all(previous.get(f) == payload.get(f) for f in fields):
+                return False
+            if (payload.get(date_field) or '') < (previous.get(date_field) or ''):
+                # 补录的历史数据不推送
+                return False
+        cache[key] = payload
+        return True
+
+    def publish_prices(self, prices):
+        """推送新增或变化的价格，同一序列只推送本批最新的一条"""
+        newest = {}
+        for price in prices:
+            payload = _payload(price)
+            key = (payload.get('product_type'), payload.get('region'))
+            if key not in newest or (payload.get('price_date') or '') >= (newest[key].get('price_date') or ''):
+                newest[key] = payload
+
+        with self._lock:
+            for key, payload in newest.items():
+                if not self._changed(self._last_prices, key, payload, PRICE_COMPARE_FIELDS, 'price_date'):
+                    continue
+                for subscriber in self._subscribers:
+                    if subscriber.matches('prices', *key):
+                        subscriber.offer(('price', payload))
+
+    def publish_indexes(self, indexes):
+        """推送新增或变化的指数"""
+        with self._lock:
+            for index in indexes:
+                payload = _payload(index)
+                key = payload.get('index_code') or payload.get('index_name')
+                if not self._changed(self._last_indexes, key, payload, INDEX_COMPARE_FIELDS, 'index_date'):
+                    continue
+                for subscriber in self._subscribers:
+                    if subscriber.matches('indexes'):
+                        subscriber.offer(('index', payload))
+
+
+def format_event(event_type, data):
+    """格式化为 SSE 文本"""
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_events(publisher, subscriber, snapshot):
+    """生成 SSE 文本流：先发送快照，再持续转发队列中的事件
+
+    需要在请求上下文中迭代（stream_with_context），以便检查其他进程的写入。
+    """
+    try:
+        for event_type, data in snapshot:
+            yield format_event(event_type, data)
+        idle = 0
+        while True:
+            publisher.sync()
+            try:
+                event_type, data = subscriber.events.get(timeout=SYNC_SECONDS)
+            except queue.Empty:
+                idle += SYNC_SECONDS
+                if idle >= HEARTBEAT_SECONDS:
+                    idle = 0
+                    yield ': keepalive\n\n'
+                continue
+            idle = 0
+            yield format_event(event_type, data)
+    finally:
+        publisher.unsubscribe(subscriber)
+
+
+# 全局行情发布者实例
+market_publisher = MarketPublisher()
+
+
+def _on_series_reloaded(keys):
+    """价格存储重新读取序列后推送这些序列的最新价格，没有订阅者时跳过"""
+    if market_publisher.subscriber_count:
+        market_publisher.publish_prices(latest_price_service.get_many(keys).values())
+
+
+price_store.add_listener(_on_series_reloaded)
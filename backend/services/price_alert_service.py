@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+价格提醒引擎
+
+用户设置的阈值按 (product_type, region) 和方向存放在有序阈值表中：
+上穿提醒（above）在价格 >= 阈值时触发，是有序表的一个前缀；下穿提醒
+（below）在价格 <= 阈值时触发，是有序表的一个后缀。新价格入库时用二分
+查找定位被穿越的阈值，只处理命中的提醒，单个序列每次报价的开销为
+O(log n + 命中数)。提醒触发一次后失效，通知写入用户收件箱。
+
+阈值表在进程内维护，其他进程创建、删除或触发提醒后，按生效提醒的
+(行数, 最大 id) 版本发现变化并重新加载（utils/freshness.py）。
+"""
+
+import bisect
+import logging
+import threading
+from datetime import datetime
+
+from models.user import PriceAlert, AlertNotification
+from utils.database import db
+from utils.freshness import VersionCheck, table_version
+
+logger = logging.getLogger(__name__)
+
+# 提醒方向
+DIRECTIONS = ('above', 'below')
+
+# 每个用户最多同时生效的提醒数
+MAX_ACTIVE_ALERTS = 50
+
+
+def _as_datetime(value):
+    """to_dict 输出的 ISO 字符串转回 datetime"""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _alerts_version():
+    """生效提醒的版本：新建提醒改变最大 id，删除或触发改变行数"""
+    return table_version(PriceAlert, PriceAlert.is_active.is_(True), key_column=PriceAlert.id)
+
+
+class ThresholdBook:
+    """单个序列单个方向的有序阈值表，阈值与提醒 id 按下标一一对应"""
+
+    def __init__(self):
+        self.thresholds = []
+        self.alert_ids = []
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def add(self, threshold, alert_id):
+        lo = bisect.bisect_left(self.thresholds, threshold)
+        position = bisect.bisect_right(self.thresholds, threshold)
+        if alert_id in self.alert_ids[lo:position]:
+            # 重新加载时已读到该提醒
+            return
+        self.thresholds.insert(position, threshold)
+        self.alert_ids.insert(position, alert_id)
+
+    def remove(self, threshold, alert_id):
+        lo = bisect.bisect_left(self.thresholds, threshold)
+        hi = bisect.bisect_right(self.thresholds, threshold)
+        for position in range(lo, hi):
+            if self.alert_ids[position] == alert_id:
+                del self.thresholds[position]
+                del self.alert_ids[position]
+                return True
+        return False
+
+    def pop_at_or_below(self, price):
+        """取出并删除全部 <= price 的阈值"""
+        hi = bisect.bisect_right(self.thresholds, price)
+        hits = list(zip(self.thresholds[:hi], self.alert_ids[:hi]))
+        del self.thresholds[:hi]
+        del self.alert_ids[:hi]
+        return hits
+
+    def pop_at_or_above(self, price):
+        """取出并删除全部 >= price 的阈值"""
+        lo = bisect.bisect_left(self.thresholds, price)
+        hits = list(zip(self.thresholds[lo:], self.alert_ids[lo:]))
+        del self.thresholds[lo:]
+        del self.alert_ids[lo:]
+        return hits
+
+
+class PriceAlertService:
+    """价格提醒服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._books = {}  # (product_type, region, direction) -> ThresholdBook
+        self._freshness = VersionCheck(_alerts_version)
+        self._loaded = False
+
+    def _book(self, product_type, region, direction):
+        key = (product_type, region, direction)
+        book = self._books.get(key)
+        if book is None:
+            book = self._books[key] = ThresholdBook()
+        return book
+
+    def load(self):
+        """从数据库加载全部生效中的提醒"""
+        version = self._freshness.current()
+        rows = db.session.query(
+            PriceAlert.id, PriceAlert.product_type, PriceAlert.region,
+            PriceAlert.direction, PriceAlert.threshold
+        ).filter(PriceAlert.is_active.is_(True)).order_by(PriceAlert.threshold).all()
+
+        books = {}
+        for alert_id, product_type, region, direction, threshold in rows:
+            book = books.setdefault((product_type, region, direction), ThresholdBook())
+            book.thresholds.append(threshold)
+            book.alert_ids.append(alert_id)
+
+        with self._lock:
+            self._books = books
+            self._loaded = True
+        self._freshness.mark(version)
+        logger.info(f"价格提醒加载完成: {len(rows)} 条")
+
+    def ensure_loaded(self):
+        """首次使用时加载，之后其他进程修改过提醒时重新加载"""
+        if not self._loaded or self._freshness.stale():
+            self.load()
+
+    def reload(self):
+        """重新加载"""
+        self.load()
+
+    def create_alert(self, user_id, product_type, region, direction, threshold):
+        """创建价格提醒"""
+        try:
+            if direction not in DIRECTIONS:
+                return {'success': False, 'message': f"无效的提醒方向: {direction}"}
+            try:
+                threshold = float(threshold)
+            except (TypeError, ValueError):
+                return {'success': False, 'message': '阈值必须是数字'}
+            if threshold <= 0:
+                return {'success': False, 'message': '阈值必须大于0'}
+            if not product_type or not region:
+                return {'success': False, 'message': '缺少品种或地区'}
+
+            active = PriceAlert.query.filter_by(user_id=int(user_id), is_active=True).count()
+            if active >= MAX_ACTIVE_ALERTS:
+                return {'success': False, 'message': f'最多同时设置{MAX_ACTIVE_ALERTS}条提醒'}
+
+            self.ensure_loaded()
+            alert = PriceAlert(
+                user_id=int(user_id),
+                product_type=product_type,
+                region=region,
+                direction=direction,
+                threshold=threshold
+            )
+            db.session.add(alert)
+            db.session.commit()
+
+            with self._lock:
+                self._book(product_type, region, direction).add(threshold, alert.id)
+
+            logger.info(f"创建价格提醒: 用户 {user_id}, {product_type}-{region} {direction} {threshold}")
+            return {'success': True, 'message': '提醒创建成功', 'alert': alert.to_dict()}
+        except Exception as e:
+            logger.error(f"创建价格提醒失败: {e}")
+            db.session.rollback()
+            return {'success': False, 'message': '系统错误，请稍后重试'}
+
+    def delete_alert(self, user_id, alert_id):
+        """删除价格提醒"""
+        try:
+            alert = PriceAlert.query.filter_by(id=alert_id, user_id=int(user_id)).first()
+            if not alert:
+                return {'success': False, 'message': '提醒不存在'}
+
+            key = (alert.product_type, alert.region, alert.direction)
+            threshold, active = alert.threshold, alert.is_active
+            db.session.delete(alert)
+            db.session.commit()
+
+            # 提交成功后再从阈值表移除，提交失败时提醒仍然生效
+            if active and self._loaded:
+                with self._lock:
+                    self._book(*key).remove(threshold, alert_id)
+            return {'success': True, 'message': '提醒已删除'}
+        except Exception as e:
+            logger.error(f"删除价格提醒失败: {e}")
+            db.session.rollback()
+            return {'success': False, 'message': '系统错误，请稍后重试'}
+
+    def list_alerts(self, user_id):
+        """用户的全部提醒，生效中的在前"""
+        alerts = PriceAlert.query.filter_by(user_id=int(user_id)).order_by(
+            PriceAlert.is_active.desc(), PriceAlert.id.desc()
+        ).all()
+        return [alert.to_dict() for alert in alerts]
+
+    def evaluate(self, prices):
+        """用新报价检查提醒，prices 为含 product_type/region/price/price_date 的字典
+
+        在有序阈值表中只取出被穿越的部分，命中的提醒在数据库中加行锁确认
+        仍处于生效状态后置为失效并写入通知，返回触发的通知数。
+        """
+        self.ensure_loaded()
+
+        hits = {}  # alert_id -> (product_type, region, direction, threshold, 报价)
+        with self._lock:
+            for item in prices:
+                product_type, region, price = item['product_type'], item['region'], item['price']
+                above = self._books.get((product_type, region, 'above'))
+                below = self._books.get((product_type, region, 'below'))
+                for direction, popped in (
+                    ('above', above.pop_at_or_below(price) if above else []),
+                    ('below', below.pop_at_or_above(price) if below else []),
+                ):
+                    for threshold, alert_id in popped:
+                        hits[alert_id] = (product_type, region, direction, threshold, item)
+
+        if not hits:
+            return 0
+
+        try:
+            now = datetime.utcnow()
+            alerts = PriceAlert.query.filter(
+                PriceAlert.id.in_(list(hits)), PriceAlert.is_active.is_(True)
+            ).with_for_update().all()
+            for alert in alerts:
+                item = hits[alert.id][4]
+                alert.is_active = False
+                alert.triggered_at = now
+                db.session.add(AlertNotification(
+                    user_id=alert.user_id,
+                    alert_id=alert.id,
+                    product_type=alert.product_type,
+                    region=alert.region,
+                    direction=alert.direction,
+                    threshold=alert.threshold,
+                    price=item['price'],
+                    price_date=_as_datetime(item.get('price_date')),
+                    created_at=now
+                ))
+            db.session.commit()
+        except Exception as e:
+            # 写入失败时把取出的阈值放回，下一次报价重新检查
+            logger.error(f"价格提醒触发失败: {e}")
+            db.session.rollback()
+            with self._lock:
+                for alert_id, (product_type, region, direction, threshold, _) in hits.items():
+                    self._book(product_type, region, direction).add(threshold, alert_id)
+            return 0
+
+        logger.info(f"价格提醒触发: {len(alerts)} 条")
+        return len(alerts)
+
+    def inbox(self, user_id, unread_only=False, limit=20):
+        """用户收件箱，按触发时间倒序"""
+        query = AlertNotification.query.filter_by(user_id=int(user_id))
+        unread = query.filter_by(is_read=False).count()
+        if unread_only:
+            query = query.filter_by(is_read=False)
+        notifications = query.order_by(AlertNotification.id.desc()).limit(limit).all()
+        return {
+            'data': [notification.to_dict() for notification in notifications],
+            'unread': unread
+        }
+
+    def mark_read(self, user_id, notification_ids=None):
+        """将通知标记为已读，notification_ids 为 None 时全部标记，空列表不标记任何通知"""
+        if notification_ids is not None and not notification_ids:
+            return {'success': True, 'message': '已标记为已读', 'updated': 0}
+        try:
+            query = AlertNotification.query.filter_by(user_id=int(user_id), is_read=False)
+            if notification_ids is not None:
+                query = query.filter(AlertNotification.id.in_(notification_ids))
+            updated = query.update({'is_read': True}, synchronize_session=False)
+            db.session.commit()
+            return {'success': True, 'message': '已标记为已读', 'updated': updated}
+        except Exception as e:
+            logger.error(f"标记通知已读失败: {e}")
+            db.session.rollback()
+            return {'success': False, 'message': '系统错误，请稍后重试'}
+
+
+# 全局价格提醒服务实例
+price_alert_service = PriceAlertService()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+能源价格批量入库
+
+整批报价先用 pandas 做一次向量化校验，再按块写入多行 INSERT ... ON DUPLICATE KEY UPDATE
+（同一序列同一时间已有报价时覆盖，唯一键 uq_prices_series_date），
+随后在同一事务内刷新最新价格物化表、is_latest 标记和K线，提交后重算相关指数。
+每批分配一个变更序号，供 /prices?since= 增量同步。
+"""
+
+import io
+import logging
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from models.energy_data import EnergyPrice
+from services.candle_service import candle_service
+from services.change_feed import change_feed
+from services.correlation_service import correlation_service
+from services.index_service import index_service
+from services.latest_price_service import latest_price_service
+from services.price_alert_service import price_alert_service
+from services.price_store import price_store
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# 必填字段
+REQUIRED_COLUMNS = ('product_name', 'product_type', 'region', 'price', 'price_date')
+
+# 可选字段
+OPTIONAL_NUMERIC_COLUMNS = (
+    'opening_price', 'closing_price', 'highest_price', 'lowest_price',
+    'change_amount', 'change_percent', 'trading_volume'
+)
+OPTIONAL_TEXT_COLUMNS = ('price_unit', 'market')
+
+# 重复报价覆盖的字段（created_at、is_latest 保持原值）
+UPDATE_COLUMNS = ('product_name', 'price') + OPTIONAL_NUMERIC_COLUMNS + OPTIONAL_TEXT_COLUMNS
+
+# 将旧的最新价格标记翻转到物化表记录的那一行，一条语句覆盖本批所有序列，
+# 被修改的行记录本批的变更序号
+FLIP_LATEST_SQL = text("""
+    UPDATE energy_prices p
+    JOIN energy_latest_prices l ON l.product_type = p.product_type AND l.region = p.region
+    SET p.is_latest = (p.id = l.price_id), p.change_seq = :seq
+    WHERE (p.is_latest = 1 OR p.id = l.price_id)
+      AND (l.product_type, l.region) IN :keys
+""").bindparams(bindparam('keys', expanding=True))
+
+
+def _blank(values):
+    """空值或空白字符串"""
+    return values.isna() | (values.astype('string').str.strip() == '')
+
+
+class PriceIngestService:
+    """价格批量入库服务"""
+
+    def parse_records(self, records):
+        """将字典列表转换为待校验的数据表"""
+        return pd.DataFrame.from_records(records)
+
+    def parse_csv(self, content):
+        """将CSV文本转换为待校验的数据表"""
+        return pd.read_csv(io.StringIO(content), dtype=str, keep_default_na=False)
+
+    def validate(self, frame):
+        """向量化校验整批报价
+
+        返回 (rows, rejects)：rows 为可直接写入的字典列表，
+        rejects 为 {'row': 行号, 'error': 原因} 列表，行号从 0 开始。
+        """
+        missing = [name for name in REQUIRED_COLUMNS if name not in frame.columns]
+        if missing:
+            raise ValueError(f"缺少必填字段: {', '.join(missing)}")
+
+        frame = frame.reset_index(drop=True)
+        errors = pd.Series('', index=frame.index, dtype=object)
+
+        def reject(mask, reason):
+            errors[mask & (errors == '')] = reason
+
+        clean = pd.DataFrame(index=frame.index)
+        for name in ('product_name', 'product_type', 'region'):
+            reject(_blank(frame[name]), f'缺少{name}')
+            clean[name] = frame[name].astype('string').str.strip()
+
+        clean['price'] = pd.to_numeric(frame['price'], errors='coerce')
+        reject(clean['price'].isna() | (clean['price'] <= 0), '价格无效')
+
+        clean['price_date'] = pd.to_datetime(frame['price_date'], errors='coerce', format='mixed')
+        reject(clean['price_date'].isna(), '价格日期无效')
+
+        for name in OPTIONAL_NUMERIC_COLUMNS:
+            if name in frame.columns:
+                clean[name] = pd.to_numeric(frame[name], errors='coerce')
+                reject(clean[name].isna() & ~_blank(frame[name]), f'{name}无效')
+            else:
+                clean[name] = float('nan')
+
+        for name in OPTIONAL_TEXT_COLUMNS:
+            if name in frame.columns:
+                clean[name] = frame[name].astype('string').str.strip().replace('', pd.NA)
+            else:
+                clean[name] = pd.NA
+        clean['price_unit'] = clean['price_unit'].fillna('元/立方米')
+
+        # 同一批次内同一序列同一时间的重复报价只保留最后一条
+        duplicated = clean.duplicated(['product_type', 'region', 'price_date'], keep='last')
+        reject(duplicated & (errors == ''), '批次内重复报价')
+
+        valid = clean[errors == '']
+        rejects = [
+            {'row': int(row), 'error': reason}
+            for row, reason in errors[errors != ''].items()
+        ]
+
+        # 转换为 Python 原生类型，NaN/NA 转为 None
+        columns = {}
+        for name in valid.columns:
+            if name == 'price_date':
+                columns[name] = [value.to_pydatetime() for value in valid[name]]
+            else:
+                columns[name] = valid[name].astype(object).where(valid[name].notna(), None).tolist()
+
+        now = datetime.utcnow()
+        rows = [
+            dict({name: values[i] for name, values in columns.items()}, is_latest=False, created_at=now)
+            for i in range(len(valid))
+        ]
+        return rows, rejects
+
+    def ingest(self, frame, chunk_size=1000):
+        """校验并写入一批报价"""
+        rows, rejects = self.validate(frame)
+        if not rows:
+            return {'success': False, 'message': '没有有效的报价', 'inserted': 0, 'series': 0, 'rejected': rejects}
+
+        keys = sorted({(row['product_type'], row['region']) for row in rows})
+        table = EnergyPrice.__table__
+
+        try:
+            # 整批共用一个变更序号，序号行锁持有到提交
+            seq = change_feed.allocate('prices')
+            for row in rows:
+                row['change_seq'] = seq
+
+            for offset in range(0, len(rows), chunk_size):
+                stmt = mysql_insert(table).values(rows[offset:offset + chunk_size])
+                stmt = stmt.on_duplicate_key_update(
+                    {name: stmt.inserted[name] for name in UPDATE_COLUMNS + ('change_seq',)}
+                )
+                db.session.execute(stmt)
+
+            latest_price_service.refresh_series(keys)
+            db.session.execute(FLIP_LATEST_SQL, {'keys': keys, 'seq': seq})
+            candle_service.refresh(rows)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"批量写入价格失败: {e}")
+            db.session.rollback()
+            raise
+
+        # 多行 INSERT 拿不到逐行 id，按序列重新读取到内存存储（同时使价差、分析缓存失效，
+        # 并把最新价格推送给订阅客户端）
+        price_store.reload_series(keys)
+        correlation_service.invalidate(min(row['price_date'] for row in rows))
+
+        # 每批一次查询取回各序列最新价格，检查价格提醒
+        latest = list(latest_price_service.get_many(keys).values())
+        price_alert_service.evaluate(latest)
+
+        # K线已在同一事务内刷新，重算包含这些序列的指数
+        index_service.on_prices(rows)
+
+        logger.info(f"批量写入价格成功: {len(rows)} 条, {len(keys)} 个序列, 拒绝 {len(rejects)} 条")
+        return {
+            'success': True,
+            'message': '导入成功',
+            'inserted': len(rows),
+            'series': len(keys),
+            'rejected': rejects
+        }
+
+
+# 全局价格入库服务实例
+price_ingest_service = PriceIngestService()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+能源价格列式内存存储
+
+按 (product_type, region) 分序列保存价格历史，每个序列是一组按 price_date
+升序排列的连续 NumPy 数组。区间查询通过二分查找 + 切片完成，不再逐行访问数据库。
+
+其他进程（其他 Web worker、导入脚本）写入的价格通过 prices 变更序号发现：
+加载时记下当时的序号，之后每隔 REFRESH_INTERVAL 秒比较一次，序号前进时只重新
+读取 change_seq 更大的行所属的序列。按分区轮转删除的历史不分配序号，需 reload()。
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import tuple_
+
+from models.energy_data import EnergyPrice
+from services.change_feed import change_feed
+from utils.database import db
+from utils.downsample import minmax_indices
+
+logger = logging.getLogger(__name__)
+
+# 数值列（缺失值以 NaN 保存）
+NUMERIC_COLUMNS = (
+    'price', 'opening_price', 'closing_price', 'highest_price', 'lowest_price',
+    'change_amount', 'change_percent', 'trading_volume'
+)
+
+# 描述列（逐行保存，按对象数组切片）
+TEXT_COLUMNS = ('product_name', 'price_unit', 'market')
+
+DATE_DTYPE = 'datetime64[us]'
+
+# 检查其他进程写入的间隔（秒）
+REFRESH_INTERVAL = 5
+
+
+def _to_datetime64(values):
+    """将datetime列表转换为datetime64数组"""
+    return np.array([v if v is not None else np.datetime64('NaT') for v in values], dtype=DATE_DTYPE)
+
+
+def _to_float_array(values):
+    """将可能包含None的数值列表转换为float数组"""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _row_value(row, name):
+    """兼容模型对象和字典的取值"""
+    if isinstance(row, dict):
+        return row.get(name)
+    return getattr(row, name, None)
+
+
+class PriceSeries:
+    """单个 (product_type, region) 价格序列的列式数组"""
+
+    def __init__(self, product_type, region):
+        self.product_type = product_type
+        self.region = region
+        self.ids = np.empty(0, dtype=np.int64)
+        self.dates = np.empty(0, dtype=DATE_DTYPE)
+        self.created = np.empty(0, dtype=DATE_DTYPE)
+        self.numeric = {name: np.empty(0, dtype=np.float64) for name in NUMERIC_COLUMNS}
+        self.text = {name: np.empty(0, dtype=object) for name in TEXT_COLUMNS}
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def last_date(self):
+        """序列中最新的价格日期"""
+        if not len(self.dates):
+            return None
+        return self.dates[-1].astype(datetime)
+
+    def extended(self, rows):
+        """返回追加一批行后的新序列，保持按 price_date 升序
+
+        新数据通常晚于已有数据，此时直接拼接；出现补录的历史数据时
+        才做一次稳定排序。原序列不被修改，读者始终看到一致的快照。
+        """
+        if not rows:
+            return self
+
+        new_dates = _to_datetime64([_row_value(r, 'price_date') for r in rows])
+        ids = np.concatenate([self.ids, np.array([_row_value(r, 'id') or 0 for r in rows], dtype=np.int64)])
+        dates = np.concatenate([self.dates, new_dates])
+        created = np.concatenate([self.created, _to_datetime64([_row_value(r, 'created_at') for r in rows])])
+        numeric = {
+            name: np.concatenate([self.numeric[name], _to_float_array([_row_value(r, name) for r in rows])])
+            for name in NUMERIC_COLUMNS
+        }
+        text = {
+            name: np.concatenate([self.text[name], np.array([_row_value(r, name) for r in rows], dtype=object)])
+            for name in TEXT_COLUMNS
+        }
+
+        if len(dates) > 1 and (np.diff(dates) < np.timedelta64(0)).any():
+            order = np.argsort(dates, kind='stable')
+            ids, dates, created = ids[order], dates[order], created[order]
+            numeric = {name: arr[order] for name, arr in numeric.items()}
+            text = {name: arr[order] for name, arr in text.items()}
+
+        series = PriceSeries(self.product_type, self.region)
+        series.ids, series.dates, series.created = ids, dates, created
+        series.numeric, series.text = numeric, text
+        return series
+
+    def range_slice(self, start=None, end=None):
+        """二分查找 [start, end] 区间对应的切片"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, 'us'), side='left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, 'us'), side='right'))
+        return slice(lo, max(lo, hi))
+
+    def to_records(self, sl):
+        """将切片或下标数组转换为与 EnergyPrice.to_dict() 字段一致的字典列表"""
+        last_index = len(self.dates) - 1
+        positions = np.arange(len(self.dates))[sl].tolist()
+        ids = self.ids[sl].tolist()
+        dates = self.dates[sl].astype(datetime).tolist()
+        created = self.created[sl].astype(datetime).tolist()
+        numeric = {name: self.numeric[name][sl].tolist() for name in NUMERIC_COLUMNS}
+        text = {name: self.text[name][sl].tolist() for name in TEXT_COLUMNS}
+
+        records = []
+        for offset, position in enumerate(positions):
+            record = {
+                'id': ids[offset],
+                'product_type': self.product_type,
+                'region': self.region,
+                'is_latest': position == last_index,
+                'price_date': dates[offset].isoformat() if dates[offset] else None,
+                'created_at': created[offset].isoformat() if created[offset] else None
+            }
+            for name in TEXT_COLUMNS:
+                record[name] = text[name][offset]
+            for name in NUMERIC_COLUMNS:
+                value = numeric[name][offset]
+                record[name] = None if value != value else value
+            records.append(record)
+        return records
+
+
+class PriceStore:
+    """价格序列存储，进程内单例使用"""
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.RLock()
+        self._seq = 0  # 已加载数据对应的 prices 变更序号
+        self._checked_at = 0.0
+        self._listeners = []
+        self.loaded = False
+
+    def add_listener(self, callback):
+        """注册序列重新读取后的回调 callback(keys)"""
+        self._listeners.append(callback)
+
+    def _notify(self, keys):
+        for callback in self._listeners:
+            try:
+                callback(keys)
+            except Exception as e:
+                logger.error(f"价格序列更新回调失败: {e}")
+
+    def _load_series(self, keys=None, batch_size=5000):
+        """从 energy_prices 表读取序列（keys 为 None 时读取全部）"""
+        columns = [EnergyPrice.id, EnergyPrice.product_type, EnergyPrice.region,
+                   EnergyPrice.price_date, EnergyPrice.created_at]
+        columns += [getattr(EnergyPrice, name) for name in NUMERIC_COLUMNS + TEXT_COLUMNS]
+
+        query = db.session.query(*columns)
+        if keys is not None:
+            query = query.filter(tuple_(EnergyPrice.product_type, EnergyPrice.region).in_(list(keys)))
+        query = (query.order_by(EnergyPrice.product_type, EnergyPrice.region, EnergyPrice.price_date)
+                 .execution_options(yield_per=batch_size))
+
+        grouped = {}
+        for row in query:
+            grouped.setdefault((row.product_type, row.region), []).append(row._asdict())
+
+        return {
+            (product_type, region): PriceSeries(product_type, region).extended(rows)
+            for (product_type, region), rows in grouped.items()
+        }
+
+    def load(self, batch_size=5000):
+        """从 energy_prices 表全量加载（需在应用上下文中调用）"""
+        # 先取序号再读数据，读取期间提交的写入在下次检查时重新读取
+        seq = change_feed.current('prices')
+        series = self._load_series(batch_size=batch_size)
+
+        with self._lock:
+            self._series = series
+            self._seq = seq
+            self._checked_at = time.monotonic()
+            self.loaded = True
+
+        logger.info(f"价格存储加载完成: {len(series)} 个序列, {sum(len(s) for s in series.values())} 条记录")
+
+    def ensure_loaded(self):
+        """首次使用时加载，已加载时检查其他进程的写入"""
+        if self.loaded:
+            self.refresh()
+            return
+        with self._lock:
+            if not self.loaded:
+                self.load()
+
+    def reload(self):
+        """重新加载（外部进程直接写库后使用）"""
+        with self._lock:
+            self.loaded = False
+            self.load()
+        self._notify(self.series_keys())
+
+    def refresh(self, force=False):
+        """prices 变更序号前进时重新读取有变更的序列，返回重新读取的序列键
+
+        未到检查间隔时直接返回（force 时立即检查）。
+        """
+        if not self.loaded:
+            return []
+        now = time.monotonic()
+        if not force and now - self._checked_at < REFRESH_INTERVAL:
+            return []
+
+        with self._lock:
+            if not force and now - self._checked_at < REFRESH_INTERVAL:
+                return []
+            self._checked_at = now
+            seq = change_feed.current('prices')
+            if seq == self._seq:
+                return []
+
+            if seq < self._seq:
+                # 序号被重置，无法判断变更范围
+                self.loaded = False
+                self.load()
+                keys = self.series_keys()
+            else:
+                keys = [
+                    tuple(row) for row in db.session.query(EnergyPrice.product_type, EnergyPrice.region)
+                    .filter(EnergyPrice.change_seq > self._seq, EnergyPrice.change_seq <= seq)
+                    .distinct()
+                ]
+                if keys:
+                    self._series.update(self._load_series(keys))
+                self._seq = seq
+
+        if keys:
+            logger.info(f"价格存储发现其他进程写入: {len(keys)} 个序列")
+            self._notify(keys)
+        return keys
+
+    def append(self, prices):
+        """追加新入库的价格（EnergyPrice 对象或字典）"""
+        if not self.loaded:
+            # 尚未加载时无需追加，首次加载会从数据库读到这些记录
+            return
+
+        grouped = {}
+        for price in prices:
+            key = (_row_value(price, 'product_type'), _row_value(price, 'region'))
+            grouped.setdefault(key, []).append(price)
+
+        with self._lock:
+            for key, rows in grouped.items():
+                series = self._series.get(key) or PriceSeries(*key)
+                self._series[key] = series.extended(rows)
+
+    def reload_series(self, keys):
+        """从数据库重新读取指定序列（批量写入无法逐行拿到 id 时使用）"""
+        keys = {tuple(key) for key in keys}
+        if not self.loaded or not keys:
+            return
+
+        series = self._load_series(keys)
+        with self._lock:
+            self._series.update(series)
+        self._notify(keys)
+
+    def get_series(self, product_type, region):
+        """获取单个序列"""
+        return self._series.get((product_type, region))
+
+    def series_keys(self, product_type=None, region=None):
+        """列出满足条件的序列键"""
+        return [
+            key for key in list(self._series)
+            if (product_type is None or key[0] == product_type)
+            and (region is None or key[1] == region)
+        ]
+
+    def query(self, product_type=None, region=None, start=None, end=None, points=None):
+        """区间查询，结果按 price_date 倒序
+
+        指定 points 时每个序列按价格降采样到不超过 points 个点。
+        """
+        records = []
+        dates = []
+        for key in self.series_keys(product_type, region):
+            series = self._series.get(key)
+            if series is None:
+                continue
+            sl = series.range_slice(start, end)
+            if sl.stop <= sl.start:
+                continue
+            if points:
+                sl = sl.start + minmax_indices(series.numeric['price'][sl], points)
+            records.extend(series.to_records(sl))
+            dates.append(series.dates[sl])
+
+        if not records:
+            return []
+
+        order = np.argsort(np.concatenate(dates), kind='stable')[::-1]
+        return [records[i] for i in order]
+
+
+# 全局价格存储实例
+price_store = PriceStore()
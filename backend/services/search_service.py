@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+资讯 / 研报全文检索
+
+内存倒排索引：检索词 -> {文档: 加权词频}。中文按二元词切分（utils/tokenizer.py），
+标题和标签的词频按权重放大后与正文合并，用 BM25 打分，再按发布时间做衰减加权，
+越新的内容得分越高。查询只访问命中检索词的倒排表，不扫描全部内容。
+
+首次查询时从数据库加载；之后 ORM 写入、修改或删除资讯 / 研报时，在提交后
+增量更新对应文档，只有参与检索的字段变化时才重新分词。其他进程的写入按两表的
+(行数, 最大更新时间) 版本发现，版本变化时重新加载（utils/freshness.py）。
+"""
+
+import heapq
+import logging
+import math
+import threading
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, undefer_group
+
+from models.energy_data import EnergyNews, EnergyReport
+from utils.freshness import VersionCheck, table_version
+from utils.tokenizer import tokenize
+
+logger = logging.getLogger(__name__)
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 字段权重：标题、标签的命中比正文重要
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+
+# 时间衰减：刚发布的内容得分最多上浮 RECENCY_BOOST，每 RECENCY_HALF_LIFE_DAYS 天减半
+RECENCY_BOOST = 0.3
+RECENCY_HALF_LIFE_DAYS = 30
+
+# 结果摘要长度
+SNIPPET_LENGTH = 120
+
+# 参与检索的字段，只有这些字段变化时才重新建立索引
+INDEXED_FIELDS = {
+    'news': ('title', 'summary', 'content', 'tags', 'category', 'status', 'publish_time'),
+    'report': ('title', 'summary', 'keywords', 'tags', 'report_type', 'access_level', 'publish_date'),
+}
+
+# 文档类型 -> 模型
+DOC_TYPES = {
+    'news': EnergyNews,
+    'report': EnergyReport,
+}
+
+
+def content_version():
+    """资讯 / 研报的版本，任一进程写入、修改或删除内容后变化"""
+    return tuple(table_version(model) for model in DOC_TYPES.values())
+
+
+def _join(values):
+    return ' '.join(str(value) for value in values or [])
+
+
+def document_from_model(obj):
+    """从模型提取待索引的文档，未发布的资讯返回 None"""
+    if isinstance(obj, EnergyNews):
+        if obj.status != 'published':
+            return None
+        return {
+            'type': 'news',
+            'id': obj.id,
+            'title': obj.title or '',
+            'tags': _join(obj.tags),
+            'body': ' '.join(filter(None, [obj.summary, obj.content])),
+            'snippet': (obj.summary or obj.content or '')[:SNIPPET_LENGTH],
+            'category': obj.category,
+            'access_level': 'free',
+            'published_at': obj.publish_time,
+        }
+    return {
+        'type': 'report',
+        'id': obj.id,
+        'title': obj.title or '',
+        'tags': _join((obj.tags or []) + (obj.keywords or [])),
+        'body': obj.summary or '',
+        'snippet': (obj.summary or '')[:SNIPPET_LENGTH],
+        'category': obj.report_type,
+        'access_level': obj.access_level or 'free',
+        'published_at': obj.publish_date,
+    }
+
+
+class SearchService:
+    """全文检索服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}  # 检索词 -> {(类型, id): 加权词频}
+        self._documents = {}  # (类型, id) -> (词频 Counter, 文档长度, 元数据)
+        self._total_length = 0
+        self._freshness = VersionCheck(content_version)
+        self._loaded = False
+
+    def _remove(self, key):
+        """移除文档，调用方持有锁"""
+        entry = self._documents.pop(key, None)
+        if entry is None:
+            return
+        terms, length, _ = entry
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= length
+
+    def _add(self, document):
+        """加入或替换文档，调用方持有锁"""
+        key = (document['type'], document['id'])
+        self._remove(key)
+
+        terms = Counter(tokenize(document['body']))
+        for term in tokenize(document['title']):
+            terms[term] += TITLE_WEIGHT
+        for term in tokenize(document['tags']):
+            terms[term] += TAG_WEIGHT
+        if not terms:
+            return
+
+        length = sum(terms.values())
+        meta = {name: document[name] for name in ('type', 'id', 'title', 'snippet', 'category', 'access_level', 'published_at')}
+        self._documents[key] = (terms, length, meta)
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[key] = frequency
+
+    def load(self):
+        """从数据库加载全部已发布资讯和研报"""
+        version = self._freshness.current()
+        documents = []
+        for model in DOC_TYPES.values():
+            query = model.query.options(undefer_group('body'))
+            if model is EnergyNews:
+                query = query.filter(EnergyNews.status == 'published')
+            documents.extend(document_from_model(obj) for obj in query.yield_per(500))
+
+        with self._lock:
+            self._postings = {}
+            self._documents = {}
+            self._total_length = 0
+            for document in documents:
+                if document:
+                    self._add(document)
+            self._loaded = True
+        self._freshness.mark(version)
+        logger.info(f"全文索引加载完成: {len(self._documents)} 篇, {len(self._postings)} 个检索词")
+
+    def ensure_loaded(self):
+        """首次使用时加载，之后其他进程修改过内容时重新加载"""
+        if not self._loaded or self._freshness.stale():
+            self.load()
+
+    def apply(self, documents, removed):
+        """提交后增量更新：documents 为新增或修改的文档，removed 为删除或下线的 (类型, id)"""
+        if not self._loaded:
+            return
+        with self._lock:
+            for key in removed:
+                self._remove(key)
+            for document in documents:
+                self._add(document)
+
+    def search(self, query, doc_type=None, category=None, free_only=False, limit=10, offset=0, now=None):
+        """按 BM25 和时间衰减排序检索，返回 (总命中数, 当前页结果)"""
+        self.ensure_loaded()
+        terms = set(tokenize(query))
+        if not terms:
+            return 0, []
+
+        now = now or datetime.now()
+        with self._lock:
+            count = len(self._documents)
+            if not count:
+                return 0, []
+            average_length = self._total_length / count
+
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    length = self._documents[key][1]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[key] = scores.get(key, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+            matches = []
+            for key, score in scores.items():
+                meta = self._documents[key][2]
+                if doc_type and meta['type'] != doc_type:
+                    continue
+                if category and meta['category'] != category:
+                    continue
+                if free_only and meta['access_level'] != 'free':
+                    continue
+                if meta['published_at']:
+                    age_days = max((now - meta['published_at']).total_seconds() / 86400, 0)
+                    score *= 1 + RECENCY_BOOST * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+                matches.append((score, key))
+
+            results = []
+            for score, key in heapq.nlargest(offset + limit, matches)[offset:]:
+                meta = dict(self._documents[key][2])
+                published_at = meta.pop('published_at')
+                meta['publish_time'] = published_at.isoformat() if published_at else None
+                meta['score'] = round(score, 4)
+                results.append(meta)
+        return len(matches), results
+
+
+# 全局检索服务实例
+search_service = SearchService()
+
+
+def _indexed_changed(obj, doc_type):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in INDEXED_FIELDS[doc_type])
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_documents(session, flush_context):
+    """记录本事务写入、修改或删除的资讯/研报，提交后再更新索引
+
+    flush 之后 id 已分配，此时提取文档，提交后不再访问已过期的模型属性。
+    """
+    pending = session.info.setdefault('search_documents', {})
+    for obj in list(session.new) + list(session.dirty):
+        for doc_type, model in DOC_TYPES.items():
+            if isinstance(obj, model) and (obj in session.new or _indexed_changed(obj, doc_type)):
+                pending[(doc_type, obj.id)] = document_from_model(obj)
+    for obj in session.deleted:
+        for doc_type, model in DOC_TYPES.items():
+            if isinstance(obj, model):
+                pending[(doc_type, obj.id)] = None
+    if not pending:
+        session.info.pop('search_documents', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_documents(session):
+    pending = session.info.pop('search_documents', None)
+    if pending:
+        search_service.apply(
+            [document for document in pending.values() if document],
+            [key for key, document in pending.items() if document is None]
+        )
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_documents(session):
+    session.info.pop('search_documents', None)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+跨地区价差计算
+
+从列式价格存储中取出同一品种各地区的价格，按日对齐为 (日期 × 地区) 矩阵，
+用 NumPy 广播一次得到全部地区两两之间的价差。对齐后的每日价格按
+(product_type, 日期) 缓存（按最近使用淘汰，最多 CACHE_SIZE 行），重复请求不再
+重新对齐；价格存储重新读取该品种的序列时（本进程入库或发现其他进程写入）失效。
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from services.price_store import price_store
+
+logger = logging.getLogger(__name__)
+
+# 缓存的 (品种, 日期) 行数
+CACHE_SIZE = 20000
+
+# 单次请求的最大天数
+MAX_DAYS = 3660
+
+
+def _day(value):
+    """datetime 转为 datetime64[D]"""
+    return np.datetime64(value.date() if isinstance(value, datetime) else value, 'D')
+
+
+def _to_list(matrix):
+    """NaN 转为 None 后输出为嵌套列表"""
+    return np.where(np.isnan(matrix), None, np.round(matrix, 4)).tolist()
+
+
+class SpreadService:
+    """价差服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # (product_type, day) -> (regions, 当日各地区价格)
+
+    def invalidate(self, product_types):
+        """品种有新价格入库时清除其缓存"""
+        product_types = set(product_types)
+        with self._lock:
+            for key in [key for key in self._cache if key[0] in product_types]:
+                del self._cache[key]
+
+    def _align(self, product_type, regions, days):
+        """将各地区价格按日对齐，每日取最后一笔报价"""
+        matrix = np.full((len(days), len(regions)), np.nan)
+        start = days[0].astype(datetime)
+        end = (days[-1] + 1).astype(datetime)
+
+        for column, region in enumerate(regions):
+            series = price_store.get_series(product_type, region)
+            if series is None:
+                continue
+            sl = series.range_slice(start, end)
+            quote_days = series.dates[sl].astype('datetime64[D]')
+            prices = series.numeric['price'][sl]
+            in_range = quote_days <= days[-1]
+            quote_days, prices = quote_days[in_range], prices[in_range]
+            if not len(quote_days):
+                continue
+            is_last = np.r_[quote_days[1:] != quote_days[:-1], True]
+            rows = (quote_days[is_last] - days[0]).astype(np.int64)
+            matrix[rows, column] = prices[is_last]
+        return matrix
+
+    def aligned_prices(self, product_type, start, end):
+        """返回 (regions, days, 日期×地区价格矩阵)，优先读取缓存"""
+        price_store.ensure_loaded()
+        regions = tuple(sorted(region for _, region in price_store.series_keys(product_type)))
+        days = np.arange(_day(start), _day(end) + 1, dtype='datetime64[D]')
+        if len(days) > MAX_DAYS:
+            raise ValueError(f'区间不能超过 {MAX_DAYS} 天')
+
+        with self._lock:
+            cached = []
+            for day in days:
+                key = (product_type, day.item())
+                item = self._cache.get(key)
+                if item is not None:
+                    self._cache.move_to_end(key)
+                cached.append(item)
+
+        missing = [i for i, item in enumerate(cached) if item is None or item[0] != regions]
+        if missing:
+            span = days[missing[0]:missing[-1] + 1]
+            computed = self._align(product_type, regions, span)
+            with self._lock:
+                for offset, day in enumerate(span):
+                    row = computed[offset]
+                    self._cache[(product_type, day.item())] = (regions, row)
+                    cached[missing[0] + offset] = (regions, row)
+                while len(self._cache) > CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+        matrix = np.vstack([item[1] for item in cached]) if cached else np.empty((0, len(regions)))
+        return regions, days, matrix
+
+    def spreads(self, product_type, start, end, pair=None):
+        """计算区间内的价差矩阵及指定地区对的价差序列
+
+        spread[i][j] = price(regions[i]) - price(regions[j])。
+        """
+        regions, days, prices = self.aligned_prices(product_type, start, end)
+
+        # (日期, 地区, 地区) 三维价差
+        diff = prices[:, :, None] - prices[:, None, :]
+        valid = ~np.isnan(diff)
+        counts = valid.sum(axis=0)
+        mean = np.where(counts > 0, np.where(valid, diff, 0).sum(axis=0) / np.maximum(counts, 1), np.nan)
+
+        # 最近一个至少两个地区有报价的日期
+        quoted = (~np.isnan(prices)).sum(axis=1) >= 2
+        as_of = int(np.flatnonzero(quoted)[-1]) if quoted.any() else None
+
+        result = {
+            'product_type': product_type,
+            'regions': list(regions),
+            'start': str(days[0]) if len(days) else None,
+            'end': str(days[-1]) if len(days) else None,
+            'as_of': str(days[as_of]) if as_of is not None else None,
+            'matrix': _to_list(diff[as_of]) if as_of is not None else [],
+            'mean_matrix': _to_list(mean)
+        }
+
+        if pair:
+            base, quote = pair
+            if base not in regions or quote not in regions:
+                raise ValueError(f"无效的地区对: {base},{quote}")
+            series = diff[:, regions.index(base), regions.index(quote)]
+            result['pair'] = {
+                'base': base,
+                'quote': quote,
+                'data': [
+                    {'date': str(day), 'spread': value}
+                    for day, value in zip(days, _to_list(series))
+                ]
+            }
+
+        return result
+
+
+# 全局价差服务实例
+spread_service = SpreadService()
+
+
+def _on_series_reloaded(keys):
+    spread_service.invalidate({product_type for product_type, _ in keys})
+
+
+price_store.add_listener(_on_series_reloaded)
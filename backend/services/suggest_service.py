@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+检索框前缀联想
+
+候选词来自资讯 / 研报标题、资讯 / 研报的 JSON 标签、研报关键词，以及
+Config.TRADING_PRODUCTS 和 Config.REGIONS。候选词规范化后放在一个有序数组里，
+前缀查询用二分查找定位区间，再按热度取前 K 个；热度来自内容的浏览（下载）次数，
+同一个词被多处使用时热度累加。用户标签属于个人数据，不作为候选词。
+
+全部在内存中完成，不访问数据库。首次使用时加载，之后内容发布、修改、下线或
+浏览次数变化时在提交后增量更新；缓冲的浏览 / 下载计数落库后同步提高热度。
+其他进程写入的内容按资讯 / 研报版本发现后重新加载；其他进程落库的浏览次数
+不改变版本，最多 RELOAD_MAX_AGE 秒后随重新加载生效。
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+from collections import Counter, OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from config import Config
+from models.energy_data import EnergyNews, EnergyReport
+from services.search_service import content_version
+from utils.counters import counter_buffer
+from utils.freshness import VersionCheck
+from utils.tokenizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# 候选词类型，数字越小越优先作为展示类型
+KIND_PRIORITY = {'product': 0, 'region': 1, 'tag': 2, 'title': 3}
+
+# 交易品种、地区的固定热度
+CONFIG_WEIGHT = 100.0
+
+# 缓存的前缀查询结果数
+CACHE_SIZE = 1024
+
+# 两次全量加载的最长间隔（秒），用于同步其他进程的热度
+RELOAD_MAX_AGE = 600
+
+# 影响候选词或热度的字段
+TRACKED_FIELDS = {
+    EnergyNews: ('title', 'tags', 'status', 'view_count'),
+    EnergyReport: ('title', 'tags', 'keywords', 'access_level', 'view_count', 'download_count'),
+}
+
+
+def suggestion_key(text):
+    """候选词的规范化键"""
+    return normalize_text(text).strip()
+
+
+def contributions_from_model(model, obj):
+    """模型实例（或同名字段的查询行）对应的候选词 [(文本, 类型, 热度, 免费用户可见)]，
+    未发布的资讯返回空列表
+    """
+    if model is EnergyNews:
+        if obj.status != 'published':
+            return []
+        weight = 1.0 + (obj.view_count or 0)
+        return [(obj.title, 'title', weight, True)] + [(tag, 'tag', weight, True) for tag in obj.tags or []]
+
+    if model is EnergyReport:
+        weight = 1.0 + (obj.view_count or 0) + (obj.download_count or 0)
+        free = (obj.access_level or 'free') == 'free'
+        terms = (obj.tags or []) + (obj.keywords or [])
+        return [(obj.title, 'title', weight, free)] + [(term, 'tag', weight, free) for term in terms]
+
+    return []
+
+
+def _source(model, obj):
+    return (model.__tablename__, obj.id)
+
+
+class Suggestion:
+    """一个候选词的累计热度"""
+
+    def __init__(self, text):
+        self.text = text
+        self.kinds = Counter()
+        self.weight = 0.0
+        self.free_weight = 0.0
+        self.free_count = 0
+
+    @property
+    def kind(self):
+        return min(self.kinds, key=KIND_PRIORITY.get)
+
+
+class SuggestService:
+    """前缀联想服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []  # 有序的规范化键
+        self._entries = {}  # 规范化键 -> Suggestion
+        self._sources = {}  # (表名, id) -> 该来源贡献的 [(键, 类型, 热度, 免费可见)]
+        self._cache = OrderedDict()
+        self._freshness = VersionCheck(content_version, max_age=RELOAD_MAX_AGE)
+        self._loaded = False
+
+    def _add(self, source, contributions):
+        """登记来源贡献的候选词，调用方持有锁"""
+        added = []
+        for text, kind, weight, free in contributions:
+            key = suggestion_key(text or '')
+            if not key:
+                continue
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = Suggestion(text.strip())
+                bisect.insort(self._keys, key)
+            entry.kinds[kind] += 1
+            entry.weight += weight
+            if free:
+                entry.free_weight += weight
+                entry.free_count += 1
+            added.append((key, kind, weight, free))
+        if added:
+            self._sources[source] = added
+
+    def _remove(self, source):
+        """撤销来源贡献的候选词，调用方持有锁"""
+        for key, kind, weight, free in self._sources.pop(source, []):
+            entry = self._entries[key]
+            entry.kinds[kind] -= 1
+            if not entry.kinds[kind]:
+                del entry.kinds[kind]
+            entry.weight -= weight
+            if free:
+                entry.free_weight -= weight
+                entry.free_count -= 1
+            if not entry.kinds:
+                del self._entries[key]
+                del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def _invalidate(self, keys):
+        """使查询词为这些键前缀的缓存结果失效，调用方持有锁"""
+        prefixes = {key[:end] for key in keys for end in range(1, len(key) + 1)}
+        for cache_key in [cache_key for cache_key in self._cache if cache_key[0] in prefixes]:
+            del self._cache[cache_key]
+
+    def load(self):
+        """从数据库和配置加载全部候选词"""
+        version = self._freshness.current()
+        sources = [
+            (('config', 'products'), [(name, 'product', CONFIG_WEIGHT, True) for name in Config.TRADING_PRODUCTS]),
+            (('config', 'regions'), [(name, 'region', CONFIG_WEIGHT, True) for name in Config.REGIONS]),
+        ]
+        for model, fields in TRACKED_FIELDS.items():
+            columns = [getattr(model, name) for name in ('id',) + fields]
+            for row in model.query.with_entities(*columns).yield_per(1000):
+                sources.append((_source(model, row), contributions_from_model(model, row)))
+
+        with self._lock:
+            self._keys = []
+            self._entries = {}
+            self._sources = {}
+            self._cache.clear()
+            for source, contributions in sources:
+                self._add(source, contributions)
+            self._loaded = True
+        self._freshness.mark(version)
+        logger.info(f"联想词加载完成: {len(self._keys)} 个")
+
+    def ensure_loaded(self):
+        """首次使用时加载，之后其他进程修改过内容时重新加载"""
+        if not self._loaded or self._freshness.stale():
+            self.load()
+
+    def apply(self, changes):
+        """提交后增量更新，changes 为 {来源: 贡献列表}，空列表表示删除或下线"""
+        if not self._loaded:
+            return
+        with self._lock:
+            changed = set()
+            for source, contributions in changes.items():
+                changed.update(item[0] for item in self._sources.get(source, []))
+                self._remove(source)
+                self._add(source, contributions)
+                changed.update(item[0] for item in self._sources.get(source, []))
+            self._invalidate(changed)
+
+    def add_popularity(self, table_name, deltas):
+        """浏览 / 下载计数落库后按增量提高对应来源的热度"""
+        if not self._loaded:
+            return
+        with self._lock:
+            changed = set()
+            for row_id, delta in deltas.items():
+                contributions = self._sources.get((table_name, row_id))
+                if not contributions:
+                    continue
+                for key, kind, weight, free in contributions:
+                    entry = self._entries[key]
+                    entry.weight += delta
+                    if free:
+                        entry.free_weight += delta
+                    changed.add(key)
+                self._sources[(table_name, row_id)] = [
+                    (key, kind, weight + delta, free) for key, kind, weight, free in contributions
+                ]
+            self._invalidate(changed)
+
+    def suggest(self, prefix, limit=10, free_only=False):
+        """以 prefix 开头、热度最高的 limit 个候选词"""
+        self.ensure_loaded()
+        key = suggestion_key(prefix)
+        if not key:
+            return []
+
+        cache_key = (key, limit, free_only)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached
+
+            # 以 prefix 开头的键在有序数组中是连续的一段
+            start = bisect.bisect_left(self._keys, key)
+            end = bisect.bisect_left(self._keys, key + '\U0010ffff', start)
+            entries = (self._entries[item] for item in self._keys[start:end])
+            if free_only:
+                entries = (entry for entry in entries if entry.free_count)
+                top = heapq.nlargest(limit, entries, key=lambda entry: entry.free_weight)
+            else:
+                top = heapq.nlargest(limit, entries, key=lambda entry: entry.weight)
+
+            result = [
+                {
+                    'text': entry.text,
+                    'kind': entry.kind,
+                    'weight': entry.free_weight if free_only else entry.weight
+                }
+                for entry in top
+            ]
+            self._cache[cache_key] = result
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return result
+
+
+# 全局联想服务实例
+suggest_service = SuggestService()
+
+
+def _on_counts_flushed(table_name, column, deltas):
+    if column in ('view_count', 'download_count'):
+        suggest_service.add_popularity(table_name, deltas)
+
+
+counter_buffer.add_listener(_on_counts_flushed)
+
+
+def _tracked_changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_suggestions(session, flush_context):
+    """记录本事务中影响候选词的写入，提交后再更新"""
+    pending = session.info.setdefault('suggest_sources', {})
+    for obj in list(session.new) + list(session.dirty):
+        model = type(obj)
+        fields = TRACKED_FIELDS.get(model)
+        if fields and (obj in session.new or _tracked_changed(obj, fields)):
+            pending[_source(model, obj)] = contributions_from_model(model, obj)
+    for obj in session.deleted:
+        model = type(obj)
+        if model in TRACKED_FIELDS:
+            pending[_source(model, obj)] = []
+    if not pending:
+        session.info.pop('suggest_sources', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_suggestions(session):
+    pending = session.info.pop('suggest_sources', None)
+    if pending:
+        suggest_service.apply(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_suggestions(session):
+    session.info.pop('suggest_sources', None)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+资讯 / 研报标签索引
+
+JSON tags 列无法建普通索引，按标签匹配内容只能逐篇扫描数组。这里把标签规范化后
+存入标签字典 energy_tags，每篇内容的每个标签在 energy_content_tags 记一行
+(tag_id, content_type, content_id, publish_time)。按标签取候选内容变为按
+(content_type, tag_id, publish_time) 索引的查询，按发布时间倒序。多个标签时每个
+标签各取前 limit 行（UNION ALL），再在内存中合并去重，避免 IN 与 ORDER BY / LIMIT
+组合时 MySQL 读出全部匹配行再 filesort。tag_key 使用 utf8mb4_bin 排序规则，
+规范化后仍不同的标签（如带重音与不带重音）不会被唯一键视为重复。
+
+ORM 写入、修改或删除资讯 / 研报时在同一事务内同步；已有数据用
+rebuild_content_tags.py 回填。
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select, union_all
+from sqlalchemy.orm import Session
+
+from models.energy_data import EnergyNews, EnergyTag, EnergyContentTag
+from services.search_service import DOC_TYPES
+from utils.database import db
+from utils.tokenizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# 规范化标签的最大长度，与 energy_tags.tag_key 一致
+TAG_KEY_LENGTH = 100
+
+# 发布时间列
+PUBLISH_COLUMNS = {
+    'news': 'publish_time',
+    'report': 'publish_date',
+}
+
+# 影响标签索引的字段
+TAG_FIELDS = {
+    'news': ('tags', 'status', 'publish_time'),
+    'report': ('tags', 'access_level', 'publish_date'),
+}
+
+
+def tag_key(name):
+    """标签的规范化名称，空标签返回 None"""
+    key = normalize_text(str(name)).strip()[:TAG_KEY_LENGTH]
+    return key or None
+
+
+def tag_entry(doc_type, obj):
+    """内容的标签索引项 ({规范化名称: 原始名称}, 发布时间, 访问级别)，未发布的资讯返回 None
+
+    obj 可以是模型实例，也可以是字段同名的查询行。
+    """
+    if doc_type == 'news' and obj.status != 'published':
+        return None
+    names = {}
+    for name in obj.tags or []:
+        key = tag_key(name)
+        if key:
+            names.setdefault(key, str(name).strip()[:TAG_KEY_LENGTH])
+    access_level = 'free' if doc_type == 'news' else (obj.access_level or 'free')
+    return names, getattr(obj, PUBLISH_COLUMNS[doc_type]), access_level
+
+
+class TagService:
+    """标签索引服务"""
+
+    def ensure_tags(self, names, session=None):
+        """返回 {规范化名称: tag_id}，字典中没有的标签先写入"""
+        session = session or db.session
+        if not names:
+            return {}
+
+        table = EnergyTag.__table__
+        keys = list(names)
+        ids = dict(session.execute(select(table.c.tag_key, table.c.id).where(table.c.tag_key.in_(keys))).all())
+        missing = [key for key in keys if key not in ids]
+        if missing:
+            # 并发写入同一新标签时以先写入者为准
+            session.execute(
+                table.insert().prefix_with('IGNORE', dialect='mysql'),
+                [{'tag_key': key, 'name': names[key]} for key in missing]
+            )
+            ids.update(session.execute(
+                select(table.c.tag_key, table.c.id).where(table.c.tag_key.in_(missing))
+            ).all())
+        return ids
+
+    def tag_ids(self, names):
+        """已有标签的 id，不存在的标签忽略"""
+        keys = {key for key in map(tag_key, names) if key}
+        if not keys:
+            return []
+        return [row.id for row in EnergyTag.query.with_entities(EnergyTag.id).filter(EnergyTag.tag_key.in_(keys))]
+
+    def sync(self, entries, session=None, replace=True, chunk_size=1000):
+        """写入内容的标签行，entries 为 {(类型, id): tag_entry(...) 或 None}
+
+        replace 时先删除这些内容已有的标签行（None 表示删除或下线，只删除）。
+        不提交事务，由调用方与内容写入一并提交，返回写入的行数。
+        """
+        session = session or db.session
+        table = EnergyContentTag.__table__
+
+        if replace:
+            for doc_type in DOC_TYPES:
+                ids = [id_ for (key_type, id_) in entries if key_type == doc_type]
+                for offset in range(0, len(ids), chunk_size):
+                    session.execute(table.delete().where(
+                        table.c.content_type == doc_type,
+                        table.c.content_id.in_(ids[offset:offset + chunk_size])
+                    ))
+
+        names = {}
+        for entry in entries.values():
+            if entry:
+                for key, name in entry[0].items():
+                    names.setdefault(key, name)
+        tag_ids = self.ensure_tags(names, session)
+
+        rows = []
+        for (doc_type, id_), entry in entries.items():
+            if not entry:
+                continue
+            keys, publish_time, access_level = entry
+            rows.extend(
+                {
+                    'tag_id': tag_ids[key], 'content_type': doc_type, 'content_id': id_,
+                    'publish_time': publish_time, 'access_level': access_level
+                }
+                for key in keys if key in tag_ids
+            )
+        for offset in range(0, len(rows), chunk_size):
+            session.execute(table.insert(), rows[offset:offset + chunk_size])
+        return len(rows)
+
+    def rebuild(self, chunk_size=1000):
+        """根据各表的 JSON tags 列重建标签索引并提交，返回写入的行数"""
+        EnergyContentTag.query.delete()
+
+        count = 0
+        for doc_type, model in DOC_TYPES.items():
+            fields = ('id',) + TAG_FIELDS[doc_type]
+            query = model.query.with_entities(*[getattr(model, name) for name in fields])
+            if model is EnergyNews:
+                query = query.filter(EnergyNews.status == 'published')
+
+            entries = {}
+            for row in query.order_by(model.id).yield_per(chunk_size):
+                entries[(doc_type, row.id)] = tag_entry(doc_type, row)
+                if len(entries) >= chunk_size:
+                    count += self.sync(entries, replace=False)
+                    entries = {}
+            count += self.sync(entries, replace=False)
+
+        db.session.commit()
+        return count
+
+    def match(self, content_type, names, limit=10, free_only=False):
+        """带有任一标签的内容 id，按发布时间倒序"""
+        tag_ids = self.tag_ids(names)
+        if not tag_ids:
+            return []
+
+        table = EnergyContentTag.__table__
+        selects = []
+        for tag_id in tag_ids:
+            stmt = select(table.c.content_id, table.c.publish_time).where(
+                table.c.content_type == content_type,
+                table.c.tag_id == tag_id
+            )
+            if free_only:
+                stmt = stmt.where(table.c.access_level == 'free')
+            selects.append(stmt.order_by(table.c.publish_time.desc(), table.c.content_id.desc()).limit(limit))
+        stmt = selects[0] if len(selects) == 1 else union_all(*selects)
+
+        # 同一内容可能命中多个标签，去重后按 (发布时间, id) 倒序合并，空发布时间排在最后
+        latest = {}
+        for content_id, publish_time in db.session.execute(stmt):
+            latest[content_id] = publish_time
+        ranked = sorted(latest.items(), key=lambda item: (item[1] or datetime.min, item[0]), reverse=True)
+        return [content_id for content_id, _ in ranked[:limit]]
+
+
+# 全局标签索引服务实例
+tag_service = TagService()
+
+
+def _doc_type(obj):
+    for doc_type, model in DOC_TYPES.items():
+        if isinstance(obj, model):
+            return doc_type
+    return None
+
+
+def _tags_changed(obj, doc_type):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in TAG_FIELDS[doc_type])
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_content_tags(session, flush_context):
+    """ORM 写入资讯 / 研报时在同一事务内同步标签索引"""
+    entries = {}
+    for obj in list(session.new) + list(session.dirty):
+        doc_type = _doc_type(obj)
+        if doc_type and (obj in session.new or _tags_changed(obj, doc_type)):
+            entries[(doc_type, obj.id)] = tag_entry(doc_type, obj)
+    for obj in session.deleted:
+        doc_type = _doc_type(obj)
+        if doc_type:
+            entries[(doc_type, obj.id)] = None
+    if entries:
+        tag_service.sync(entries, session)
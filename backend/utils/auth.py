@@ -1,9 +1,9 @@
+import hmac
 import bcrypt
 import jwt
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
-from bson import ObjectId
 from config import Config
 
 def hash_password(password):
@@ -48,6 +48,10 @@ def login_required(f):
             except IndexError:
                 return jsonify({'error': '无效的认证头格式'}), 401
         
+        # EventSource 无法设置请求头，推送连接允许通过查询参数传递token
+        if not token and request.accept_mimetypes.best == 'text/event-stream':
+            token = request.args.get('token')
+        
         if not token:
             return jsonify({'error': '缺少认证令牌'}), 401
         
@@ -71,19 +75,34 @@ def paid_user_required(f):
     @wraps(f)
     @login_required
     def decorated_function(*args, **kwargs):
-        from utils.database import db
+        from models.user import User
         
         # 获取用户信息
-        user_id = request.current_user['user_id']
-        users_collection = db.get_collection('users')
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        user = User.query.get(int(request.current_user['user_id']))
         
         if not user:
             return jsonify({'error': '用户不存在'}), 404
         
-        if user.get('user_type') != 'paid':
+        # 用户类型为 free / premium，非免费用户即为付费用户
+        if (user.user_type or 'free') == 'free':
             return jsonify({'error': '此功能仅对付费用户开放'}), 403
         
         return f(*args, **kwargs)
     
-    return decorated_function 
\ No newline at end of file
+    return decorated_function 
+
+def ingest_token_required(f):
+    """需要数据写入令牌的装饰器"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not Config.INGEST_API_TOKEN:
+            return jsonify({'error': '数据写入接口未启用'}), 503
+        
+        token = request.headers.get('X-Ingest-Token', '')
+        
+        if not token or not hmac.compare_digest(token, Config.INGEST_API_TOKEN):
+            return jsonify({'error': '无效的数据写入令牌'}), 401
+        
+        return f(*args, **kwargs)
+    
+    return decorated_function
\ No newline at end of file
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+浏览 / 下载次数的合并写入
+
+每次浏览只在内存中累加增量，后台线程每隔 COUNTER_FLUSH_INTERVAL 秒把同一列的
+增量合并成一条批量 UPDATE（col = col + CASE id WHEN ... END），热门内容不再
+每次点击都锁行、单独提交一个事务。读取时把尚未落库的增量加到数据库的值上。
+计数不算内容修改，落库时保持 updated_at 不变，不会触发检索等索引重新加载。
+
+落库失败时增量放回缓冲区，下一轮重试；进程退出时再落库一次。后台线程只在
+Web 服务进程中启动（COUNTER_FLUSH_THREAD 或 start()），命令行脚本只在退出时落库。
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from sqlalchemy import case, func
+
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# 默认落库间隔（秒）
+DEFAULT_FLUSH_INTERVAL = 5
+
+# 单条 UPDATE 最多涉及的行数
+FLUSH_BATCH_SIZE = 500
+
+
+class CounterBuffer:
+    """计数增量缓冲区"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}  # 表名 -> Table
+        self._pending = {}  # (表名, 列名) -> Counter{id: 增量}
+        self._flushing = {}  # 正在落库、尚未提交的增量，读取时同样要合并
+        self._listeners = []
+        self._app = None
+        self._stop = None
+
+    def increment(self, table, column, row_id, amount=1):
+        """累加一行某一列的增量"""
+        with self._lock:
+            self._tables[table.name] = table
+            self._pending.setdefault((table.name, column), Counter())[row_id] += amount
+
+    def pending(self, table, column, row_id):
+        """尚未落库的增量"""
+        key = (table.name, column)
+        with self._lock:
+            return self._pending.get(key, {}).get(row_id, 0) + self._flushing.get(key, {}).get(row_id, 0)
+
+    def add_listener(self, callback):
+        """注册落库后的回调 callback(表名, 列名, {id: 增量})"""
+        self._listeners.append(callback)
+
+    def flush(self):
+        """把缓冲的增量批量写入数据库，需要在应用上下文中调用，返回写入的行数"""
+        with self._lock:
+            if self._flushing or not self._pending:
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            batches = self._flushing
+
+        count = 0
+        try:
+            for (table_name, column), deltas in batches.items():
+                table = self._tables[table_name]
+                ids = [row_id for row_id, delta in deltas.items() if delta]
+                for start in range(0, len(ids), FLUSH_BATCH_SIZE):
+                    chunk = ids[start:start + FLUSH_BATCH_SIZE]
+                    delta = case({row_id: deltas[row_id] for row_id in chunk}, value=table.c.id, else_=0)
+                    values = {column: func.coalesce(table.c[column], 0) + delta}
+                    if 'updated_at' in table.c:
+                        # 显式赋值以跳过 onupdate，计数不改变内容版本
+                        values['updated_at'] = table.c.updated_at
+                    db.session.execute(table.update().where(table.c.id.in_(chunk)).values(values))
+                    count += len(chunk)
+            # 提交与清空 _flushing 在同一把锁内完成，pending() 不会把已提交的增量再加一次
+            with self._lock:
+                db.session.commit()
+                self._flushing = {}
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"计数落库失败，下次重试: {e}")
+            with self._lock:
+                for key, deltas in batches.items():
+                    self._pending.setdefault(key, Counter()).update(deltas)
+                self._flushing = {}
+            return 0
+
+        for (table_name, column), deltas in batches.items():
+            for callback in self._listeners:
+                try:
+                    callback(table_name, column, deltas)
+                except Exception as e:
+                    logger.error(f"计数落库回调错误: {e}")
+        return count
+
+    def _flush_in_app(self):
+        with self._app.app_context():
+            self.flush()
+
+    def init_app(self, app):
+        """进程退出时落库一次，COUNTER_FLUSH_THREAD 开启时启动后台落库线程"""
+        if self._app is not None:
+            return
+        self._app = app
+        atexit.register(self._shutdown)
+        if app.config.get('COUNTER_FLUSH_THREAD'):
+            self.start()
+
+    def start(self):
+        """启动后台落库线程，只应在 Web 服务进程中调用"""
+        if self._app is None or self._stop is not None:
+            return
+        interval = self._app.config.get('COUNTER_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self._stop = threading.Event()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self._flush_in_app()
+                except Exception as e:
+                    logger.error(f"计数落库线程错误: {e}")
+
+        threading.Thread(target=run, name='counter-flush', daemon=True).start()
+
+    def _shutdown(self):
+        if self._stop is not None:
+            self._stop.set()
+        self._flush_in_app()
+
+
+# 全局计数缓冲实例
+counter_buffer = CounterBuffer()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+时间序列降采样工具
+
+采用按桶保留最小/最大值的方式（min/max-per-bucket）：把序列均分为若干桶，
+每个桶保留最低点和最高点，首尾两点始终保留，峰谷形状不会被抹平。
+全部计算基于 NumPy 向量运算，不逐点循环。
+"""
+
+import numpy as np
+
+
+def minmax_indices(values, points):
+    """返回降采样后保留的下标（升序）
+
+    values 为按时间升序排列的数值数组，points 为目标点数上限。
+    序列本身不超过 points 时原样返回全部下标；返回的点数不超过 points，
+    points 为奇数时多出的一个名额不使用。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+    if points is None or count <= points:
+        return np.arange(count)
+    if points < 4:
+        # 容纳不下首尾加一个桶的最低点和最高点，只保留首尾
+        return np.array([0, count - 1])[:max(points, 1)]
+
+    # 去掉首尾后每桶最多保留 2 个点，总数 2 + 2 * bucket_count <= points
+    bucket_count = (points - 2) // 2
+    inner = np.arange(1, count - 1)
+    buckets = (inner - 1) * bucket_count // (count - 2)
+
+    # 按 (桶, 数值) 排序后，每个桶的第一个元素是最小值，最后一个是最大值
+    order = np.lexsort((values[inner], buckets))
+    sorted_buckets = buckets[order]
+    starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+
+    picked = np.concatenate(([0], inner[order[starts]], inner[order[ends]], [count - 1]))
+    return np.unique(picked)
+
+
+def downsample_records(records, value_key, points):
+    """对按时间升序排列的字典列表降采样"""
+    if points is None or len(records) <= points:
+        return records
+    values = [record.get(value_key) for record in records]
+    values = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return [records[i] for i in minmax_indices(values, points)]
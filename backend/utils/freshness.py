@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+进程内索引的跨进程新鲜度检查
+
+阈值表、热门成交堆、相关性面板、检索 / 联想 / 查重索引都在进程内维护，本进程的
+写入在提交后增量更新，但其他 Web worker 或导入脚本直接写库时无从得知。每个索引
+登记一个版本探测函数（变更序号，或行数加最大 id / 更新时间），加载前取版本，
+之后读取时每隔 CHECK_INTERVAL 秒最多探测一次，版本变化即重新加载。
+
+本进程自己的写入也会改变版本，因此写入后最多触发一次多余的重新加载。
+"""
+
+import threading
+import time
+
+from sqlalchemy import func
+
+from utils.database import db
+
+# 两次版本探测的最小间隔（秒）
+CHECK_INTERVAL = 10
+
+
+def table_version(model, *criteria, key_column=None):
+    """(行数, 最大 key_column) 形式的版本，key_column 默认为 updated_at
+
+    新增行改变行数和最大 id，删除行改变行数，修改行改变最大更新时间。
+    """
+    key_column = key_column if key_column is not None else model.updated_at
+    count, latest = db.session.query(func.count(), func.max(key_column)).select_from(model).filter(*criteria).one()
+    return count, latest
+
+
+class VersionCheck:
+    """按间隔比较数据版本，发现其他进程的写入
+
+    max_age 不为空时，距上次加载超过 max_age 秒也视为过期，用于版本无法反映的
+    变化（如其他进程落库的浏览次数）。
+    """
+
+    def __init__(self, probe, interval=CHECK_INTERVAL, max_age=None):
+        self.probe = probe
+        self.interval = interval
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = None
+        self._marked_at = None
+
+    @property
+    def version(self):
+        """已加载数据对应的版本"""
+        return self._version
+
+    def current(self):
+        """数据当前的版本，在读取数据之前调用"""
+        return self.probe()
+
+    def mark(self, version):
+        """记录已加载数据对应的版本"""
+        with self._lock:
+            self._version = version
+            self._checked_at = self._marked_at = time.monotonic()
+
+    def stale(self):
+        """距上次探测超过间隔且版本已变化时返回 True，未到间隔时返回 False"""
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.interval:
+                return False
+            self._checked_at = now
+            if self.max_age is not None and self._marked_at is not None and now - self._marked_at >= self.max_age:
+                return True
+        return self.probe() != self._version
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+交易对手名称规范化
+
+同一家公司在不同来源中常出现全角/半角括号、空格、大小写等差异，
+入库时统一计算规范化名称作为查找键，查询时不再需要 LIKE 模糊匹配。
+"""
+
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_company_name(name):
+    """计算公司名称的规范化键
+
+    NFKC 将全角字母、数字和括号转为半角，去掉全部空白，拉丁字母统一小写。
+    空名称返回 None。
+    """
+    if not name:
+        return None
+    normalized = unicodedata.normalize('NFKC', name)
+    normalized = _WHITESPACE.sub('', normalized).casefold()
+    return normalized or None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+游标（keyset）分页工具
+
+列表按 (时间列, id) 倒序排列，下一页从上一页最后一行之后开始查找：
+WHERE 时间 < :时间 OR (时间 = :时间 AND id < :id) ORDER BY 时间 DESC, id DESC LIMIT n，
+配合 (过滤列..., 时间列, id) 复合索引，第 N 页与第 1 页的开销相同。条件按 OR 展开
+而不写成行值比较，MySQL 对行值比较不一定能使用索引范围扫描。
+时间列为空的行无法定位游标，调用方应先用 sortable() 过滤，总数也基于过滤后的查询。
+总数不随每页计算，改为按需查询并短时缓存。
+
+旧客户端的 page 参数（OFFSET 分页）仍然支持，但已弃用。
+"""
+
+import base64
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+# 每页最大条数
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(sort_value, row_id):
+    """将最后一行的 (时间, id) 编码为不透明游标"""
+    raw = f"{sort_value.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, UnicodeError):
+        raise ValueError('无效的分页游标')
+
+
+def sortable(query, sort_column):
+    """过滤掉 sort_column 为空的行，分页和总数都应基于该查询"""
+    return query.filter(sort_column.isnot(None))
+
+
+def keyset_paginate(query, sort_column, id_column, limit, cursor=None, page=None):
+    """按 (sort_column, id) 倒序取一页，返回 (rows, next_cursor)
+
+    多取一行判断是否还有下一页，没有下一页时 next_cursor 为 None。
+    没有游标但给出 page 时按 OFFSET 取第 page 页（已弃用），同样返回下一页游标。
+    """
+    query = query.order_by(sort_column.desc(), id_column.desc())
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id)
+        ))
+    elif page is not None:
+        if page < 1:
+            raise ValueError('页码必须大于 0')
+        query = query.offset((page - 1) * limit)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+
+class CountCache:
+    """列表总数缓存，按过滤条件缓存 ttl 秒
+
+    过滤条件来自查询参数，键按最近使用淘汰，最多保留 max_size 个。
+    """
+
+    def __init__(self, ttl=60, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._values = OrderedDict()  # key -> (过期时间, 总数)
+
+    def get(self, key, compute):
+        """读取缓存的总数，过期或不存在时调用 compute() 重新计算"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(key)
+            if cached and cached[0] > now:
+                self._values.move_to_end(key)
+                return cached[1]
+
+        value = compute()
+        with self._lock:
+            self._values[key] = (now + self.ttl, value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+        return value
+
+
+# 全局总数缓存实例
+count_cache = CountCache()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+中英文混合文本分词
+
+中文按相邻两字切分为二元词（“天然气价格” -> 天然、然气、气价、价格），
+不依赖词典，新词、地名、公司名都能命中；单独出现的一个汉字保留为一元词。
+英文和数字按连续的字母数字切分，统一小写。
+"""
+
+import re
+import unicodedata
+
+_TOKEN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]+|[a-z0-9]+(?:\.[a-z0-9]+)*')
+
+
+def _is_cjk(run):
+    return run[0] >= '\u3400'
+
+
+def normalize_text(text):
+    """NFKC 全角转半角并统一小写"""
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+
+def tokenize(text):
+    """将文本切分为检索词列表（保留重复，供计算词频）"""
+    tokens = []
+    for run in _TOKEN.findall(normalize_text(text)):
+        if _is_cjk(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
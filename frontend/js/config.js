@@ -20,6 +20,7 @@ const API_ENDPOINTS = {
     news: `${API_BASE_URL}/energy/news`,
     prices: `${API_BASE_URL}/energy/prices`,
     latestPrices: `${API_BASE_URL}/energy/prices/latest`,
+    marketStream: `${API_BASE_URL}/energy/stream`,
     deals: `${API_BASE_URL}/energy/deals`,
     reports: `${API_BASE_URL}/energy/reports`,
     indexes: `${API_BASE_URL}/energy/indexes`,
@@ -1,5 +1,8 @@
 // 仪表盘JavaScript
 
+// 概览卡片展示的价格序列 {product_type, region}，行情推送只更新该序列
+let latestPriceSeries = null;
+
 // 页面加载完成后执行
 document.addEventListener('DOMContentLoaded', () => {
     // 检查登录状态
@@ -17,6 +20,9 @@ document.addEventListener('DOMContentLoaded', () => {
     // 加载初始数据
     loadOverviewData();
     loadPersonalizedRecommendations();
+    
+    // 订阅行情推送，价格变化时无需重新请求接口
+    subscribeMarketStream();
 });
 
 // 初始化仪表盘
@@ -105,18 +111,19 @@ function showSection(sectionId) {
 async function loadOverviewData() {
     try {
         // 获取今日资讯数量
-        const newsResponse = await utils.apiRequest(`${API_ENDPOINTS.news}?limit=1`);
+        const newsResponse = await utils.apiRequest(`${API_ENDPOINTS.news}?limit=1&with_total=1`);
         document.getElementById('todayNewsCount').textContent = newsResponse.total || 0;
         
         // 获取最新价格
         const priceResponse = await utils.apiRequest(API_ENDPOINTS.latestPrices);
         if (priceResponse.data && priceResponse.data.length > 0) {
             const latestPrice = priceResponse.data[0];
+            latestPriceSeries = { product_type: latestPrice.product_type, region: latestPrice.region };
             document.getElementById('latestPrice').textContent = `¥${latestPrice.price}`;
         }
         
         // 获取研报数量
-        const reportResponse = await utils.apiRequest(`${API_ENDPOINTS.reports}?limit=1`);
+        const reportResponse = await utils.apiRequest(`${API_ENDPOINTS.reports}?limit=1&with_total=1`);
         document.getElementById('reportCount').textContent = reportResponse.total || 0;
         
         // 记录用户行为
@@ -127,6 +134,28 @@ async function loadOverviewData() {
     }
 }
 
+// 订阅行情推送
+function subscribeMarketStream() {
+    if (!window.EventSource) return;
+    
+    const url = `${API_ENDPOINTS.marketStream}?channels=prices&token=${encodeURIComponent(utils.getToken())}`;
+    const source = new EventSource(url);
+    
+    source.addEventListener('price', (event) => {
+        const price = JSON.parse(event.data);
+        if (!latestPriceSeries
+            || price.product_type !== latestPriceSeries.product_type
+            || price.region !== latestPriceSeries.region) {
+            return;
+        }
+        document.getElementById('latestPrice').textContent = `¥${price.price}`;
+    });
+    
+    source.onerror = () => {
+        console.error('行情推送连接中断，浏览器将自动重连');
+    };
+}
+
 // 加载个性化推荐
 async function loadPersonalizedRecommendations() {
     try {
@@ -166,7 +195,7 @@ function createRecommendationCard(type, data) {
         icon = 'fa-newspaper-o';
         badge = data.category;
         title = data.title;
-        content = data.content.substring(0, 100) + '...';
+        content = data.summary ? data.summary.substring(0, 100) + '...' : '';
     } else if (type === 'report') {
         icon = 'fa-file-text-o';
         badge = data.report_type;
@@ -207,7 +236,7 @@ async function loadNewsData() {
                     <td>${news.source}</td>
                     <td>${new Date(news.publish_time).toLocaleDateString()}</td>
                     <td>
-                        <button class="btn btn-sm btn-primary btn-action" onclick="viewNewsDetail('${news._id}')">
+                        <button class="btn btn-sm btn-primary btn-action" onclick="viewNewsDetail('${news.id}')">
                             查看
                         </button>
                     </td>